@@ -1,30 +1,54 @@
 import sys
+import os
+import time
+import logging
 import pathlib
+import importlib
 
 sys.path.append(str(pathlib.Path(__file__).parent))
-import glob
 
-all_py_files = pathlib.Path(__file__).parent.glob('civitaiNodes/**/*.py')
+# 只导入节点定义模块，重依赖（requests / PIL / pydantic / dynaconf 等）在节点第一次执行时才导入
+NODE_MODULES = [
+    "civitaiNodes.civitai_url_nodes",
+    "civitaiNodes.local_loader_nodes",
+    "civitaiNodes.prompt_concatenate",
+    "civitaiNodes.library_nodes",
+]
 
-import importlib.util
+# 注册 PromptServer 上的 HTTP 路由
+ROUTE_MODULES = [
+    "civitaiNodes.server_routes",
+]
 
 NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
 
-for py_file in all_py_files:
-    if pathlib.Path(py_file) == pathlib.Path(__file__):
-        continue
-    # print(f"Checking {py_file}")
+# (module, seconds, number of newly imported modules)
+startup_timings = []
+
+for module_name in NODE_MODULES + ROUTE_MODULES:
+    start = time.perf_counter()
+    modules_before = len(sys.modules)
     try:
-        spec = importlib.util.spec_from_file_location(py_file.stem, py_file)
-        imported_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(imported_module)
-        NODE_CLASS_MAPPINGS = {**NODE_CLASS_MAPPINGS, **imported_module.NODE_CLASS_MAPPINGS}
-        NODE_DISPLAY_NAME_MAPPINGS = {**NODE_DISPLAY_NAME_MAPPINGS, **imported_module.NODE_DISPLAY_NAME_MAPPINGS}
-        print(f"XTNodes: Successfully imported {py_file}")
+        imported_module = importlib.import_module(module_name)
+        NODE_CLASS_MAPPINGS = {**NODE_CLASS_MAPPINGS, **getattr(imported_module, "NODE_CLASS_MAPPINGS", {})}
+        NODE_DISPLAY_NAME_MAPPINGS = {**NODE_DISPLAY_NAME_MAPPINGS, **getattr(imported_module, "NODE_DISPLAY_NAME_MAPPINGS", {})}
     except Exception as e:
-        # print(f"XTNodes: Failed to import {py_file} / {e}")
-        pass
-    
+        logging.exception(f"XTNodes: Failed to import {module_name}: {e}")
+        continue
+    startup_timings.append((module_name, time.perf_counter() - start, len(sys.modules) - modules_before))
+    print(f"XTNodes: Successfully imported {module_name}")
+
+def format_startup_timings(timings: list = startup_timings) -> str:
+    lines = ["XTNodes startup timing:"]
+    for module_name, seconds, new_modules in timings:
+        lines.append(f"  {module_name:<40} {seconds * 1000:8.1f} ms  (+{new_modules} modules)")
+    lines.append(f"  {'total':<40} {sum(t[1] for t in timings) * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+# 设置环境变量 XTNODES_STARTUP_TIMING=1 以输出每个模块的导入耗时
+if os.environ.get("XTNODES_STARTUP_TIMING", "").lower() in ["1", "true", "yes"]:
+    print(format_startup_timings())
+
 WEB_DIRECTORY = "./web"
-__all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
\ No newline at end of file
+__all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
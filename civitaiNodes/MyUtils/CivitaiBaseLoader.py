@@ -1,63 +1,168 @@
-from .civitaiModelInfo import ModelInfo
-from .ui_utils import ExtraCivitaiParams, add_extra_output, get_summary, get_ui_images
+from .ui_utils import ExtraCivitaiParams, add_extra_output, get_summary, get_ui_images, send_ui_to_node
+from .LoraStack import LoraStack
+from .phase_timing import PhaseRecorder, phase
+import os
 import logging
-import folder_paths
-from typing import List, Tuple, Literal
-
-def append_lora_stack(lora_stack, lora_name, lora_weight, clip_weight):
-    if lora_stack is None:
-        lora_stack = []
-    else:
-        from copy import deepcopy
-        lora_stack = deepcopy(lora_stack)
-    lora_stack.append((lora_name, lora_weight, clip_weight,))
-    return lora_stack
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Tuple, Literal, TYPE_CHECKING
+
+# ModelInfo 依赖 pydantic / requests / blake3，节点注册时不导入，第一次执行时再导入
+if TYPE_CHECKING:
+    from .civitaiModelInfo import ModelInfo
+
+def append_lora_stack(lora_stack, lora_name, lora_weight, clip_weight) -> LoraStack:
+    # + 返回共享前缀的新栈，上游传入的栈不变，无需 deepcopy
+    return LoraStack.from_value(lora_stack) + [(lora_name, lora_weight, clip_weight,)]
+
+# 本地模型的识别（BLAKE3 哈希 + 在线查询）在后台线程中进行，不阻塞模型加载
+_identify_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="XTNodes-identify")
+_identify_futures: dict[tuple, Future] = {}
+_identify_lock = threading.Lock()
+
+def _identify_key(model_path: str) -> tuple:
+    # 文件被替换（大小或修改时间变化）后重新识别
+    try:
+        stat = os.stat(model_path)
+        return (model_path, stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return (model_path, None, None)
+
+def _forget_identify(key: tuple, future: Future):
+    with _identify_lock:
+        if _identify_futures.get(key) is future:
+            del _identify_futures[key]
+
+def identify_model_async(model_path: str) -> Future:
+    """返回识别本地模型的 Future，同一文件识别中时只提交一次；完成后移除，结果由哈希表缓存"""
+    from .civitaiModelInfo import ModelInfo
+    key = _identify_key(model_path)
+    with _identify_lock:
+        future = _identify_futures.get(key)
+        if future is not None:
+            return future
+        future = _identify_executor.submit(ModelInfo, filepath=model_path)
+        _identify_futures[key] = future
+    future.add_done_callback(lambda done_future: _forget_identify(key, done_future))
+    return future
+
+def node_execution(func):
+    """节点函数的装饰器：节点在 process_result 之前出错时也结束本次的阶段耗时记录，不留在执行线程上"""
+    @functools.wraps(func)
+    def wrapper(self: "CivitaiBaseLoader", *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if self.phase_recorder is not None:
+                self.phase_recorder.deactivate()
+                self.phase_recorder = None
+    return wrapper
 
 # 基类，用于处理通用功能
 class CivitaiBaseLoader:
     node_type : Literal["local", "remote"] = "remote"
     history = None
-    modelinfo: ModelInfo = None
+    modelinfo: "ModelInfo" = None
     extra_civitai_params: ExtraCivitaiParams = None
+    identify_future: Future = None
+    identify_error: Exception = None
+    unique_id: str = None
+    phase_recorder: PhaseRecorder = None
 
     def _prepare_modelinfo_by_url(self, url: str = ""):
         """创建ModelInfo对象并下载模型文件（如果尚未下载）"""
+        from .civitaiModelInfo import ModelInfo
         self.node_type = "remote"
-        self.modelinfo = ModelInfo(url)
+        self.identify_future = None
+        with phase("resolve"):
+            self.modelinfo = ModelInfo(url)
 
         if not self.modelinfo.finish_downloaded:
-            self.modelinfo.download()
+            with phase("download"):
+                self.modelinfo.download()
             
     def _prepare_modelinfo_by_name(self, model_path: str = ""):
-        """本地加载模型"""
+        """本地加载模型，ModelInfo 在后台线程中解析，在 process_result 中收取"""
         self.node_type = "local"
+        self.modelinfo = None
+        self.identify_future = identify_model_async(model_path)
+
+    def _collect_modelinfo(self):
+        """等待后台识别结果，最多等待 config.identify_timeout 秒"""
+        from civitaiNodes.config import config
+        self.identify_error = None
+        if self.identify_future is None:
+            return
         try:
-            self.modelinfo = ModelInfo(filepath=model_path)
-        except:
+            self.modelinfo = self.identify_future.result(timeout=config.identify_timeout)
+            self.identify_future = None
+        except FutureTimeoutError:
+            self.modelinfo = None
+        except Exception as e:
+            logging.info(f"Could not identify model on civitai.com: {e}")
             self.modelinfo = None
-        
+            self.identify_future = None
+            self.identify_error = e
     
     def prepare_modelinfo(self, url: str = "", model_path :str = "", **kwargs):
         """创建ModelInfo对象并下载模型文件（如果尚未下载），并生成额外参数"""
         self.extra_civitai_params = ExtraCivitaiParams(**kwargs)
+        self.unique_id = kwargs.get("unique_id", None)
+        # 记录本次执行各阶段的耗时，下层代码通过 phase() 添加阶段
+        self.phase_recorder = PhaseRecorder(type(self).__name__, self.unique_id)
+        self.phase_recorder.activate()
         if len(url) > 0:
             self._prepare_modelinfo_by_url(url)
         else:
             self._prepare_modelinfo_by_name(model_path)
+        # 从这里到 process_result 是节点自身的模型加载
+        self.phase_recorder.mark()
+
+    @staticmethod
+    def _make_ui_dict(modelinfo: "ModelInfo", extra_civitai_params: ExtraCivitaiParams, show_images: bool = True) -> dict:
+        """生成节点的 UI 输出（summary 文本和预览图）"""
+        ui = {
+            "text": [get_summary(modelinfo)],
+        }
+        if modelinfo is not None:
+            if extra_civitai_params.preview_images and show_images and not extra_civitai_params.bypass:
+                with phase("previews"):
+                    ui["images"] = get_ui_images(modelinfo.image_urls)
+        return ui
             
     def _make_result_dict(self, result,  is_same_url: bool = False):
         """生成结果字典"""
+        ui = self._make_ui_dict(self.modelinfo, self.extra_civitai_params, not is_same_url)
+        if self.identify_future is not None:
+            ui["text"] = ["Identifying model on civitai.com in background, the summary will show up when it is ready."]
+            self._deliver_when_identified(self.identify_future)
+        elif self.identify_error is not None:
+            from .http_utils import OfflineModeError
+            if isinstance(self.identify_error, OfflineModeError):
+                ui["text"] = [str(self.identify_error)]
         result_dict = {
             "result": add_extra_output(result, self.extra_civitai_params, self.modelinfo),
-            "ui": {
-                "text": [get_summary(self.modelinfo)],
-            },
+            "ui": ui,
         }
-        if self.modelinfo is not None:
-            if self.extra_civitai_params.preview_images and not is_same_url and not self.extra_civitai_params.bypass:
-                result_dict["ui"]["images"] = get_ui_images(self.modelinfo.image_urls)
         return result_dict
 
+    def _deliver_when_identified(self, future: Future):
+        """识别完成后将 summary 和预览图推送到前端节点；若未推送成功，下次运行时也会直接得到结果"""
+        unique_id = self.unique_id
+        extra_civitai_params = self.extra_civitai_params
+        if unique_id is None:
+            return
+
+        def _deliver(done_future: Future):
+            try:
+                modelinfo = done_future.result()
+                send_ui_to_node(unique_id, self._make_ui_dict(modelinfo, extra_civitai_params))
+            except Exception as e:
+                logging.info(f"Could not deliver model info to node {unique_id}: {e}")
+
+        future.add_done_callback(_deliver)
+
     def is_same_url(self, url: str):
         """判断是否是同一个url"""
         if self.modelinfo is None:
@@ -66,8 +171,17 @@ class CivitaiBaseLoader:
     
     def process_result(self, result):
         """处理结果，记录日志并更新历史"""
+        result_dict = None
+        if self.phase_recorder is not None:
+            self.phase_recorder.add_since_mark("load")
         try:
-            return self._make_result_dict(result, self.is_same_url(self.history))
+            if self.identify_future is not None:
+                with phase("identify wait"):
+                    self._collect_modelinfo()
+            else:
+                self._collect_modelinfo()
+            result_dict = self._make_result_dict(result, self.is_same_url(self.history))
+            return result_dict
         except Exception as e:
             self.log_error(e, "Error processing result")
             raise
@@ -76,10 +190,25 @@ class CivitaiBaseLoader:
                 self.history = self.modelinfo.url if not self.extra_civitai_params.bypass else None
             else:
                 self.history = None
+            self._finish_phase_recorder(result_dict)
+
+    def _finish_phase_recorder(self, result_dict: dict = None):
+        """输出本次执行的阶段耗时：结构化日志、指标，以及（可选）节点 summary"""
+        from civitaiNodes.config import config
+        from .metrics import node_phase_seconds
+        recorder = self.phase_recorder
+        if recorder is None:
+            return
+        recorder.deactivate()
+        self.phase_recorder = None
+        for name, seconds, depth in recorder.spans:
+            node_phase_seconds.observe(seconds, node=recorder.node, phase=name)
+        recorder.log(config.timing_log_threshold, model=self.modelinfo.url if self.modelinfo is not None else None)
+        if config.timing_in_summary and result_dict is not None:
+            text = result_dict["ui"]["text"]
+            text[0] = f"{text[0]}\n\n{recorder.format()}"
 
     @staticmethod
     def log_error(e: Exception, message: str = "Error occurred"):
         """记录错误日志"""
         logging.error(f"{message}: {e}")
-
-
@@ -1,24 +1,57 @@
 import json
 import os
+from contextlib import contextmanager
+
+from .file_lock import FileLock, temp_path_for
+
+# 多个进程共享同一个 json 文件时，读取-修改-写入在锁内完成
+LOCK_STALE_AFTER = 30
+LOCK_TIMEOUT = 10
 
 class LazyLoadDict:
     def __init__(self, filepath):
         self.filepath = filepath
         self._data = {}
+        self._signature = None  # 上次读取或写入时文件的 (mtime, size)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
     def _load(self):
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self._data.update(data)
-            except :
-                pass
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            # 文件不存在或自上次读取后没有变化，不需要重新读取
+            return
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                self._data.update(data)
+            self._signature = signature
+        except :
+            pass
         
 
+    @contextmanager
+    def _locked(self):
+        lock = FileLock(str(self.filepath) + ".lock", stale_after=LOCK_STALE_AFTER, heartbeat=False)
+        # 等不到锁时照常写入，最坏情况是丢失另一个进程的一次更新
+        locked = lock.acquire(timeout=LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if locked:
+                lock.release()
+
     def save(self):
-        with open(self.filepath, 'w', encoding='utf-8') as f:
+        tmp_path = temp_path_for(self.filepath)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(self._data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.filepath)
+        self._signature = self._file_signature()
 
     def _convert_key(self, key):
         # 将 key 转换为字符串类型
@@ -26,33 +59,38 @@ class LazyLoadDict:
 
     def __setitem__(self, key, value):
         key = self._convert_key(key)
-        self._load()  # 每次操作前加载最新数据
-        self._data[key] = value
-        self.save()  # 每次操作后保存数据
+        with self._locked():
+            self._load()  # 每次操作前加载最新数据
+            self._data[key] = value
+            self.save()  # 每次操作后保存数据
 
     def __delitem__(self, key):
         key = self._convert_key(key)
-        self._load()  # 每次操作前加载最新数据
-        del self._data[key]
-        self.save()  # 每次操作后保存数据
+        with self._locked():
+            self._load()  # 每次操作前加载最新数据
+            del self._data[key]
+            self.save()  # 每次操作后保存数据
 
     def update(self, *args, **kwargs):
-        self._load()  # 每次操作前加载最新数据
-        for key, value in dict(*args, **kwargs).items():
-            self._data[self._convert_key(key)] = value
-        self.save()  # 每次操作后保存数据
+        with self._locked():
+            self._load()  # 每次操作前加载最新数据
+            for key, value in dict(*args, **kwargs).items():
+                self._data[self._convert_key(key)] = value
+            self.save()  # 每次操作后保存数据
 
     def pop(self, key, default=None):
         key = self._convert_key(key)
-        self._load()  # 每次操作前加载最新数据
-        result = self._data.pop(key, default)
-        self.save()  # 每次操作后保存数据
+        with self._locked():
+            self._load()  # 每次操作前加载最新数据
+            result = self._data.pop(key, default)
+            self.save()  # 每次操作后保存数据
         return result
 
     def clear(self):
-        self._load()  # 每次操作前加载最新数据
-        self._data.clear()
-        self.save()  # 每次操作后保存数据
+        with self._locked():
+            self._load()  # 每次操作前加载最新数据
+            self._data.clear()
+            self.save()  # 每次操作后保存数据
 
     def __getitem__(self, key):
         key = self._convert_key(key)
@@ -0,0 +1,139 @@
+from collections.abc import Sequence
+from typing import Iterable, Tuple
+
+LoraStackItem = Tuple[str, float, float]
+
+
+class _Cell:
+    """不可变的链表节点，多个 LoraStack 可以共享同一个前缀"""
+
+    __slots__ = ("parent", "item", "length", "items", "hash")
+
+    def __init__(self, parent: "_Cell" = None, item: LoraStackItem = None):
+        self.parent = parent
+        self.item = item
+        self.length = 0 if parent is None else parent.length + 1
+        self.items = () if parent is None else None
+        self.hash = None
+
+    def to_tuple(self) -> Tuple[LoraStackItem, ...]:
+        if self.items is None:
+            items = []
+            cell = self
+            while cell.items is None:
+                items.append(cell.item)
+                cell = cell.parent
+            items.reverse()
+            self.items = cell.items + tuple(items)
+        return self.items
+
+
+_EMPTY = _Cell()
+
+
+class LoraStack(Sequence):
+    """共享前缀的不可变 LORA_STACK，追加为 O(1)
+
+    An immutable LORA_STACK that behaves like a tuple of (lora_name, lora_weight,
+    clip_weight) tuples. The items live in immutable cells shared between stacks:
+    `stack + [item]` returns a new stack on top of the same cells, so a chain of n
+    loaders costs O(n) instead of O(n²) copies. A stack never changes once created,
+    so it can be shared by several downstream nodes and used as a dict key; append /
+    extend raise TypeError, and copy() returns a list for callers that mutate.
+    Stacks compare equal to lists and tuples with the same items and hash like the
+    tuple of their items.
+    """
+
+    __slots__ = ("_cell",)
+
+    def __init__(self, items: Iterable[LoraStackItem] = ()):
+        self._cell = self._push(_EMPTY, items)
+
+    @staticmethod
+    def _push(cell: _Cell, items: Iterable[LoraStackItem]) -> _Cell:
+        for item in items:
+            cell = _Cell(cell, tuple(item))
+        return cell
+
+    @classmethod
+    def _from_cell(cls, cell: _Cell) -> "LoraStack":
+        stack = cls.__new__(cls)
+        stack._cell = cell
+        return stack
+
+    @classmethod
+    def from_value(cls, lora_stack) -> "LoraStack":
+        # 兼容其他节点传入的 list / tuple
+        if lora_stack is None:
+            return cls()
+        if isinstance(lora_stack, LoraStack):
+            return lora_stack
+        return cls(lora_stack)
+
+    def append(self, item: LoraStackItem):
+        raise TypeError("LoraStack is immutable, use stack + [item] or convert it with list(stack)")
+
+    def extend(self, items: Iterable[LoraStackItem]):
+        raise TypeError("LoraStack is immutable, use stack + items or convert it with list(stack)")
+
+    def to_tuple(self) -> Tuple[LoraStackItem, ...]:
+        return self._cell.to_tuple()
+
+    def to_list(self) -> list:
+        return list(self.to_tuple())
+
+    def copy(self) -> list:
+        # 旧代码会对 lora_stack 调用 copy() 后追加，返回可修改的 list
+        return self.to_list()
+
+    def __len__(self) -> int:
+        return self._cell.length
+
+    def __getitem__(self, index):
+        return self.to_tuple()[index]
+
+    def __iter__(self):
+        return iter(self.to_tuple())
+
+    def __reversed__(self):
+        cell = self._cell
+        while cell.length > 0:
+            yield cell.item
+            cell = cell.parent
+
+    def __add__(self, other) -> "LoraStack":
+        return self._from_cell(self._push(self._cell, other))
+
+    def __radd__(self, other) -> "LoraStack":
+        return LoraStack(other) + self
+
+    def __hash__(self) -> int:
+        cell = self._cell
+        if cell.hash is None:
+            cell.hash = hash(cell.to_tuple())
+        return cell.hash
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LoraStack):
+            return self._cell is other._cell or (len(self) == len(other) and self.to_tuple() == other.to_tuple())
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and self.to_tuple() == tuple(tuple(item) for item in other)
+        return NotImplemented
+
+    def __ne__(self, other) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __copy__(self) -> "LoraStack":
+        # 与 tuple 相同，不可变对象的复制就是它本身
+        return self
+
+    def __deepcopy__(self, memo) -> "LoraStack":
+        # 元素是 (str, float, float)，同样不可变
+        return self
+
+    def __reduce__(self):
+        return (LoraStack, (self.to_tuple(),))
+
+    def __repr__(self) -> str:
+        return f"LoraStack({self.to_list()!r})"
@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import pathlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import folder_paths
+
+from civitaiNodes.config import config
+from . import safetensors_utils
+from .file_lock import temp_path_for
+
+# 并发读取头部的线程数（网络存储上逐个读取很慢）
+READ_WORKERS = 8
+# 超过这个长度的 metadata 值（嵌入的缩略图等）不放进索引
+MAX_METADATA_VALUE = 64 * 1024
+# ss_tag_frequency 中按出现次数保留的标签数
+MAX_TAGS = 100
+
+_FILTER = re.compile(r"^\s*(.+?)\s*(>=|<=|!=|=|~)\s*(.*?)\s*$")
+# 条目本身的字段，其余的键在 __metadata__ 中查找
+ENTRY_FIELDS = ("name", "folder", "size", "tensors", "parameters")
+
+
+def extract_tags(metadata: Dict[str, str]) -> List[str]:
+    """kohya 训练脚本写入的 ss_tag_frequency（{数据集: {标签: 次数}}）中出现最多的标签"""
+    try:
+        datasets = json.loads(metadata.get("ss_tag_frequency", "{}"))
+        counts = Counter()
+        for tags in datasets.values():
+            for tag, count in tags.items():
+                counts[tag.strip()] += count
+    except (ValueError, AttributeError, TypeError):
+        return []
+    return [tag for tag, _ in counts.most_common(MAX_TAGS) if tag]
+
+
+def read_entry(path: str) -> Dict[str, Any]:
+    """读取一个文件的头部，返回索引条目；读取或解析失败时记录错误，文件不变就不再重试"""
+    try:
+        header = safetensors_utils.read_header_from_file(path)
+        summary = safetensors_utils.summarize_header(header, os.path.getsize(path))
+        metadata = summary.pop("metadata")
+        if not isinstance(metadata, dict):
+            metadata = {}
+        return {
+            **summary,
+            "key_groups": safetensors_utils.summarize_keys(header),
+            "tags": extract_tags(metadata),
+            "metadata": {key: value for key, value in metadata.items() if len(str(value)) <= MAX_METADATA_VALUE},
+            "omitted": [key for key, value in metadata.items() if len(str(value)) > MAX_METADATA_VALUE],
+        }
+    except Exception as e:
+        # 头部是合法 JSON 但张量条目格式不对（缺少 dtype / shape 等）时，一个文件不能中断整个刷新
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def parse_filters(text: str) -> List[Tuple[str, str, str]]:
+    """每行（或分号分隔）一个条件：key=value 相等，key~value 包含，key>=n / key<=n 数值比较，
+    key!=value 不相等，只写 key 表示存在该 metadata；比较不区分大小写"""
+    filters = []
+    for line in re.split(r"[\n;]", text):
+        if len(line.strip()) == 0:
+            continue
+        match = _FILTER.match(line)
+        if match is None:
+            filters.append((line.strip(), None, ""))
+        else:
+            filters.append(match.groups())
+    return filters
+
+
+def _field(entry: Dict[str, Any], key: str):
+    if key in ENTRY_FIELDS:
+        return entry.get(key)
+    if key == "tag":
+        return entry.get("tags", [])
+    if key == "dtype":
+        return list(entry.get("dtypes", {}))
+    if key == "group":
+        return list(entry.get("key_groups", {}))
+    return entry.get("metadata", {}).get(key)
+
+
+def _matches(value, operator: str, expected: str) -> bool:
+    if operator is None:
+        return value is not None and value != []
+    if operator == "!=":
+        return not _matches(value, "=", expected)
+    if value is None:
+        return False
+    if isinstance(value, list):
+        return any(_matches(item, operator, expected) for item in value)
+    if operator in (">=", "<="):
+        try:
+            number, limit = float(value), float(expected)
+        except (TypeError, ValueError):
+            return False
+        return number >= limit if operator == ">=" else number <= limit
+    text, expected = str(value).lower(), expected.lower()
+    return text == expected if operator == "=" else expected in text
+
+
+class MetadataIndex:
+    """本地模型库中 safetensors 文件头部的索引
+
+    Entries are keyed by file path and hold the parsed __metadata__, the top
+    ss_tag_frequency tags and tensor dtype / key group summaries. A refresh only
+    stats the files of the model folders and re-reads the headers whose
+    (size, mtime) changed; the index is persisted in json_cache so a restart does
+    not open every file again. Queries only touch the in-memory entries.
+    """
+
+    def __init__(self, index_path: pathlib.Path, folders: Tuple[str, ...] = ("loras", "checkpoints"), refresh_interval: float = 10.0):
+        self.index_path = pathlib.Path(index_path)
+        self.folders = folders
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_refresh = 0.0
+
+    def _load_index(self):
+        self._loaded = True
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                self._entries = json.load(file)
+        except Exception:
+            self._entries = {}
+
+    def _save_index(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = temp_path_for(self.index_path)
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _scan(self) -> Dict[str, Tuple[str, str, int, int]]:
+        # 路径 -> (folder, name, size, mtime)
+        files = {}
+        for folder in self.folders:
+            for name in folder_paths.get_filename_list(folder):
+                if not name.lower().endswith(".safetensors"):
+                    continue
+                path = folder_paths.get_full_path(folder, name)
+                if path is None:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (folder, name, stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def refresh(self, force: bool = False) -> bool:
+        """重新扫描模型文件夹，只读取新增或 (size, mtime) 变化的文件，返回索引是否有变化"""
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+            if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return False
+            files = self._scan()
+            changed = []
+            for path, (folder, name, size, mtime) in files.items():
+                entry = self._entries.get(path)
+                if entry is None or entry["size"] != size or entry["mtime"] != mtime:
+                    changed.append(path)
+            removed = set(self._entries) - set(files)
+            for path in removed:
+                del self._entries[path]
+            if len(changed) > 0:
+                with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+                    for path, entry in zip(changed, executor.map(read_entry, changed)):
+                        folder, name, size, mtime = files[path]
+                        # 记录扫描时的 (size, mtime)，读取期间文件被修改时下次刷新会重新读取
+                        self._entries[path] = {**entry, "folder": folder, "name": name, "size": size, "mtime": mtime}
+            if len(changed) > 0 or len(removed) > 0:
+                self._save_index()
+            self._last_refresh = time.monotonic()
+            return len(changed) > 0 or len(removed) > 0
+
+    def get(self, path: str) -> Dict[str, Any] | None:
+        self.refresh()
+        with self._lock:
+            return self._entries.get(str(path))
+
+    def query(self, filters: List[Tuple[str, str, str]] | str = (), folder: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """返回满足所有条件的文件（按文件名排序），filters 可以是 parse_filters 的文本"""
+        if isinstance(filters, str):
+            filters = parse_filters(filters)
+        self.refresh()
+        with self._lock:
+            results = []
+            for path, entry in self._entries.items():
+                if "error" in entry or (folder is not None and entry["folder"] != folder):
+                    continue
+                if all(_matches(_field(entry, key), operator, expected) for key, operator, expected in filters):
+                    results.append({"path": path, **entry})
+        results.sort(key=lambda entry: (entry["folder"], entry["name"].lower()))
+        return results[:limit]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+metadata_index = MetadataIndex(config.json_cache_dir / "safetensors_index.json")
+
+
+def format_query_results(results: List[Dict[str, Any]]) -> str:
+    if len(results) == 0:
+        return "No matching safetensors files found"
+    lines = []
+    for result in results:
+        metadata = result["metadata"]
+        base_model = metadata.get("ss_base_model_version") or metadata.get("modelspec.architecture") or "unknown base model"
+        dtypes = "/".join(result["dtypes"]) or "no tensors"
+        line = f"{result['name']} ({result['folder']}, {base_model}, {dtypes}, {result['parameters'] / 1e6:.1f}M parameters"
+        if "ss_network_dim" in metadata:
+            line += f", dim {metadata['ss_network_dim']}"
+        lines.append(line + ")")
+        if len(result["tags"]) > 0:
+            lines.append(f"    tags: {', '.join(result['tags'][:10])}")
+    return "\n".join(lines)
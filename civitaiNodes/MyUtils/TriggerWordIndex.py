@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import time
+import bisect
+import difflib
+import pathlib
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from civitaiNodes.config import config
+from .civitaiModelInfo import gather_prompt_list
+from . import model_cache
+from .file_lock import temp_path_for
+
+TRIGGER = "trigger"
+TAG = "tag"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_term(term: str) -> str:
+    # 忽略大小写，下划线和空格视为相同
+    return _WHITESPACE.sub(" ", term.replace("_", " ")).strip().lower()
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def extract_entries(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从缓存的模型 JSON 中提取每个版本的触发词和标签"""
+    entries = []
+    tags = data.get("tags", [])
+    for modelVersion in data.get("modelVersions", []):
+        entries.append({
+            "modelId": data["id"],
+            "versionId": modelVersion["id"],
+            "title": data.get("name", ""),
+            "versionName": modelVersion.get("name", ""),
+            "type": data.get("type", ""),
+            "baseModel": modelVersion.get("baseModel", ""),
+            "trainedWords": gather_prompt_list(modelVersion.get("trainedWords", []) or []),
+            "tags": tags,
+        })
+    return entries
+
+
+class TriggerWordIndex:
+    """触发词 / 标签 -> (modelId, versionId) 的倒排索引
+
+    The index is built incrementally from the models cached in json_cache (see
+    model_cache): only models whose model.json mtime changed are read again, and the extracted entries are
+    persisted next to the cache so a restart does not re-read every document.
+    Lookups (exact, prefix, fuzzy) only touch in-memory structures.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, index_path: pathlib.Path = None, refresh_interval: float = 10.0):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.index_path = pathlib.Path(index_path) if index_path is not None else self.cache_dir / "trigger_word_index.json"
+        self.refresh_interval = refresh_interval
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._terms: Dict[str, Dict[Tuple[int, int], str]] = {}
+        self._models: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._sorted_terms: List[str] = None
+        self._term_trigrams: Dict[str, set] = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_refresh = 0.0
+
+    def _load_index(self):
+        self._loaded = True
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                documents = json.load(file)
+        except Exception:
+            return
+        for name, document in documents.items():
+            self._documents[name] = document
+            self._add_entries(document["entries"])
+
+    def _save_index(self):
+        tmp_path = temp_path_for(self.index_path)
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._documents, file, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _add_entries(self, entries: List[Dict[str, Any]]):
+        for entry in entries:
+            key = (entry["modelId"], entry["versionId"])
+            self._models[key] = entry
+            for tag in entry["tags"]:
+                self._terms.setdefault(normalize_term(tag), {}).setdefault(key, TAG)
+            for word in entry["trainedWords"]:
+                self._terms.setdefault(normalize_term(word), {})[key] = TRIGGER
+        self._sorted_terms = None
+        self._term_trigrams = None
+
+    def _remove_entries(self, entries: List[Dict[str, Any]]):
+        for entry in entries:
+            key = (entry["modelId"], entry["versionId"])
+            self._models.pop(key, None)
+            for term in [*entry["tags"], *entry["trainedWords"]]:
+                term = normalize_term(term)
+                keys = self._terms.get(term)
+                if keys is None:
+                    continue
+                keys.pop(key, None)
+                if len(keys) == 0:
+                    del self._terms[term]
+        self._sorted_terms = None
+        self._term_trigrams = None
+
+    def _read_entries(self, modelId: int) -> List[Dict[str, Any]]:
+        try:
+            data = model_cache.load_all_versions(self.cache_dir, modelId)
+            return extract_entries(data) if data is not None else []
+        except Exception:
+            return []
+
+    def refresh(self, force: bool = False) -> bool:
+        """重新扫描缓存目录，只解析新增或修改过的模型 JSON，返回索引是否有变化"""
+        with self._lock:
+            if not self._loaded:
+                self._load_index()
+                # 旧格式的完整 JSON 先转换为精简缓存
+                model_cache.migrate_legacy_cache(self.cache_dir, keep_raw=config.keep_raw_json)
+            if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return False
+            changed = False
+            seen = set()
+            for modelId, mtime in model_cache.iter_cached_models(self.cache_dir):
+                name = str(modelId)
+                seen.add(name)
+                document = self._documents.get(name)
+                if document is not None and document["mtime"] == mtime:
+                    continue
+                if document is not None:
+                    self._remove_entries(document["entries"])
+                entries = self._read_entries(modelId)
+                self._documents[name] = {"mtime": mtime, "entries": entries}
+                self._add_entries(entries)
+                changed = True
+            for name in set(self._documents) - seen:
+                self._remove_entries(self._documents.pop(name)["entries"])
+                changed = True
+            if changed:
+                self._save_index()
+            self._last_refresh = time.monotonic()
+            return changed
+
+    def _ensure_search_structures(self):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._terms)
+        if self._term_trigrams is None:
+            term_trigrams = {}
+            for term in self._sorted_terms:
+                for trigram in _trigrams(term):
+                    term_trigrams.setdefault(trigram, set()).add(term)
+            self._term_trigrams = term_trigrams
+
+    def _match_prefix(self, term: str, limit: int) -> List[str]:
+        start = bisect.bisect_left(self._sorted_terms, term)
+        matches = []
+        for candidate in self._sorted_terms[start:]:
+            if not candidate.startswith(term) or len(matches) >= limit:
+                break
+            matches.append(candidate)
+        return matches
+
+    def _match_fuzzy(self, term: str, limit: int, cutoff: float = 0.6) -> List[str]:
+        # 先用 trigram 找出候选词，再用 difflib 打分，避免和所有词逐一比较
+        overlap = Counter()
+        for trigram in _trigrams(term):
+            overlap.update(self._term_trigrams.get(trigram, ()))
+        scored = []
+        for candidate, _ in overlap.most_common(max(limit * 10, 100)):
+            ratio = difflib.SequenceMatcher(None, term, candidate).ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [candidate for _, candidate in scored[:limit]]
+
+    def lookup(self, query: str, mode: str = "prefix", limit: int = 20) -> List[Dict[str, Any]]:
+        """查找触发词或标签，mode 为 exact / prefix / fuzzy，返回匹配的模型版本"""
+        self.refresh()
+        term = normalize_term(query)
+        if len(term) == 0:
+            return []
+        with self._lock:
+            self._ensure_search_structures()
+            if mode == "exact":
+                terms = [term] if term in self._terms else []
+            elif mode == "prefix":
+                terms = self._match_prefix(term, limit)
+            elif mode == "fuzzy":
+                terms = self._match_fuzzy(term, limit)
+            else:
+                raise ValueError(f"Unknown lookup mode: {mode}")
+            results = []
+            for matched_term in terms:
+                # 触发词匹配排在标签匹配之前
+                keys = sorted(self._terms[matched_term].items(), key=lambda item: (item[1] != TRIGGER, item[0]))
+                for key, kind in keys:
+                    model = self._models[key]
+                    results.append({
+                        "term": matched_term,
+                        "match": kind,
+                        "modelId": model["modelId"],
+                        "versionId": model["versionId"],
+                        "title": model["title"],
+                        "versionName": model["versionName"],
+                        "type": model["type"],
+                        "baseModel": model["baseModel"],
+                        "trainedWords": model["trainedWords"],
+                        "url": f"https://civitai.com/models/{model['modelId']}?modelVersionId={model['versionId']}",
+                    })
+                    if len(results) >= limit:
+                        return results
+            return results
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._terms)
+
+
+trigger_word_index = TriggerWordIndex(config.json_cache_dir)
+
+
+def format_lookup_results(results: List[Dict[str, Any]]) -> str:
+    if len(results) == 0:
+        return "No matching trigger words or tags found in the local cache"
+    lines = []
+    for result in results:
+        lines.append(f"[{result['match']}] {result['term']} -> {result['title']} - {result['versionName']} ({result['type']}, {result['baseModel']})")
+        lines.append(f"    {result['url']}")
+    return "\n".join(lines)
@@ -0,0 +1,293 @@
+"""
+asyncio client for civitai.com: model resolution, downloads and preview images on
+one aiohttp session per event loop, so hundreds of lookups can run concurrently
+without a thread each.
+
+    info = await ModelInfo.aresolve(url)
+    await info.adownload()
+    paths = await info.afetch_previews()
+
+Cache lookup, the compact json_cache, parsing and the parsed ModelInfo LRU are
+shared with the synchronous API (the ModelInfo._ helpers, reserve_download_space,
+model_store.store_incoming); only the network transport differs. Concurrent requests
+for the same model on one loop share a single fetch. json_cache reads and writes (with
+the access records and the ID maps), parsing, hashing and file writes run in threads;
+lock waits poll on the loop. aiohttp (shipped with ComfyUI) is imported on first use.
+"""
+import os
+import time
+import asyncio
+import logging
+import pathlib
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List
+
+from civitaiNodes.config import CivitaiConfig, config
+from . import metrics
+from . import model_cache
+from . import model_store
+from .civitaiModelInfo import ModelInfo, versionid_to_modelid_map
+from .download_utils import add_token_to_url, is_download_complete, reserve_download_space
+from .file_lock import FileLock, temp_path_for
+from .http_utils import endpoint_label, raise_if_offline
+from .phase_timing import phase
+from .ui_utils import get_image_cache_path, remove_condition_in_url
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class _LoopState:
+    def __init__(self):
+        self.session = None
+        self.inflight: Dict[Any, asyncio.Future] = {}
+
+
+# aiohttp 的 session 只能在创建它的事件循环中使用
+_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _loop_states.get(loop)
+    if state is None:
+        state = _loop_states[loop] = _LoopState()
+    return state
+
+
+def get_session():
+    """当前事件循环共用的 aiohttp.ClientSession，第一次调用时创建"""
+    import aiohttp
+    state = _state()
+    if state.session is None or state.session.closed:
+        connector = aiohttp.TCPConnector(limit=config.max_connections, limit_per_host=config.max_connections)
+        state.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=config.request_timeout))
+    return state.session
+
+
+async def close_session():
+    state = _state()
+    if state.session is not None and not state.session.closed:
+        await state.session.close()
+    state.session = None
+
+
+async def _single_flight(key, factory: Callable[[], Awaitable[Any]]) -> Any:
+    # 同一个事件循环中对同一资源的并发请求只执行一次
+    inflight = _state().inflight
+    future = inflight.get(key)
+    if future is None:
+        future = inflight[key] = asyncio.ensure_future(factory())
+        future.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def _aacquire(lock: FileLock, timeout: float = None) -> bool:
+    # 在事件循环中轮询，不占用线程池（等待锁的线程会让持有锁的任务拿不到线程）
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not lock.acquire(timeout=0):
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(lock.poll_interval)
+    return True
+
+
+async def aget_json(url: str, config: CivitaiConfig = config) -> Any:
+    raise_if_offline(url)
+    status = "error"
+    start = time.perf_counter()
+    try:
+        async with get_session().get(url) as response:
+            status = str(response.status)
+            response.raise_for_status()
+            return await response.json(content_type=None)
+    finally:
+        metrics.api_request_seconds.observe(time.perf_counter() - start, endpoint=endpoint_label(url), status=status)
+
+
+async def aget_version_json(modelVersionId: int, config: CivitaiConfig = config) -> Dict[str, Any]:
+    with phase("version fetch"):
+        data = await aget_json(f"{config.api_endpoint}/model-versions/{modelVersionId}", config=config)
+    await asyncio.to_thread(versionid_to_modelid_map.__setitem__, modelVersionId, data["modelId"])
+    return data
+
+
+async def aget_model_id_from_version_id(modelVersionId: int, config: CivitaiConfig = config) -> int:
+    # 版本ID表在文件变化时会重新读取，不在事件循环中执行
+    modelId = await asyncio.to_thread(versionid_to_modelid_map.get, modelVersionId)
+    if modelId is not None:
+        return modelId
+
+    async def fetch() -> int:
+        data = await aget_version_json(modelVersionId, config=config)
+        await asyncio.to_thread(model_cache.store_version_doc, config.json_cache_dir, data)
+        return data["modelId"]
+
+    return await _single_flight(("version", modelVersionId), fetch)
+
+
+async def _afetch_model_json(modelId: int, versionId: int, cached: bool, force_update: bool, config: CivitaiConfig) -> Dict[str, Any]:
+    # 与 ModelInfo.get_url_json 的步骤相同，缓存读写在线程中执行
+    with phase("api fetch"):
+        lock = ModelInfo._model_lock(modelId, config=config)
+        locked = await _aacquire(lock, config.request_timeout)
+        try:
+            data = await asyncio.to_thread(ModelInfo._load_locked_json, modelId, versionId, locked, force_update, config)
+            if data is None and cached and versionId is not None:
+                version = await aget_version_json(versionId, config=config)
+                data = await asyncio.to_thread(ModelInfo._merge_version_json, modelId, versionId, version, config)
+            if data is None:
+                data = await aget_json(ModelInfo._model_json_url(modelId, config=config), config=config)
+                await asyncio.to_thread(ModelInfo._store_model_json, data, config)
+        finally:
+            lock.release()
+    return data
+
+
+async def aget_url_json(modelId: int, force_update: bool = False, versionId: int = None, config: CivitaiConfig = config) -> Dict[str, Any]:
+    """ModelInfo.get_url_json 的异步版本"""
+    data, cached = await asyncio.to_thread(ModelInfo._lookup_cached_json, modelId, versionId, force_update, config)
+    if data is not None:
+        return data
+    key = ("model", str(config.json_cache_dir), modelId, versionId, force_update)
+    return await _single_flight(key, lambda: _afetch_model_json(modelId, versionId, cached, force_update, config))
+
+
+async def aload_parsed(modelId: int, versionId: int = None, config: CivitaiConfig = config) -> ModelInfo:
+    parsed_model = await asyncio.to_thread(ModelInfo._cached_parsed, modelId, versionId, config)
+    if parsed_model is not None:
+        return parsed_model
+    data = await aget_url_json(modelId, versionId=versionId, config=config)
+    return await asyncio.to_thread(ModelInfo._parse_and_remember, data, modelId, versionId, config)
+
+
+async def aresolve(url: str, config: CivitaiConfig = config) -> ModelInfo:
+    """ModelInfo(url) 的异步版本，支持与 get_ids_from_url 相同的链接形式"""
+    modelId, modelVersionId = ModelInfo.get_ids_from_url(url)
+    if modelId is None:
+        with phase("version lookup"):
+            modelId = await aget_model_id_from_version_id(modelVersionId, config=config)
+    with phase("resolve"):
+        return await aload_parsed(modelId, modelVersionId, config=config)
+
+
+async def _aget_raw_url(url: str) -> str:
+    # 与 download_utils.get_raw_url 相同：只解析一次重定向，得到实际的文件地址
+    async with get_session().head(url, allow_redirects=False) as response:
+        response.raise_for_status()
+        if response.status in (301, 302, 303, 307, 308):
+            return response.headers["Location"]
+    return url
+
+
+async def adownload_file(url: str, full_path: pathlib.Path):
+    """流式下载到临时文件，完成后改名"""
+    import aiohttp
+    raise_if_offline(pathlib.Path(full_path).name)
+    full_path = pathlib.Path(full_path)
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path_for(full_path)
+    result = "error"
+    size = 0
+    start = time.perf_counter()
+    try:
+        # 大文件的下载时间没有上限，只限制读取的间隔
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=config.request_timeout)
+        async with get_session().get(url, timeout=timeout) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as file:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(file.write, chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, full_path)
+        result = "ok"
+        logging.info(f"Downloaded {full_path}")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+        metrics.download_seconds.observe(time.perf_counter() - start, method="aiohttp", result=result)
+        metrics.downloaded_bytes.inc(size, method="aiohttp")
+
+
+async def adownload_civitai_model(url: str, full_path: pathlib.Path, expected_size: int = None):
+    """download_utils.download_civitai_model 的异步版本，使用相同的锁和磁盘空间检查"""
+    raise_if_offline(pathlib.Path(full_path).name)
+    lock = FileLock(str(full_path) + ".lock", stale_after=config.lock_stale_after)
+    await _aacquire(lock)
+    try:
+        if await asyncio.to_thread(is_download_complete, full_path):
+            return
+        reservation = reserve_download_space(full_path, expected_size)
+        await asyncio.to_thread(reservation.__enter__)
+        try:
+            raw_url = await _aget_raw_url(add_token_to_url(url, config.token))
+            await adownload_file(raw_url, full_path)
+        finally:
+            reservation.__exit__(None, None, None)
+    finally:
+        lock.release()
+
+
+async def adownload(modelinfo: ModelInfo, full_path: pathlib.Path = None):
+    """ModelInfo.download 的异步版本，开启 download.store 时同样使用内容寻址仓库"""
+    full_path = pathlib.Path(full_path or modelinfo.full_path)
+    sha256 = modelinfo.sha256
+    if not modelinfo.use_store:
+        await _single_flight(("download", str(full_path)),
+                             lambda: adownload_civitai_model(modelinfo.downloadUrl, full_path, expected_size=modelinfo.expected_size))
+        return
+    blob = model_store.blob_path(config.model_store_dir, sha256)
+    if not blob.exists():
+        await _single_flight(("blob", str(blob)), lambda: _afetch_blob(modelinfo, sha256, blob, full_path.suffix))
+    # link_mode 为 copy 时会复制整个文件
+    await asyncio.to_thread(model_store.link_blob, blob, full_path, config.link_mode)
+
+
+async def _afetch_blob(modelinfo: ModelInfo, sha256: str, blob: pathlib.Path, suffix: str):
+    # 与 model_store.fetch_blob 相同：在 blob 锁内下载到 incoming，校验 SHA256 后移入仓库
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    lock = FileLock(str(blob) + ".lock", stale_after=config.lock_stale_after)
+    await _aacquire(lock)
+    try:
+        if blob.exists():
+            return
+        incoming = model_store.incoming_path(config.model_store_dir, sha256, suffix)
+        await adownload_civitai_model(modelinfo.downloadUrl, incoming, expected_size=modelinfo.expected_size)
+        with phase("verify"):
+            await asyncio.to_thread(model_store.store_incoming, incoming, blob, sha256, modelinfo.downloadUrl)
+    finally:
+        lock.release()
+
+
+async def _afetch_preview(url: str) -> pathlib.Path:
+    path = get_image_cache_path(url)
+    if path.exists():
+        metrics.preview_cache_requests.inc(result="hit")
+        return path
+    metrics.preview_cache_requests.inc(result="miss")
+    raise_if_offline(url)
+    with metrics.preview_load_seconds.time():
+        # 与 ui_utils.load_image_from_url 一致，使用 width=450 的缩略图
+        async with get_session().get(remove_condition_in_url(url)) as response:
+            response.raise_for_status()
+            content = await response.read()
+    tmp_path = temp_path_for(path)
+    await asyncio.to_thread(tmp_path.write_bytes, content)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def afetch_previews(image_urls: List[str], limit: int = None) -> List[pathlib.Path]:
+    """并发下载预览图到 http_image_cache（与节点使用的缓存相同），返回缓存路径；失败的图片为 None"""
+    if limit is not None:
+        image_urls = image_urls[:limit]
+    results = await asyncio.gather(
+        *(_single_flight(("preview", url), lambda url=url: _afetch_preview(url)) for url in image_urls),
+        return_exceptions=True,
+    )
+    paths = []
+    for url, result in zip(image_urls, results):
+        if isinstance(result, BaseException):
+            logging.info(f"Could not fetch preview {url}: {result}")
+            paths.append(None)
+        else:
+            paths.append(result)
+    return paths
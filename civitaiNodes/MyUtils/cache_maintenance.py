@@ -0,0 +1,257 @@
+"""
+Garbage collection for json_cache.
+
+Every model ever looked up leaves a directory in json_cache/models/. A maintenance
+run keeps the cache within civitai.cache_max_mb and civitai.cache_max_entries:
+
+1. legacy json_cache/{modelId}.json files and unsharded model directories are
+   migrated, and model directories without model.json (interrupted writes) are
+   removed once they are older than ORPHAN_AGE;
+2. the models are ordered by their last access, taken from the access index
+   (json_cache/access_index.json, see record_access) and the fetch time;
+3. the least recently used models are removed until both budgets hold.
+
+Models referenced by local files are never removed: the ones in the file hash
+map whose file still exists, and the ones with a version file present in the
+loras / checkpoints folders, either under the name it is downloaded as
+(ModelInfo.filename, "Title - Version - file") or under its civitai file name. Models accessed within PROTECT_RECENT and models
+whose lock is held by another worker are skipped as well. Accesses are recorded
+in memory and merged into the index by each run and at exit, so lookups never
+write to the shared volume.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import pathlib
+import threading
+from typing import Any, Dict, Iterable, Set, Tuple
+
+from civitaiNodes.config import config
+from . import metrics
+from . import model_cache
+from .file_lock import FileLock, temp_path_for
+
+MB = 1024 * 1024
+# 最近访问过的模型不删除，避免删除正在使用的缓存
+PROTECT_RECENT = 3600
+# 没有 model.json 的目录（写入中断）超过这个时间后删除
+ORPHAN_AGE = 24 * 3600
+
+
+class AccessIndex:
+    """modelId -> 最近一次访问时间，记录在内存中，flush 时合并到索引文件"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._pending: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, modelId: int):
+        self._pending[modelId] = time.time()
+
+    def _read(self) -> Dict[int, float]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        return {int(modelId): accessed_at for modelId, accessed_at in data.items()}
+
+    @staticmethod
+    def _merge(accessed: Dict[int, float], pending: Dict[int, float]) -> Dict[int, float]:
+        for modelId, accessed_at in pending.items():
+            accessed[modelId] = max(accessed.get(modelId, 0), accessed_at)
+        return accessed
+
+    def load(self) -> Dict[int, float]:
+        return self._merge(self._read(), dict(self._pending))
+
+    def flush(self, removed: Iterable[int] = ()) -> Dict[int, float]:
+        """把内存中的访问记录合并到索引文件（多个进程共享时取最大值），返回合并后的索引"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, FileLock(str(self.path) + ".lock", stale_after=30, heartbeat=False):
+            pending, self._pending = self._pending, {}
+            accessed = self._merge(self._read(), pending)
+            for modelId in removed:
+                accessed.pop(modelId, None)
+            tmp_path = temp_path_for(self.path)
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({str(modelId): accessed_at for modelId, accessed_at in accessed.items()}, file)
+            os.replace(tmp_path, self.path)
+        return accessed
+
+
+_access_indexes: Dict[str, AccessIndex] = {}
+
+
+def get_access_index(cache_dir: pathlib.Path) -> AccessIndex:
+    key = str(cache_dir)
+    index = _access_indexes.get(key)
+    if index is None:
+        index = _access_indexes.setdefault(key, AccessIndex(pathlib.Path(cache_dir) / "access_index.json"))
+    return index
+
+
+def record_access(cache_dir: pathlib.Path, modelId: int):
+    get_access_index(cache_dir).record(modelId)
+
+
+@atexit.register
+def _flush_access_indexes():
+    for index in list(_access_indexes.values()):
+        if len(index._pending) == 0:
+            continue
+        try:
+            index.flush()
+        except Exception as e:
+            logging.debug(f"Could not save {index.path}: {e}")
+
+
+def referenced_model_ids(hash_map) -> Set[int]:
+    """文件哈希表中本地文件仍然存在的模型"""
+    referenced = set()
+    for filepath, item in list(hash_map.items()):
+        if os.path.exists(filepath):
+            referenced.add(item["modelId"])
+    return referenced
+
+
+def local_filenames(folders=("loras", "checkpoints")) -> Set[str]:
+    import folder_paths
+    return {os.path.basename(name) for folder in folders for name in folder_paths.get_filename_list(folder)}
+
+
+def _local_names(model: Dict[str, Any], version: Dict[str, Any]) -> Tuple[Set[str], pathlib.Path | None]:
+    """版本文件在本地可能的文件名和下载位置：通过 URL 下载时保存为 ModelInfo.filename（"标题 - 版本 - 原始文件名"），
+    手动放入的文件保留 civitai 上的原始文件名"""
+    from .civitaiModelInfo import ModelInfo
+    names = {file.get("name") for file in version.get("files", [])}
+    try:
+        info = ModelInfo.parse_model_id_json({**model, "modelVersions": [version]}, modelVersionId=version["id"])
+    except Exception as e:
+        logging.debug(f"Could not parse cached version {version.get('id')}: {e}")
+        return names, None
+    names.add(info.filename)
+    return names, info.full_path
+
+
+def _has_local_file(directory: str, filenames: Set[str]) -> bool:
+    # 通过 URL 下载的模型不在哈希表中，按版本的文件名和下载位置判断是否已下载
+    model = None
+    for entry in os.scandir(directory):
+        if not (entry.name.endswith(".json") and entry.name[:-5].isdigit()):
+            continue
+        try:
+            with open(entry.path, "r", encoding="utf-8") as file:
+                version = json.load(file)
+            if model is None:
+                with open(os.path.join(directory, "model.json"), "r", encoding="utf-8") as file:
+                    model = json.load(file)
+        except (OSError, ValueError):
+            continue
+        names, full_path = _local_names(model, version)
+        if not names.isdisjoint(filenames) or (full_path is not None and full_path.exists()):
+            return True
+    return False
+
+
+def collect(cache_dir: pathlib.Path, max_bytes: int = 0, max_entries: int = 0, referenced: Set[int] = frozenset(),
+            filenames: Set[str] = frozenset(), now: float = None) -> Dict[str, Any]:
+    """执行一次维护，max_bytes / max_entries 为 0 时不限制，返回统计信息"""
+    now = time.time() if now is None else now
+    cache_dir = pathlib.Path(cache_dir)
+    model_cache.migrate_legacy_cache(cache_dir, keep_raw=config.keep_raw_json)
+    model_cache.migrate_unsharded_cache(cache_dir)
+    access_index = get_access_index(cache_dir)
+    accessed = access_index.flush()
+
+    models = []
+    orphans = 0
+    for modelId, path in model_cache.iter_model_dirs(cache_dir):
+        size, _ = model_cache.dir_usage(path)
+        try:
+            fetched = os.stat(os.path.join(path, "model.json")).st_mtime
+        except FileNotFoundError:
+            if now - os.stat(path).st_mtime > ORPHAN_AGE:
+                model_cache.remove_model(cache_dir, modelId)
+                metrics.json_cache_evictions.inc(reason="orphan")
+                orphans += 1
+            continue
+        models.append((max(accessed.get(modelId, 0), fetched), modelId, path, size))
+
+    total_bytes = sum(model[3] for model in models)
+    total_entries = len(models)
+    evicted = []
+    freed = 0
+    protected = 0
+    models.sort()
+    for last_access, modelId, path, size in models:
+        over_bytes = max_bytes > 0 and total_bytes > max_bytes
+        over_entries = max_entries > 0 and total_entries > max_entries
+        if not (over_bytes or over_entries):
+            break
+        if modelId in referenced or now - last_access < PROTECT_RECENT or _has_local_file(path, filenames):
+            protected += 1
+            continue
+        lock = FileLock(model_cache.lock_path(cache_dir, modelId), stale_after=config.lock_stale_after, heartbeat=False)
+        if not lock.acquire(timeout=0):
+            # 另一个进程正在获取该模型
+            protected += 1
+            continue
+        try:
+            model_cache.remove_model(cache_dir, modelId)
+        finally:
+            lock.release()
+        metrics.json_cache_evictions.inc(reason="budget")
+        evicted.append(modelId)
+        total_bytes -= size
+        total_entries -= 1
+        freed += size
+    if len(evicted) > 0:
+        access_index.flush(removed=evicted)
+    return {
+        "entries": total_entries,
+        "bytes": total_bytes,
+        "evicted": len(evicted),
+        "freed_bytes": freed,
+        "protected": protected,
+        "orphans": orphans,
+    }
+
+
+def run_maintenance() -> Dict[str, Any]:
+    """按 settings.toml 中的预算维护 json_cache"""
+    from .civitaiModelInfo import filepath_to_hash_map
+    start = time.perf_counter()
+    report = collect(
+        config.json_cache_dir,
+        max_bytes=config.cache_max_mb * MB,
+        max_entries=config.cache_max_entries,
+        referenced=referenced_model_ids(filepath_to_hash_map),
+        filenames=local_filenames(),
+    )
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    logging.info(f"XTNodes: json_cache maintenance: {report}")
+    return report
+
+
+def _maintenance_loop(interval: float):
+    while True:
+        try:
+            run_maintenance()
+        except Exception as e:
+            logging.exception(f"XTNodes: json_cache maintenance failed: {e}")
+        if interval <= 0:
+            return
+        time.sleep(interval)
+
+
+def start_scheduled_maintenance(interval_hours: float) -> threading.Thread | None:
+    """在后台线程中立即执行一次维护，之后每 interval_hours 小时执行一次；为 0 时只执行一次，小于 0 时不执行"""
+    if interval_hours < 0:
+        return None
+    thread = threading.Thread(target=_maintenance_loop, args=(interval_hours * 3600,), name="xtnodes-json-cache-gc", daemon=True)
+    thread.start()
+    return thread
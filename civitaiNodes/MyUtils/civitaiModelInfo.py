@@ -8,14 +8,21 @@ from sanitize_filename import sanitize as sanitize_filename
 import blake3
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 import sys
-from codetiming import Timer
 
 from civitaiNodes.config import CivitaiConfig, config
 from folder_paths import models_dir
 
 models_folder = config.models_folder
-from .download_utils import download_civitai_model
+from .download_utils import download_civitai_model, is_download_complete, add_token_to_url, get_raw_url
+from . import safetensors_utils
+from . import model_store
 from .LazyLoadDict import LazyLoadDict
+from . import model_cache
+from . import cache_maintenance
+from .file_lock import FileLock
+from .http_utils import http_get, raise_if_offline
+from . import metrics
+from .phase_timing import phase
 
 
 def remove_condition_in_url(url: str) -> str:
@@ -69,29 +76,91 @@ filepath_to_hash_map = LazyLoadDict(config.json_cache_dir / "filepath_to_hash_ma
 
 def get_blake3_hash(filepath) -> str:
     hasher = blake3.blake3()  # 初始化 BLAKE3 哈希对象
-    with open(filepath, "rb") as file:
-        while chunk := file.read(8192):  # 分块读取文件
-            hasher.update(chunk)  # 更新哈希值
+    size = 0
+    with metrics.hash_seconds.time():
+        with open(filepath, "rb") as file:
+            while chunk := file.read(8192):  # 分块读取文件
+                hasher.update(chunk)  # 更新哈希值
+                size += len(chunk)
+    metrics.hashed_bytes.inc(size)
     return hasher.hexdigest()
 
+def _file_stat(filepath: pathlib.Path) -> Dict[str, int]:
+    stat = filepath.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def lookup_hash_map(filepath: pathlib.Path) -> Dict[str, Any] | None:
+    """文件哈希表中的记录；同一路径的文件被替换（大小或修改时间不同）时视为未命中"""
+    item = filepath_to_hash_map.get(filepath)
+    if item is None:
+        return None
+    try:
+        stat = _file_stat(filepath)
+    except OSError:
+        return None
+    if "size" not in item:
+        # 旧版本写入的记录没有文件信息，补上后继续使用，避免重新计算所有文件的哈希
+        filepath_to_hash_map[filepath] = {**item, **stat}
+        return item
+    if item["size"] != stat["size"] or item.get("mtime_ns") != stat["mtime_ns"]:
+        return None
+    return item
+
 def get_ids_from_file(filepath, force_update: bool = False) -> tuple[int, int]:
     # 获取文件的Blake3哈希值并从API中获取对应的模型ID和版本ID
     if not isinstance(filepath, pathlib.Path):
         filepath = pathlib.Path(filepath)
     filepath = filepath.resolve()
-    if filepath in filepath_to_hash_map:
-        item = filepath_to_hash_map[filepath]
+    item = lookup_hash_map(filepath)
+    if item is not None:
+        metrics.hash_map_requests.inc(result="hit")
         return item["modelId"], item["modelVersionId"]
-    hash = get_blake3_hash(filepath)
+    metrics.hash_map_requests.inc(result="miss")
+    # 离线时查不到哈希对应的模型，无需计算哈希
+    raise_if_offline(f"model info of {filepath.name}")
+    # 在计算哈希前记录文件信息，计算期间文件被替换时下次会重新计算
+    stat = _file_stat(filepath)
+    with phase("hash"):
+        hash = get_blake3_hash(filepath)
     url = config.api_endpoint + "/model-versions/by-hash/" + hash
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
+    with phase("hash lookup"):
+        response = http_get(url)
+        response.raise_for_status()
+        data = response.json()
     modelId = data["modelId"]
     modelVersionId = data["id"]
-    filepath_to_hash_map[filepath] = {"modelId": modelId, "modelVersionId": modelVersionId}
+    filepath_to_hash_map[filepath] = {"modelId": modelId, "modelVersionId": modelVersionId, **stat}
+    # by-hash 返回的就是版本文档，模型已缓存时直接补充该版本
+    model_cache.store_version_doc(config.json_cache_dir, data)
     return modelId, modelVersionId
 
+versionid_to_modelid_map = LazyLoadDict(config.json_cache_dir / "versionid_to_modelid_map.json")
+
+def get_version_json(modelVersionId: int, config: CivitaiConfig = config) -> Dict[str, Any]:
+    # /model-versions/{id} 只包含一个版本（不含模型的 tags），比 /models/{id} 小得多
+    with phase("version fetch"):
+        response = http_get(f"{config.api_endpoint}/model-versions/{modelVersionId}")
+        response.raise_for_status()
+        data = response.json()
+    versionid_to_modelid_map[modelVersionId] = data["modelId"]
+    return data
+
+def get_model_id_from_version_id(modelVersionId: int) -> int:
+    # 只知道版本ID时（如下载链接），通过 /model-versions/{id} 获取模型ID，结果会缓存
+    if modelVersionId in versionid_to_modelid_map:
+        return versionid_to_modelid_map[modelVersionId]
+    data = get_version_json(modelVersionId)
+    model_cache.store_version_doc(config.json_cache_dir, data)
+    return data["modelId"]
+
+# 支持的链接形式，按顺序匹配（下载链接中也包含 models/<id>，需要先匹配）
+_DOWNLOAD_URL = re.compile(r"/api/download/models/(\d+)")
+_VERSION_API_URL = re.compile(r"/model-versions/(\d+)")
+_MODEL_URL = re.compile(r"models/(\d+)")
+_VERSION_QUERY = re.compile(r"modelVersionId=(\d+)")
+# AIR: urn:air:sdxl:lora:civitai:328553@368189（可带 :layer 和 .format），或简写 civitai:328553@368189
+_AIR = re.compile(r"^(?:urn:air:[\w.-]+:[\w.-]+:)?civitai:(\d+)(?:@(\d+))?(?::[\w-]+)?(?:\.\w+)?$", re.IGNORECASE)
+
 def get_image_urls_from_file(filepath) -> list[str]:
     modelId, _ = get_ids_from_file(filepath)
     return ModelInfo(modelId=modelId).image_urls
@@ -120,6 +189,10 @@ def gather_prompt_list(prompt_list: list[str]) -> list[str]:
 
 
 
+# 解析后的 ModelInfo，(json_cache_dir, modelId, versionId) -> ModelInfo，model.json 变化后失效
+parsed_modelinfo_cache = model_cache.MtimeLRUCache(maxsize=config.modelinfo_cache_size)
+
+
 class ModelInfo(BaseModel):
     # 定义模型信息的结构
     id: int
@@ -145,28 +218,161 @@ class ModelInfo(BaseModel):
                 return True
         return False
 
+    # 以下 _ 开头的方法不做网络访问，由同步 API 和 async_client 中的异步 API 共用
+
     @staticmethod
-    def get_url_json(modelId: int, force_update: bool = False, versionId: int = None, config: CivitaiConfig = config) -> Dict[str, Any]:
-        # 从缓存中获取模型信息JSON或通过API请求获取数据
-        json_cache_path = config.json_cache_dir / f"{modelId}.json"
-        if not force_update and json_cache_path.exists():
-            with open(json_cache_path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            if versionId is None or ModelInfo.check_versionId(data, versionId):
-                return data
-        response = requests.get(f"{config.api_endpoint}/models/{modelId}")
-        response.raise_for_status()
-        data = response.json()
-        with open(json_cache_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4)
+    def _load_cached_json(modelId: int, versionId: int = None, config: CivitaiConfig = config) -> tuple[Dict[str, Any] | None, bool]:
+        """在精简缓存中查找，返回 (模型文档, 模型是否已缓存)；已缓存但没有该版本时文档为 None"""
+        with phase("json cache"):
+            data = model_cache.load_model_doc(config.json_cache_dir, modelId, versionId, keep_raw=config.keep_raw_json)
+        if data is not None:
+            metrics.json_cache_requests.inc(result="hit")
+            cache_maintenance.record_access(config.json_cache_dir, modelId)
+            return data, True
+        cached = model_cache.load_model(config.json_cache_dir, modelId) is not None
+        metrics.json_cache_requests.inc(result="stale" if cached else "miss")
+        return None, cached
+
+    @classmethod
+    def _lookup_cached_json(cls, modelId: int, versionId: int = None, force_update: bool = False, config: CivitaiConfig = config) -> tuple[Dict[str, Any] | None, bool]:
+        """获取前的缓存查找，返回值同 _load_cached_json；force_update 时不读取缓存"""
+        if force_update:
+            metrics.json_cache_requests.inc(result="miss")
+            return None, False
+        return cls._load_cached_json(modelId, versionId, config=config)
+
+    @staticmethod
+    def _load_locked_json(modelId: int, versionId: int, locked: bool, force_update: bool, config: CivitaiConfig = config) -> Dict[str, Any] | None:
+        # 拿到锁后重新读取缓存：等待期间另一个进程可能已经获取并写入
+        if not locked or force_update:
+            return None
+        return model_cache.load_model_doc(config.json_cache_dir, modelId, versionId)
+
+    @staticmethod
+    def _model_json_url(modelId: int, config: CivitaiConfig = config) -> str:
+        return f"{config.api_endpoint}/models/{modelId}"
+
+    @staticmethod
+    def _merge_version_json(modelId: int, versionId: int, version: Dict[str, Any], config: CivitaiConfig = config) -> Dict[str, Any] | None:
+        # 把单独获取的版本加入已缓存的模型，成功时返回模型文档
+        if version["modelId"] != modelId or not model_cache.store_version_doc(config.json_cache_dir, version):
+            return None
+        return model_cache.load_model_doc(config.json_cache_dir, modelId, versionId)
+
+    @staticmethod
+    def _store_model_json(data: Dict[str, Any], config: CivitaiConfig = config):
+        model_cache.store_model_doc(config.json_cache_dir, data, keep_raw=config.keep_raw_json)
+        versionid_to_modelid_map.update({version["id"]: data["id"] for version in data["modelVersions"]})
+
+    @staticmethod
+    def _model_lock(modelId: int, config: CivitaiConfig = config) -> FileLock:
+        # 共享 json_cache 时同一模型只由一个进程获取；等不到锁时照常获取
+        return FileLock(model_cache.lock_path(config.json_cache_dir, modelId), stale_after=config.lock_stale_after, heartbeat=False)
+
+    @staticmethod
+    def _cached_parsed(modelId: int, versionId: int = None, config: CivitaiConfig = config) -> "ModelInfo | None":
+        key = (str(config.json_cache_dir), modelId, versionId)
+        # 未指定版本时，要比较的版本文件是缓存中的结果对应的默认版本
+        parsed_model = parsed_modelinfo_cache.peek(key)
+        if parsed_model is not None:
+            mtime = model_cache.version_mtime(config.json_cache_dir, modelId, parsed_model.versionId)
+            parsed_model = parsed_modelinfo_cache.get(key, mtime)
+            if parsed_model is not None:
+                metrics.modelinfo_cache_requests.inc(result="hit")
+                cache_maintenance.record_access(config.json_cache_dir, modelId)
+                return parsed_model
+        metrics.modelinfo_cache_requests.inc(result="miss")
+        return None
+
+    @classmethod
+    def _parse_and_remember(cls, data: Dict[str, Any], modelId: int, versionId: int = None, config: CivitaiConfig = config) -> "ModelInfo":
+        with phase("parse"):
+            parsed_model = cls.parse_model_id_json(data, modelVersionId=versionId)
+        # 可能刚从 API 获取并写入缓存，重新读取 mtime
+        mtime = model_cache.version_mtime(config.json_cache_dir, modelId, parsed_model.versionId)
+        if mtime is not None:
+            parsed_modelinfo_cache.put((str(config.json_cache_dir), modelId, versionId), mtime, parsed_model)
+            if versionId is None:
+                parsed_modelinfo_cache.put((str(config.json_cache_dir), modelId, parsed_model.versionId), mtime, parsed_model)
+        return parsed_model
+
+    @classmethod
+    def get_url_json(cls, modelId: int, force_update: bool = False, versionId: int = None, config: CivitaiConfig = config) -> Dict[str, Any]:
+        # 从精简缓存中获取模型信息（只包含所需版本）或通过API请求获取数据
+        # 各步骤与 async_client.aget_url_json 共用，只有网络访问不同
+        data, cached = cls._lookup_cached_json(modelId, versionId, force_update, config=config)
+        if data is not None:
+            return data
+        with phase("api fetch"):
+            lock = cls._model_lock(modelId, config=config)
+            locked = lock.acquire(timeout=config.request_timeout)
+            try:
+                data = cls._load_locked_json(modelId, versionId, locked, force_update, config=config)
+                if data is None and cached and versionId is not None:
+                    # 模型已缓存但没有该版本（新发布的版本）：只获取这一个版本，模型级信息沿用缓存
+                    data = cls._merge_version_json(modelId, versionId, get_version_json(versionId, config=config), config=config)
+                if data is None:
+                    response = http_get(cls._model_json_url(modelId, config=config))
+                    response.raise_for_status()
+                    data = response.json()
+                    cls._store_model_json(data, config=config)
+            finally:
+                lock.release()
         return data
 
+    @classmethod
+    def load_parsed(cls, modelId: int, versionId: int = None, config: CivitaiConfig = config) -> "ModelInfo":
+        """返回解析好的 ModelInfo，缓存未变化时直接使用内存中的结果，不读取文件也不重新校验"""
+        parsed_model = cls._cached_parsed(modelId, versionId, config=config)
+        if parsed_model is not None:
+            return parsed_model
+        data = cls.get_url_json(modelId=modelId, versionId=versionId, config=config)
+        return cls._parse_and_remember(data, modelId, versionId, config=config)
+
+    @classmethod
+    def from_cache(cls, url: str = None, filepath: str = None, config: CivitaiConfig = config) -> "ModelInfo | None":
+        """只使用本地缓存（json_cache、文件哈希表、版本ID表）解析，未缓存时返回 None；不访问网络，也不计算文件哈希"""
+        if url is not None:
+            modelId, versionId = cls.get_ids_from_url(url)
+            if modelId is None:
+                modelId = versionid_to_modelid_map.get(versionId)
+        else:
+            item = lookup_hash_map(pathlib.Path(filepath).resolve())
+            if item is None:
+                return None
+            modelId, versionId = item["modelId"], item["modelVersionId"]
+        if modelId is None:
+            return None
+        parsed_model = cls._cached_parsed(modelId, versionId, config=config)
+        if parsed_model is not None:
+            return parsed_model
+        data, _ = cls._load_cached_json(modelId, versionId, config=config)
+        if data is None:
+            return None
+        return cls._parse_and_remember(data, modelId, versionId, config=config)
+
+    @classmethod
+    async def aresolve(cls, url: str, config: CivitaiConfig = config) -> "ModelInfo":
+        """异步版本的 ModelInfo(url)，见 async_client"""
+        from .async_client import aresolve
+        return await aresolve(url, config=config)
+
     @staticmethod
-    def get_ids_from_url(url: str) -> tuple[int, int]:
-        # 从URL中提取模型ID和版本ID
-        model_id = re.search(r"models/(\d+)", url).group(1)
-        model_version_id = re.search(r"modelVersionId=(\d+)", url)
-        return int(model_id), int(model_version_id.group(1)) if model_version_id else None
+    def get_ids_from_url(url: str) -> tuple[int | None, int | None]:
+        # 从URL中提取模型ID和版本ID，下载链接等只包含版本ID的形式模型ID为 None
+        url = url.strip()
+        air = _AIR.match(url)
+        if air is not None:
+            return int(air.group(1)), int(air.group(2)) if air.group(2) else None
+        for pattern in (_DOWNLOAD_URL, _VERSION_API_URL):
+            match = pattern.search(url)
+            if match is not None:
+                return None, int(match.group(1))
+        model_id = _MODEL_URL.search(url)
+        if model_id is None:
+            raise ValueError(f"Could not find a model ID in {url}")
+        model_version_id = _VERSION_QUERY.search(url)
+        return int(model_id.group(1)), int(model_version_id.group(1)) if model_version_id else None
 
     def __init__(
         self,
@@ -180,11 +386,13 @@ class ModelInfo(BaseModel):
         # 初始化 ModelInfo 对象，可以通过URL或直接通过模型ID和版本ID来初始化
         if url is not None:
             modelId, modelVersionId = self.get_ids_from_url(url)
+            if modelId is None:
+                with phase("version lookup"):
+                    modelId = get_model_id_from_version_id(modelVersionId)
         elif filepath is not None:
             modelId, modelVersionId = get_ids_from_file(filepath)
         if modelId is not None:
-            data = self.get_url_json(modelId=modelId, versionId=modelVersionId, config=config)
-            parsed_model = self.parse_model_id_json(data, modelVersionId=modelVersionId)
+            parsed_model = self.load_parsed(modelId, modelVersionId, config=config)
             self.__dict__.update(parsed_model.__dict__)
             return
         super().__init__(**data)
@@ -221,12 +429,42 @@ class ModelInfo(BaseModel):
         # 获取模型图片的URL列表
         return [image["url"] for image in self.images]
 
+    @property
+    def primary_file(self) -> Dict[str, Any] | None:
+        # 版本下载链接对应的文件，与 rawFilename 一致
+        for file in self.files:
+            if file.get("downloadUrl") == self.downloadUrl:
+                return file
+        return None
+
+    @property
+    def expected_size(self) -> int | None:
+        # civitai.com 公布的文件大小（字节），用于下载前检查剩余空间
+        file = self.primary_file
+        if file is None or not file.get("sizeKB"):
+            return None
+        return int(file["sizeKB"] * 1024)
+
+    @property
+    def sha256(self) -> str | None:
+        file = self.primary_file
+        if file is None:
+            return None
+        return (file.get("hashes") or {}).get("SHA256")
+
+    @property
+    def use_store(self) -> bool:
+        # 开启 download.store 且知道文件的 SHA256 时下载到内容寻址仓库
+        return config.model_store and self.sha256 is not None
+
     @property
     def finish_downloaded(self) -> bool:
-        full_path = self.full_path
-        if pathlib.Path(str(full_path) + ".aria2").exists():
-            return False
-        return full_path.exists()
+        return is_download_complete(self.full_path)
+
+    @property
+    def in_store(self) -> bool:
+        # 开启 download.store 时，仓库中已有该文件则下载只需创建链接
+        return self.use_store and model_store.blob_path(config.model_store_dir, self.sha256).exists()
 
     @property
     def summary(self) -> str:
@@ -244,12 +482,47 @@ class ModelInfo(BaseModel):
             result += f"\nTrained Words: { ', '.join(self.trainedWords) }"
         return result
 
-    # @Timer(text="Download Time: {seconds:.1f} seconds")
+    def safetensors_summary(self, force_update: bool = False) -> Dict[str, Any] | None:
+        """模型文件 safetensors 头部的概要（大小、dtype、参数量、metadata），不是 safetensors 文件时返回 None
+        已下载时读取本地文件，否则只通过 Range 请求读取远程文件的头部，结果缓存在 json_cache"""
+        if not self.rawFilename.lower().endswith(".safetensors"):
+            return None
+        if self.finish_downloaded:
+            header = safetensors_utils.read_header_from_file(self.full_path)
+            return safetensors_utils.summarize_header(header, self.full_path.stat().st_size)
+        cache_dir = config.json_cache_dir
+        if not force_update:
+            summary = model_cache.load_header_summary(cache_dir, self.id, self.versionId)
+            if summary is not None:
+                return summary
+        raise_if_offline(f"safetensors header of {self.rawFilename}")
+        with phase("header"):
+            url = get_raw_url(add_token_to_url(self.downloadUrl, config.token))
+            header, size = safetensors_utils.read_header_from_url(url)
+        summary = safetensors_utils.summarize_header(header, size)
+        model_cache.store_header_summary(cache_dir, self.id, self.versionId, summary)
+        return summary
+
     def download(self, full_path: pathlib.Path = None):
         # 下载模型文件
         if full_path is None:
             full_path = self.full_path
-        download_civitai_model(self.downloadUrl, full_path)
+        if self.use_store:
+            model_store.download_to_store(self.downloadUrl, self.sha256, full_path, config.model_store_dir,
+                                          link_mode=config.link_mode, stale_after=config.lock_stale_after,
+                                          expected_size=self.expected_size)
+            return
+        download_civitai_model(self.downloadUrl, full_path, expected_size=self.expected_size)
+
+    async def adownload(self, full_path: pathlib.Path = None):
+        """异步版本的 download，见 async_client"""
+        from .async_client import adownload
+        await adownload(self, full_path)
+
+    async def afetch_previews(self, limit: int = None) -> list[pathlib.Path]:
+        """并发下载前 limit 张（默认 max_preview_images）预览图到缓存，返回缓存路径"""
+        from .async_client import afetch_previews
+        return await afetch_previews(self.image_urls, limit=config.max_preview_images if limit is None else limit)
 
     @classmethod
     def parse_model_id_json(cls, data: Dict[str, Any], modelVersionId: int = None) -> "ModelInfo":
@@ -0,0 +1,137 @@
+"""
+Disk-space admission control for model downloads.
+
+Before a download starts, its expected size (files[].sizeKB of the model version)
+is reserved against the filesystem of the target path. A download is admitted
+only if
+
+    free space - space reserved by in-flight downloads - min_free_mb >= remaining size
+
+where the remaining size excludes what a resumable (aria2) partial file already
+holds. While a download runs, the bytes it has written (the target file and its
+temp files) are already missing from the free space, so they are subtracted from
+its reservation instead of being counted twice. Downloads that do not fit fail fast with InsufficientDiskSpace, or wait
+until an in-flight download is released or space is freed (download.on_disk_full).
+Reservations are tracked per process; other processes only show up through the
+free space they have already used.
+"""
+import os
+import glob
+import time
+import shutil
+import logging
+import pathlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+from . import metrics
+
+MB = 1024 * 1024
+# 等待空间时重新检查剩余空间的间隔（用户可能删除了文件）
+RECHECK_INTERVAL = 5.0
+
+
+class InsufficientDiskSpace(OSError):
+    """目标磁盘没有足够的剩余空间下载该文件"""
+    pass
+
+
+def _existing_dir(path: pathlib.Path) -> pathlib.Path:
+    # 目标目录可能还不存在，使用最近的已存在的上级目录
+    path = pathlib.Path(path).absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def _written(path: pathlib.Path) -> int:
+    """目标文件和它的临时文件（temp_path_for）当前的大小"""
+    written = 0
+    candidates = [path]
+    if path.parent.exists():
+        candidates += path.parent.glob(f"{glob.escape(path.name)}.*.tmp")
+    for candidate in candidates:
+        try:
+            written += candidate.stat().st_size
+        except OSError:
+            pass
+    return written
+
+
+class _Reservation:
+    def __init__(self, path: pathlib.Path, size: int):
+        self.path = path
+        self.size = size
+        self.initial = _written(path)
+
+    def outstanding(self) -> int:
+        # 已经写入的部分已经反映在剩余空间中
+        return max(0, self.size - (_written(self.path) - self.initial))
+
+
+class DiskSpaceGuard:
+    def __init__(self):
+        self._reservations: Dict[int, List[_Reservation]] = {}  # st_dev -> 进行中的下载
+        self._condition = threading.Condition()
+
+    def _reserved(self, device: int) -> int:
+        return sum(reservation.outstanding() for reservation in self._reservations.get(device, []))
+
+    def reserved(self, path) -> int:
+        """进行中的下载还需要写入的字节数"""
+        device = os.stat(_existing_dir(path)).st_dev
+        with self._condition:
+            return self._reserved(device)
+
+    def available(self, path, min_free: int = 0) -> int:
+        """可用于新下载的字节数：剩余空间减去已预留的空间和最低剩余空间"""
+        directory = _existing_dir(path)
+        device = os.stat(directory).st_dev
+        with self._condition:
+            return shutil.disk_usage(directory).free - self._reserved(device) - min_free
+
+    @contextmanager
+    def reserve(self, path, size: int, min_free: int = 0, wait: bool = False, timeout: float = None):
+        """在 path 所在的文件系统上预留 size 字节，with 代码块结束后释放
+        空间不足时 wait=False 立即抛出 InsufficientDiskSpace，否则最多等待 timeout 秒"""
+        path = pathlib.Path(path)
+        if size is None or size <= 0:
+            yield
+            return
+        # aria2 续传时已有的部分不需要再预留
+        if path.exists():
+            size = max(0, size - path.stat().st_size)
+        directory = _existing_dir(path.parent)
+        device = os.stat(directory).st_dev
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        with self._condition:
+            while True:
+                reserved = self._reserved(device)
+                free = shutil.disk_usage(directory).free
+                if free - reserved - min_free >= size:
+                    break
+                message = (f"Not enough disk space for {path.name}: needs {size / MB:.0f} MB, "
+                           f"{free / MB:.0f} MB free, {reserved / MB:.0f} MB reserved by running downloads, "
+                           f"{min_free / MB:.0f} MB kept free (download.min_free_mb)")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not wait or (remaining is not None and remaining <= 0):
+                    metrics.download_admissions.inc(result="rejected")
+                    raise InsufficientDiskSpace(message)
+                if not waited:
+                    logging.warning(message + ", waiting")
+                    waited = True
+                self._condition.wait(RECHECK_INTERVAL if remaining is None else min(RECHECK_INTERVAL, remaining))
+            reservation = _Reservation(path, size)
+            self._reservations.setdefault(device, []).append(reservation)
+        metrics.download_admissions.inc(result="waited" if waited else "admitted")
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reservations[device].remove(reservation)
+                self._condition.notify_all()
+
+
+guard = DiskSpaceGuard()
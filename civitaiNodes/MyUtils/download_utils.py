@@ -7,6 +7,8 @@ aria2_extra_args = config.aria2_extra_args
 max_retries = config.max_retry
 retry_interval = config.retry_interval
 
+import os
+import time
 import pathlib
 import logging
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +41,9 @@ def raise_for_aria2_installed():
     else:
         aria2_installed_flag = True
         
+# aria2c 的退出码 9：磁盘空间不足
+ARIA2_DISK_FULL = 9
+
 def download_file_with_aria2(url, full_path, retries=0):
     """Download a file using aria2c with retry logic."""
     if not isinstance(full_path, pathlib.Path):
@@ -60,23 +65,37 @@ def download_file_with_aria2(url, full_path, retries=0):
         logging.info(f"Downloaded {full_path}")
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to download {full_path} with error: {e}, retries: {retries}")
+        if e.returncode == ARIA2_DISK_FULL:
+            # 磁盘已满时重试没有意义
+            raise InsufficientDiskSpace(f"Disk full while downloading {full_path}") from e
         if retries < max_retries:
             import time
+            metrics.download_retries.inc(method="aria2")
             time.sleep(retry_interval)
             logging.info(f"Retrying download of {full_path}")
             download_file_with_aria2(url, full_path, retries=retries+1)
             
-import requests
+from .http_utils import http_get, http_head, raise_if_offline
+from .file_lock import FileLock, temp_path_for
+from .disk_space import guard as disk_space_guard, InsufficientDiskSpace
+from . import metrics
 
 def download_file_with_requests(url, full_path):
     """Download a file using requests."""
     if not isinstance(full_path, pathlib.Path):
         full_path = pathlib.Path(full_path)
     full_path.parent.mkdir(parents=True, exist_ok=True)
-    response = requests.get(url)
+    response = http_get(url, timeout=None, stream=True)
     response.raise_for_status()
-    with open(full_path, "wb") as file:
-        file.write(response.content)
+    # 写入临时文件，完成后再改名，其他进程不会看到不完整的模型文件
+    tmp_path = temp_path_for(full_path)
+    try:
+        with open(tmp_path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                file.write(chunk)
+        os.replace(tmp_path, full_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
     logging.info(f"Downloaded {full_path}")
 
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse   
@@ -93,25 +112,56 @@ def add_token_to_url(url: str, token: str) -> str:
 
 def download_file(url, full_path):
     """Download a file using aria2c or requests."""
+    raise_if_offline(f"{pathlib.Path(full_path).name}")
     if config.api_endpoint in url and "token" not in url:
         url = add_token_to_url(url, config.token)
-    if use_aria2:
-        raise_for_aria2_installed()
-        download_file_with_aria2(url, full_path)
-    else:
-        download_file_with_requests(url, full_path)
+    method = "aria2" if use_aria2 else "requests"
+    # aria2 会续传已有的部分文件，只统计本次新增的字节数
+    size_before = pathlib.Path(full_path).stat().st_size if pathlib.Path(full_path).exists() else 0
+    result = "error"
+    start = time.perf_counter()
+    try:
+        if use_aria2:
+            raise_for_aria2_installed()
+            download_file_with_aria2(url, full_path)
+        else:
+            download_file_with_requests(url, full_path)
+        result = "ok"
+    finally:
+        metrics.download_seconds.observe(time.perf_counter() - start, method=method, result=result)
+        if pathlib.Path(full_path).exists():
+            metrics.downloaded_bytes.inc(max(0, pathlib.Path(full_path).stat().st_size - size_before), method=method)
 
 def get_raw_url(url):
     """Get the raw URL from redirect URL."""
-    response = requests.head(url, allow_redirects=False)
+    response = http_head(url, allow_redirects=False)
     response.raise_for_status()
     if response.is_redirect:
         return response.headers["Location"]
     return url
 
-def download_civitai_model(url, full_path):
-    """Download a Civitai model from a URL."""
+def is_download_complete(full_path) -> bool:
+    # aria2 下载过程中会保留 .aria2 控制文件
+    full_path = pathlib.Path(full_path)
+    return full_path.exists() and not pathlib.Path(str(full_path) + ".aria2").exists()
+
+def reserve_download_space(full_path, expected_size: int = None):
+    """按 download.min_free_mb / wait_for_disk_space 的设置为下载预留磁盘空间，同步和异步下载共用"""
+    return disk_space_guard.reserve(full_path, expected_size, min_free=config.min_free_mb * 1024 * 1024,
+                                    wait=config.wait_for_disk_space, timeout=config.disk_wait_timeout)
+
+def download_civitai_model(url, full_path, expected_size: int = None):
+    """Download a Civitai model from a URL. expected_size (bytes) is reserved on the target drive first."""
+    raise_if_offline(f"{pathlib.Path(full_path).name}")
 
-    url = add_token_to_url(url, config.token)
-    url = get_raw_url(url)
-    download_file(url, full_path)
+    # 多个 ComfyUI 共享模型目录时，同一文件只由一个进程下载，其他进程等待
+    lock = FileLock(str(full_path) + ".lock", stale_after=config.lock_stale_after)
+    with lock:
+        if is_download_complete(full_path):
+            logging.info(f"{full_path} was downloaded by another process")
+            return
+        # 剩余空间不足时不开始下载，避免写了一半的文件和 aria2 的重试
+        with reserve_download_space(full_path, expected_size):
+            url = add_token_to_url(url, config.token)
+            url = get_raw_url(url)
+            download_file(url, full_path)
@@ -0,0 +1,161 @@
+"""
+Advisory lock files that work across processes and hosts sharing a volume (NFS).
+
+A lock is a file created with O_CREAT | O_EXCL next to the protected path. While
+it is held, a heartbeat thread refreshes its mtime. A lock whose mtime is older
+than `stale_after` seconds belongs to a crashed or hung worker, so other workers
+may break it. A lock left by a dead process on the same host is broken at once.
+Waiting workers poll until the lock is released.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import pathlib
+import threading
+
+HOSTNAME = socket.gethostname()
+
+DEFAULT_STALE_AFTER = 120.0
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class LockTimeout(TimeoutError):
+    """在 timeout 内没能获得锁"""
+    pass
+
+
+def temp_path_for(path) -> pathlib.Path:
+    """同目录下的临时文件名，不同主机 / 进程 / 线程不会冲突，用于写入后 os.replace"""
+    path = pathlib.Path(path)
+    return path.with_name(f"{path.name}.{HOSTNAME}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会结束进程，无法这样检查
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FileLock:
+    def __init__(self, path, stale_after: float = DEFAULT_STALE_AFTER, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 timeout: float = None, heartbeat: bool = True):
+        self.path = pathlib.Path(path)
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self._token = None
+        self._stop_heartbeat: threading.Event = None
+
+    @property
+    def locked(self) -> bool:
+        return self._token is not None
+
+    def _owner(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _break_if_stale(self) -> bool:
+        """锁已过期（或已被释放）时返回 True，调用方应立即重试"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        owner = self._owner()
+        stale = time.time() - stat.st_mtime > self.stale_after
+        if not stale and owner.get("host") == HOSTNAME and isinstance(owner.get("pid"), int):
+            stale = not _pid_alive(owner["pid"])
+        if not stale:
+            return False
+        # 先改名再删除，多个进程同时判断为过期时只有一个能成功
+        stale_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(self.path, stale_path)
+        except FileNotFoundError:
+            return True
+        if os.stat(stale_path).st_ino != stat.st_ino:
+            # 改名前锁已被别人重新获取，放回原处
+            try:
+                os.link(stale_path, self.path)
+            except OSError:
+                pass
+            os.unlink(stale_path)
+            return False
+        os.unlink(stale_path)
+        logging.warning(f"Removed stale lock {self.path} held by {owner or 'unknown'}")
+        return True
+
+    def acquire(self, timeout: float = None) -> bool:
+        """获得锁返回 True；timeout 秒内未获得返回 False，timeout 为 None 时一直等待"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        logged = False
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if self._break_if_stale():
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                if not logged:
+                    logging.info(f"Waiting for {self.path}, held by {self._owner() or 'another process'}")
+                    logged = True
+                time.sleep(self.poll_interval)
+                continue
+            self._token = uuid.uuid4().hex
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"host": HOSTNAME, "pid": os.getpid(), "token": self._token, "created": time.time()}, file)
+            if self.heartbeat:
+                self._start_heartbeat()
+            return True
+
+    def _start_heartbeat(self):
+        stop = self._stop_heartbeat = threading.Event()
+        interval = max(self.stale_after / 4, 0.1)
+        path = self.path
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    logging.warning(f"Lock {path} was removed while held")
+                    return
+
+        threading.Thread(target=beat, name=f"lock-heartbeat-{path.name}", daemon=True).start()
+
+    def release(self):
+        if self._token is None:
+            return
+        if self._stop_heartbeat is not None:
+            self._stop_heartbeat.set()
+            self._stop_heartbeat = None
+        # 只删除自己持有的锁（过期后可能已被别人接管）
+        if self._owner().get("token") == self._token:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self._token = None
+
+    def __enter__(self) -> "FileLock":
+        if not self.acquire(self.timeout):
+            raise LockTimeout(f"Timed out waiting for {self.path}")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,51 @@
+import re
+import time
+import requests
+from urllib.parse import urlparse
+
+from civitaiNodes.config import config
+from .metrics import api_request_seconds
+
+
+class OfflineModeError(ConnectionError):
+    """离线模式下需要访问网络时抛出，表示本地缓存未命中"""
+    pass
+
+
+def raise_if_offline(what: str):
+    # 离线模式（settings.toml 中 civitai.offline = true）下，所有网络访问都立即失败而不是等待超时
+    if config.offline:
+        raise OfflineModeError(f"Offline mode: {what} is not available in the local cache")
+
+
+_HASH_SEGMENT = re.compile(r"/by-hash/[0-9a-fA-F]+")
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_label(url: str) -> str:
+    # 指标的 endpoint 标签：API 路径中的 ID 和哈希替换为占位符，其他地址只保留主机名
+    if url.startswith(config.api_endpoint):
+        path = urlparse(url[len(config.api_endpoint):]).path
+        return _ID_SEGMENT.sub("/{id}", _HASH_SEGMENT.sub("/by-hash/{hash}", path))
+    return urlparse(url).netloc
+
+
+def _request(method, url: str, **kwargs) -> requests.Response:
+    raise_if_offline(url)
+    kwargs.setdefault("timeout", config.request_timeout)
+    status = "error"
+    start = time.perf_counter()
+    try:
+        response = method(url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        api_request_seconds.observe(time.perf_counter() - start, endpoint=endpoint_label(url), status=status)
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return _request(requests.get, url, **kwargs)
+
+
+def http_head(url: str, **kwargs) -> requests.Response:
+    return _request(requests.head, url, **kwargs)
@@ -0,0 +1,81 @@
+"""
+Selective LoRA loading: read only the tensors that load_lora_for_models will patch.
+
+load_torch_file materializes every tensor of the file. For a .safetensors LoRA the
+tensor names are read from the header first and matched against the key maps
+ComfyUI builds for the target model and CLIP (comfy.lora.model_lora_keys_unet /
+model_lora_keys_clip). Only tensors whose module is in the map of a side with a
+non-zero strength are read from the memory-mapped file, so text-encoder weights
+with strength_clip = 0 never reach RAM.
+
+A file with any tensor that matches neither map is loaded completely as before: such
+names may be in a layout that comfy.lora_convert rewrites before matching (diffusers /
+PEFT names, possibly mixed with kohya names in one file), and only ComfyUI can tell
+whether they apply. Files that are not safetensors are loaded completely as well.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import safetensors_utils
+
+
+def _module_prefix(name: str, modules) -> Optional[str]:
+    # 张量名是 "<模块>.<后缀>"（lora_up.weight、alpha、hada_w1_a、diff ...），模块名本身也可能包含点
+    index = name.find(".")
+    while index != -1:
+        if name[:index] in modules:
+            return name[:index]
+        index = name.find(".", index + 1)
+    return None
+
+
+def lora_key_maps(model, clip) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """ComfyUI 为模型和 CLIP 生成的 LoRA 模块名映射"""
+    import comfy.lora
+    unet_keys = comfy.lora.model_lora_keys_unet(model.model, {}) if model is not None else {}
+    clip_keys = comfy.lora.model_lora_keys_clip(clip.cond_stage_model, {}) if clip is not None else {}
+    return unet_keys, clip_keys
+
+
+def select_lora_keys(names: Iterable[str], unet_keys, clip_keys, strength_model: float, strength_clip: float) -> Optional[List[str]]:
+    """需要读取的张量名；有张量对应不到模型或 CLIP 的模块时返回 None（需要完整读取，由 ComfyUI 转换后匹配）"""
+    selected = []
+    for name in names:
+        if name == "__metadata__":
+            continue
+        unet_module = _module_prefix(name, unet_keys)
+        clip_module = _module_prefix(name, clip_keys)
+        if unet_module is None and clip_module is None:
+            return None
+        if (unet_module is not None and strength_model != 0) or (clip_module is not None and strength_clip != 0):
+            selected.append(name)
+    return selected
+
+
+def read_tensors(lora_path: str, names: Iterable[str]) -> Dict[str, Any]:
+    """通过内存映射只读取 names 中的张量"""
+    from safetensors import safe_open
+    with safe_open(lora_path, framework="pt", device="cpu") as file:
+        return {name: file.get_tensor(name) for name in names}
+
+
+def load_lora(lora_path: str, model, clip, strength_model: float, strength_clip: float,
+              loaded_lora: Tuple[str, Dict[str, Any], bool] = None) -> Tuple[str, Dict[str, Any], bool]:
+    """读取 LoRA 中本次会用到的张量，返回 (lora_path, 张量字典, 是否完整读取)，作为下一次调用的 loaded_lora；
+    loaded_lora 是同一个文件且已包含需要的张量时直接复用"""
+    from comfy.utils import load_torch_file
+    selected = None
+    if lora_path.lower().endswith(".safetensors"):
+        try:
+            names = safetensors_utils.read_header_from_file(lora_path).keys()
+            selected = select_lora_keys(names, *lora_key_maps(model, clip), strength_model, strength_clip)
+        except (ImportError, AttributeError) as e:
+            # 旧版 ComfyUI 没有生成映射的函数，退回完整读取
+            logging.info(f"Selective LoRA loading is not available: {e}")
+    if loaded_lora is not None and loaded_lora[0] == lora_path:
+        if loaded_lora[2] or (selected is not None and loaded_lora[1].keys() >= set(selected)):
+            return loaded_lora
+    if selected is None:
+        return lora_path, load_torch_file(lora_path, safe_load=True), True
+    logging.debug(f"Reading {len(selected)} of the tensors in {lora_path}")
+    return lora_path, read_tensors(lora_path, selected), False
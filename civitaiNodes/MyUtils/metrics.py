@@ -0,0 +1,207 @@
+"""
+Process-wide counters and histograms for the caches, hashing, civitai.com API
+calls, downloads and preview images. Served by the /xtnodes/metrics route in the
+Prometheus text format or as JSON.
+
+Only the standard library is used, so the module can be imported anywhere.
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# 默认的耗时分桶（秒），覆盖缓存命中（毫秒级）到大文件下载（分钟级）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: List[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: List[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def to_prometheus(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def to_dict(self) -> List[dict]:
+        with self._lock:
+            return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: List[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> [每个桶的计数, 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 代码块的耗时（秒），异常时也会记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[2] if series is not None else 0
+
+    def to_prometheus(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def to_dict(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "labels": dict(zip(self.labelnames, key)),
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count > 0 else 0.0,
+                    "buckets": {_format_value(bound): bucket_count for bound, bucket_count in zip(self.buckets, bucket_counts)},
+                }
+                for key, (bucket_counts, total, count) in sorted(self._values.items())
+            ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 模块被重新导入时复用已有的指标
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: List[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: List[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.to_prometheus())
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: {"type": metric.type, "help": metric.documentation, "values": metric.to_dict()} for metric in metrics}
+
+
+registry = MetricsRegistry()
+
+json_cache_requests = registry.counter(
+    "xtnodes_json_cache_requests_total", "Model JSON lookups in json_cache by result (hit, miss, stale)", ["result"])
+json_cache_evictions = registry.counter(
+    "xtnodes_json_cache_evictions_total", "Model directories removed from json_cache by reason (budget, orphan)", ["reason"])
+modelinfo_cache_requests = registry.counter(
+    "xtnodes_modelinfo_cache_requests_total", "Parsed ModelInfo lookups in the in-process LRU by result (hit, miss)", ["result"])
+hash_map_requests = registry.counter(
+    "xtnodes_hash_map_requests_total", "Local file -> model ID lookups in the file hash map by result (hit, miss)", ["result"])
+hashed_bytes = registry.counter(
+    "xtnodes_hashed_bytes_total", "Bytes read to compute BLAKE3 hashes of local model files")
+hash_seconds = registry.histogram(
+    "xtnodes_hash_duration_seconds", "Time to compute the BLAKE3 hash of a local model file")
+api_request_seconds = registry.histogram(
+    "xtnodes_http_request_duration_seconds", "HTTP request latency by endpoint and status", ["endpoint", "status"])
+download_retries = registry.counter(
+    "xtnodes_download_retries_total", "Model download retries by download method", ["method"])
+downloaded_bytes = registry.counter(
+    "xtnodes_downloaded_bytes_total", "Bytes of model files downloaded by download method", ["method"])
+download_admissions = registry.counter(
+    "xtnodes_download_admissions_total", "Disk-space admission decisions for downloads (admitted, waited, rejected)", ["result"])
+download_seconds = registry.histogram(
+    "xtnodes_download_duration_seconds", "Model file download time by download method and result", ["method", "result"])
+preview_cache_requests = registry.counter(
+    "xtnodes_preview_cache_requests_total", "Preview image lookups in http_image_cache by result (hit, miss)", ["result"])
+preview_load_seconds = registry.histogram(
+    "xtnodes_preview_load_duration_seconds", "Time to load one preview image (from cache or civitai.com)")
+node_phase_seconds = registry.histogram(
+    "xtnodes_node_phase_duration_seconds", "Time spent in each phase of a loader node execution", ["node", "phase"])
@@ -0,0 +1,351 @@
+"""
+Compact on-disk cache of civitai.com model documents.
+
+The /models/{id} response contains every version with every file, image and image
+meta. Only a small projection of it is needed to build a ModelInfo, so a model is
+cached as:
+
+    json_cache/models/{shard}/{modelId}/model.json        model fields + the version list
+    json_cache/models/{shard}/{modelId}/{versionId}.json  the fields of one version
+    json_cache/models/{shard}/{modelId}/raw.json.gz       full response (only with civitai.keep_raw_json)
+    json_cache/models/{shard}/{modelId}/{versionId}.header.json
+                                                          summary of the safetensors header of the file
+
+{shard} groups 1000 consecutive IDs ("43k" holds 43000-43999), so no directory
+grows past a few thousand entries on large shared caches.
+
+Loading a model reads model.json and one version file. Documents have the same
+shape as the API response (with only the loaded versions in modelVersions), so
+ModelInfo.parse_model_id_json works on both. model.json is written last and
+acts as the commit marker; legacy json_cache/{modelId}.json files and unsharded
+json_cache/models/{modelId}/ directories are migrated on first access.
+"""
+import os
+import gzip
+import shutil
+import json
+import time
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .file_lock import temp_path_for
+
+FORMAT_VERSION = 1
+
+MODEL_FIELDS = ("id", "name", "type", "nsfw", "tags")
+VERSION_FIELDS = ("id", "modelId", "name", "baseModel", "trainedWords", "downloadUrl")
+FILE_FIELDS = ("id", "name", "type", "sizeKB", "primary", "downloadUrl", "hashes", "metadata")
+IMAGE_FIELDS = ("url", "type", "nsfw", "nsfwLevel", "width", "height")
+
+
+def models_root(cache_dir: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(cache_dir) / "models"
+
+
+SHARD_SIZE = 1000
+
+
+def shard_name(modelId: int) -> str:
+    return f"{int(modelId) // SHARD_SIZE}k"
+
+
+def is_shard_name(name: str) -> bool:
+    return name.endswith("k") and name[:-1].isdigit()
+
+
+def model_dir(cache_dir: pathlib.Path, modelId: int) -> pathlib.Path:
+    return models_root(cache_dir) / shard_name(modelId) / str(modelId)
+
+
+def unsharded_dir(cache_dir: pathlib.Path, modelId: int) -> pathlib.Path:
+    # 分片之前的目录结构 json_cache/models/{modelId}
+    return models_root(cache_dir) / str(modelId)
+
+
+def lock_path(cache_dir: pathlib.Path, modelId: int) -> pathlib.Path:
+    return models_root(cache_dir) / shard_name(modelId) / f"{modelId}.lock"
+
+
+def legacy_path(cache_dir: pathlib.Path, modelId: int) -> pathlib.Path:
+    return pathlib.Path(cache_dir) / f"{modelId}.json"
+
+
+def _pick(data: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    return {field: data[field] for field in fields if field in data}
+
+
+def project_version(version: Dict[str, Any]) -> Dict[str, Any]:
+    projected = _pick(version, VERSION_FIELDS)
+    projected["files"] = [_pick(file, FILE_FIELDS) for file in version.get("files", [])]
+    projected["images"] = [_pick(image, IMAGE_FIELDS) for image in version.get("images", [])]
+    return projected
+
+
+def project_model(data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """把 API 返回的完整文档拆分为模型级文档和每个版本的精简文档"""
+    model = _pick(data, MODEL_FIELDS)
+    versions = [project_version(version) for version in data.get("modelVersions", [])]
+    model["format"] = FORMAT_VERSION
+    model["fetched"] = time.time()
+    # 版本顺序与 API 一致，第一个是未指定版本时的默认版本
+    model["modelVersions"] = [{"id": version["id"], "name": version.get("name", "")} for version in versions]
+    return model, versions
+
+
+def _write_json(path: pathlib.Path, data: Any):
+    # 先写临时文件再替换，读取方不会看到写了一半的文件
+    tmp_path = temp_path_for(path)
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: pathlib.Path) -> Optional[Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def store_model_doc(cache_dir: pathlib.Path, data: Dict[str, Any], keep_raw: bool = False) -> pathlib.Path:
+    """保存 /models/{id} 的响应，返回模型目录"""
+    model, versions = project_model(data)
+    directory = model_dir(cache_dir, model["id"])
+    directory.mkdir(parents=True, exist_ok=True)
+    for version in versions:
+        _write_json(directory / f"{version['id']}.json", version)
+    if keep_raw:
+        tmp_path = temp_path_for(directory / "raw.json.gz")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, directory / "raw.json.gz")
+    # model.json 最后写入，存在即表示各版本文件已经完整
+    _write_json(directory / "model.json", model)
+    return directory
+
+
+def store_version_doc(cache_dir: pathlib.Path, version: Dict[str, Any]) -> bool:
+    """把 /model-versions/{id} 的响应加入已缓存的模型；模型未缓存时返回 False（该响应不含模型的 tags）"""
+    modelId = version.get("modelId")
+    model = load_model(cache_dir, modelId) if modelId is not None else None
+    if model is None:
+        return False
+    directory = model_dir(cache_dir, modelId)
+    projected = project_version(version)
+    _write_json(directory / f"{projected['id']}.json", projected)
+    summaries = model["modelVersions"]
+    if not any(summary["id"] == projected["id"] for summary in summaries):
+        summary = {"id": projected["id"], "name": projected.get("name", "")}
+        # 新发布的版本排在最前面，成为默认版本，与 API 的顺序一致
+        if all(projected["id"] > existing["id"] for existing in summaries):
+            summaries.insert(0, summary)
+        else:
+            summaries.append(summary)
+        _write_json(directory / "model.json", model)
+    return True
+
+
+def migrate_legacy_file(cache_dir: pathlib.Path, path: pathlib.Path, keep_raw: bool = False) -> bool:
+    """把旧格式的 json_cache/{modelId}.json 转换为精简格式，成功后删除旧文件"""
+    data = _read_json(path)
+    if not isinstance(data, dict) or "id" not in data or "modelVersions" not in data:
+        return False
+    store_model_doc(cache_dir, data, keep_raw=keep_raw)
+    path.unlink(missing_ok=True)
+    return True
+
+
+def migrate_legacy_cache(cache_dir: pathlib.Path, keep_raw: bool = False) -> int:
+    migrated = 0
+    if not pathlib.Path(cache_dir).exists():
+        return migrated
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".json") and entry.name[:-5].isdigit():
+            migrated += migrate_legacy_file(cache_dir, pathlib.Path(entry.path), keep_raw=keep_raw)
+    return migrated
+
+
+def migrate_unsharded_dir(cache_dir: pathlib.Path, modelId: int) -> bool:
+    """把 json_cache/models/{modelId} 移到分片目录下；分片目录中已有该模型时删除旧目录"""
+    source = unsharded_dir(cache_dir, modelId)
+    if not source.is_dir():
+        return False
+    target = model_dir(cache_dir, modelId)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.rename(source, target)
+    except OSError:
+        # 另一个进程已经迁移过，或在分片目录中重新获取了该模型
+        if not (target / "model.json").exists():
+            return False
+        shutil.rmtree(source, ignore_errors=True)
+    return True
+
+
+def migrate_unsharded_cache(cache_dir: pathlib.Path) -> int:
+    migrated = 0
+    root = models_root(cache_dir)
+    if not root.exists():
+        return migrated
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.name.isdigit():
+            migrated += migrate_unsharded_dir(cache_dir, int(entry.name))
+    return migrated
+
+
+def load_model(cache_dir: pathlib.Path, modelId: int, keep_raw: bool = False) -> Optional[Dict[str, Any]]:
+    """读取模型级文档（不含版本详情），未缓存时返回 None"""
+    path = model_dir(cache_dir, modelId) / "model.json"
+    model = _read_json(path)
+    if model is None:
+        if migrate_unsharded_dir(cache_dir, modelId):
+            return _read_json(path)
+        legacy = legacy_path(cache_dir, modelId)
+        if legacy.exists() and migrate_legacy_file(cache_dir, legacy, keep_raw=keep_raw):
+            model = _read_json(path)
+    return model
+
+
+def load_model_doc(cache_dir: pathlib.Path, modelId: int, versionId: int = None, keep_raw: bool = False) -> Optional[Dict[str, Any]]:
+    """返回只包含指定版本（未指定时为默认版本）的模型文档；未缓存或缓存中没有该版本时返回 None"""
+    model = load_model(cache_dir, modelId, keep_raw=keep_raw)
+    if model is None or len(model["modelVersions"]) == 0:
+        return None
+    if versionId is None:
+        versionId = model["modelVersions"][0]["id"]
+    elif not any(version["id"] == versionId for version in model["modelVersions"]):
+        return None
+    version = _read_json(model_dir(cache_dir, modelId) / f"{versionId}.json")
+    if version is None:
+        return None
+    return {**model, "modelVersions": [version]}
+
+
+def load_all_versions(cache_dir: pathlib.Path, modelId: int) -> Optional[Dict[str, Any]]:
+    """返回包含所有已缓存版本的模型文档"""
+    model = load_model(cache_dir, modelId)
+    if model is None:
+        return None
+    directory = model_dir(cache_dir, modelId)
+    versions = []
+    for summary in model["modelVersions"]:
+        version = _read_json(directory / f"{summary['id']}.json")
+        if version is not None:
+            versions.append(version)
+    return {**model, "modelVersions": versions}
+
+
+def load_raw_doc(cache_dir: pathlib.Path, modelId: int) -> Optional[Dict[str, Any]]:
+    """读取保留的完整 API 响应（需要开启 civitai.keep_raw_json）"""
+    path = model_dir(cache_dir, modelId) / "raw.json.gz"
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def store_header_summary(cache_dir: pathlib.Path, modelId: int, versionId: int, summary: Dict[str, Any]):
+    directory = model_dir(cache_dir, modelId)
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_json(directory / f"{versionId}.header.json", summary)
+
+
+def load_header_summary(cache_dir: pathlib.Path, modelId: int, versionId: int) -> Optional[Dict[str, Any]]:
+    return _read_json(model_dir(cache_dir, modelId) / f"{versionId}.header.json")
+
+
+def iter_model_dirs(cache_dir: pathlib.Path) -> Iterator[Tuple[int, str]]:
+    """遍历所有模型目录（包括没有 model.json 的未完成目录和未迁移的旧目录），返回 (modelId, 目录路径)"""
+    root = models_root(cache_dir)
+    if not root.exists():
+        return
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        if entry.name.isdigit():
+            yield int(entry.name), entry.path
+        elif is_shard_name(entry.name):
+            for model_entry in os.scandir(entry.path):
+                if model_entry.is_dir() and model_entry.name.isdigit():
+                    yield int(model_entry.name), model_entry.path
+
+
+def iter_cached_models(cache_dir: pathlib.Path) -> Iterator[Tuple[int, float]]:
+    """遍历已缓存的模型，返回 (modelId, model.json 的 mtime)"""
+    for modelId, path in iter_model_dirs(cache_dir):
+        try:
+            mtime = os.stat(os.path.join(path, "model.json")).st_mtime
+        except FileNotFoundError:
+            continue
+        yield modelId, mtime
+
+
+def dir_usage(path) -> Tuple[int, int]:
+    """目录中文件的 (总字节数, 文件数)"""
+    size = files = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            size += entry.stat(follow_symlinks=False).st_size
+            files += 1
+    return size, files
+
+
+def remove_model(cache_dir: pathlib.Path, modelId: int):
+    shutil.rmtree(model_dir(cache_dir, modelId), ignore_errors=True)
+    shutil.rmtree(unsharded_dir(cache_dir, modelId), ignore_errors=True)
+
+
+def version_mtime(cache_dir: pathlib.Path, modelId: int, versionId: int) -> Optional[Tuple[int, int]]:
+    """model.json 和 {versionId}.json 的 mtime（纳秒）；store_version_doc 只重写版本文件，两者都要比较。未缓存时返回 None"""
+    directory = model_dir(cache_dir, modelId)
+    try:
+        return os.stat(directory / "model.json").st_mtime_ns, os.stat(directory / f"{versionId}.json").st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class MtimeLRUCache:
+    """有容量上限的 LRU，每个值记录对应缓存文件的 mtime，文件变化后该值失效"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Any, Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek(self, key) -> Optional[Any]:
+        # 不校验 mtime，用于先取得值再计算需要比较的 mtime
+        with self._lock:
+            item = self._items.get(key)
+            return item[1] if item is not None else None
+
+    def get(self, key, mtime) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] != mtime:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, mtime, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (mtime, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,120 @@
+"""
+Content-addressed store for downloaded model files (download.store = true).
+
+Every file is stored once under the SHA256 that civitai.com publishes for it:
+
+    <store_dir>/sha256/<first two hex chars>/<SHA256>   verified model files
+    <store_dir>/incoming/<SHA256>.<ext>                  downloads in progress
+
+The path ComfyUI sees (models/<type>/<base>/<category>/<filename>) is a hardlink
+(or a symlink, see download.link_mode) to the stored file. The same file reached
+through another URL, a renamed model or a re-uploaded version is linked again
+instead of being downloaded, and no network access is needed when the file is
+already in the store.
+"""
+import os
+import errno
+import hashlib
+import logging
+import pathlib
+
+from .download_utils import download_civitai_model
+from .file_lock import FileLock, temp_path_for
+from .phase_timing import phase
+
+LINK_MODES = ("auto", "hardlink", "symlink")
+
+
+class StoreHashMismatch(Exception):
+    """下载的文件与 civitai.com 公布的 SHA256 不一致"""
+    pass
+
+
+def blob_path(store_dir: pathlib.Path, sha256: str) -> pathlib.Path:
+    sha256 = sha256.upper()
+    return pathlib.Path(store_dir) / "sha256" / sha256[:2] / sha256
+
+
+def incoming_path(store_dir: pathlib.Path, sha256: str, suffix: str = "") -> pathlib.Path:
+    return pathlib.Path(store_dir) / "incoming" / f"{sha256.upper()}{suffix}"
+
+
+def get_sha256(filepath) -> str:
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest().upper()
+
+
+def is_linked(blob: pathlib.Path, target: pathlib.Path) -> bool:
+    """target 已经是指向 blob 的硬链接或符号链接"""
+    try:
+        return os.path.samefile(blob, target)
+    except OSError:
+        return False
+
+
+def link_blob(blob: pathlib.Path, target: pathlib.Path, mode: str = "auto"):
+    """在 target 创建指向 blob 的链接，auto 优先硬链接，跨文件系统或不支持时改用符号链接"""
+    if mode not in LINK_MODES:
+        raise ValueError(f"link_mode must be one of {LINK_MODES}, got {mode!r}")
+    target = pathlib.Path(target)
+    if is_linked(blob, target):
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # 先在临时名上创建链接再替换，已有的文件或链接不会出现短暂缺失
+    tmp_path = temp_path_for(target)
+    try:
+        if mode != "symlink":
+            try:
+                os.link(blob, tmp_path)
+                mode = "hardlink"
+            except OSError as e:
+                if mode == "hardlink" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                    raise
+                logging.info(f"Cannot hardlink {target} into the model store ({e}), using a symlink")
+                mode = "symlink"
+        if mode == "symlink":
+            os.symlink(pathlib.Path(blob).resolve(), tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def fetch_blob(url: str, sha256: str, store_dir: pathlib.Path, suffix: str = "", stale_after: float = 120,
+               expected_size: int = None) -> pathlib.Path:
+    """返回 sha256 对应的文件，不在仓库中时下载并校验"""
+    blob = blob_path(store_dir, sha256)
+    if blob.exists():
+        return blob
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    # 同一个文件只由一个进程下载，其他进程等待后直接使用
+    with FileLock(str(blob) + ".lock", stale_after=stale_after):
+        if blob.exists():
+            return blob
+        incoming = incoming_path(store_dir, sha256, suffix)
+        download_civitai_model(url, incoming, expected_size=expected_size)
+        with phase("verify"):
+            store_incoming(incoming, blob, sha256, url)
+    logging.info(f"Stored {blob}")
+    return blob
+
+
+def store_incoming(incoming: pathlib.Path, blob: pathlib.Path, sha256: str, url: str):
+    """校验下载到 incoming 的文件并移入仓库，同步和异步下载共用"""
+    actual = get_sha256(incoming)
+    if actual != sha256.upper():
+        # 删除损坏的文件，下次重新下载而不是续传
+        incoming.unlink(missing_ok=True)
+        raise StoreHashMismatch(f"{url}: expected SHA256 {sha256.upper()}, got {actual}")
+    os.replace(incoming, blob)
+
+
+def download_to_store(url: str, sha256: str, target: pathlib.Path, store_dir: pathlib.Path,
+                      link_mode: str = "auto", stale_after: float = 120, expected_size: int = None):
+    """下载到仓库（已存在时跳过）并在 target 创建链接"""
+    target = pathlib.Path(target)
+    blob = fetch_blob(url, sha256, store_dir, suffix=target.suffix, stale_after=stale_after, expected_size=expected_size)
+    link_blob(blob, target, link_mode)
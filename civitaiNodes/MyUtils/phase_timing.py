@@ -0,0 +1,107 @@
+"""
+Per-execution phase timing for the loader nodes.
+
+CivitaiBaseLoader starts a PhaseRecorder for every execution and makes it current
+for the executing thread; code further down (json cache / API fetch, hashing,
+downloads, previews) marks its work with `with phase("..."):`. Outside a node
+execution, or in background threads, phase() does nothing.
+"""
+import json
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger("xtnodes.timing")
+
+_current_recorder: contextvars.ContextVar[Optional["PhaseRecorder"]] = contextvars.ContextVar("xtnodes_phase_recorder", default=None)
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.2f} s"
+
+
+class PhaseRecorder:
+    """记录一次节点执行中各阶段的耗时，嵌套的阶段记录深度"""
+
+    def __init__(self, node: str, unique_id: str = None):
+        self.node = node
+        self.unique_id = unique_id
+        self.spans: List[list] = []  # [name, seconds, depth]
+        self.start = time.perf_counter()
+        self._depth = 0
+        self._mark = None
+
+    @contextmanager
+    def span(self, name: str):
+        entry = [name, 0.0, self._depth]
+        self.spans.append(entry)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            entry[1] = time.perf_counter() - start
+
+    def add(self, name: str, seconds: float):
+        self.spans.append([name, seconds, self._depth])
+
+    def mark(self):
+        self._mark = time.perf_counter()
+
+    def add_since_mark(self, name: str):
+        # 记录从 mark() 到现在的耗时，用于节点自身的模型加载（prepare_modelinfo 与 process_result 之间）
+        if self._mark is not None:
+            self.add(name, time.perf_counter() - self._mark)
+            self._mark = None
+
+    def activate(self):
+        _current_recorder.set(self)
+
+    def deactivate(self):
+        if _current_recorder.get() is self:
+            _current_recorder.set(None)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def to_dict(self, **extra) -> dict:
+        return {
+            "node": self.node,
+            "unique_id": self.unique_id,
+            **extra,
+            "total": round(self.total, 6),
+            "phases": [{"phase": name, "seconds": round(seconds, 6), "depth": depth} for name, seconds, depth in self.spans],
+        }
+
+    def format(self) -> str:
+        lines = [f"Timing: {format_seconds(self.total)} total"]
+        for name, seconds, depth in self.spans:
+            lines.append(f"{'  ' * (depth + 1)}{name}: {format_seconds(seconds)}")
+        return "\n".join(lines)
+
+    def log(self, slow_threshold: float, **extra):
+        """结构化日志（一行 JSON），超过 slow_threshold 秒的执行用 INFO 级别，其余为 DEBUG"""
+        level = logging.INFO if self.total >= slow_threshold else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(self.to_dict(**extra), ensure_ascii=False))
+
+
+def current_recorder() -> Optional[PhaseRecorder]:
+    return _current_recorder.get()
+
+
+@contextmanager
+def phase(name: str):
+    """在当前节点执行的耗时记录中添加一个阶段，没有正在执行的节点时不做任何事"""
+    recorder = _current_recorder.get()
+    if recorder is None:
+        yield
+        return
+    with recorder.span(name):
+        yield
@@ -0,0 +1,129 @@
+"""
+safetensors header parsing for local files and remote download URLs.
+
+https://github.com/huggingface/safetensors#format: 8 bytes little-endian header
+size N, N bytes of JSON (tensor name -> dtype / shape / data_offsets, plus an
+optional "__metadata__" dict of strings), then the tensor data. For a URL only
+the header is fetched with Range requests, so the dtypes, parameter count and
+metadata of a multi-GB file are known before it is downloaded.
+"""
+import re
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, Tuple
+
+# safetensors 规定的头部大小上限
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+# 第一次请求多取一些字节，大多数文件（LoRA 和常见的 checkpoint）一次请求即可读到完整头部
+HEADER_PREFETCH = 256 * 1024
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class RangeNotSupported(Exception):
+    """服务器忽略了 Range 请求，继续读取会下载整个文件"""
+    pass
+
+
+def _header_size(prefix: bytes) -> int:
+    # 8 bytes: N, an unsigned little-endian 64-bit integer, containing the size of the header
+    if len(prefix) < 8:
+        raise BufferError("Invalid header size")
+    header_size = int.from_bytes(prefix[:8], "little", signed=False)
+    if header_size <= 0 or header_size > MAX_HEADER_SIZE:
+        raise BufferError("Invalid header size")
+    return header_size
+
+
+def parse_header(header: bytes) -> Dict[str, Any]:
+    if len(header) == 0:
+        raise BufferError("Invalid header")
+    return json.loads(header)
+
+
+def read_header_from_file(filepath: str) -> Dict[str, Any]:
+    with open(filepath, "rb") as file:
+        header_size = _header_size(file.read(8))
+        header = file.read(header_size)
+        if len(header) != header_size:
+            raise BufferError("Invalid header")
+        return parse_header(header)
+
+
+def get_metadata_from_file(filepath: str) -> dict:
+    header_json = read_header_from_file(filepath)
+    return header_json["__metadata__"] if "__metadata__" in header_json else {}
+
+
+def _get_range(url: str, start: int, end: int) -> Tuple[bytes, int]:
+    """读取 [start, end] 字节，返回内容和文件总大小（未知时为 -1）"""
+    from .http_utils import http_get
+    response = http_get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True)
+    with response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeNotSupported(f"{url} does not support Range requests (status {response.status_code})")
+        match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+        total_size = int(match.group(3)) if match is not None and match.group(3) != "*" else -1
+        return response.content, total_size
+
+
+def read_header_from_url(url: str, prefetch: int = HEADER_PREFETCH) -> Tuple[Dict[str, Any], int]:
+    """只通过 Range 请求读取远程 safetensors 文件的头部，返回 (头部 JSON, 文件总大小)"""
+    prefix, total_size = _get_range(url, 0, max(prefetch, 8) - 1)
+    header_size = _header_size(prefix)
+    header = prefix[8:8 + header_size]
+    if len(header) < header_size:
+        rest, _ = _get_range(url, 8 + len(header), 8 + header_size - 1)
+        header += rest
+    if len(header) != header_size:
+        raise BufferError("Invalid header")
+    return parse_header(header), total_size
+
+
+def summarize_header(header: Dict[str, Any], total_size: int = -1) -> Dict[str, Any]:
+    """头部的概要：张量数、参数量、各 dtype 的张量数和 metadata"""
+    dtypes = Counter()
+    parameters = 0
+    data_size = 0
+    for name, tensor in header.items():
+        if name == "__metadata__":
+            continue
+        dtypes[tensor["dtype"]] += 1
+        parameters += math.prod(tensor["shape"])
+        data_size = max(data_size, tensor["data_offsets"][1])
+    return {
+        "size": total_size,
+        "data_size": data_size,
+        "tensors": sum(dtypes.values()),
+        "parameters": parameters,
+        "dtypes": dict(dtypes.most_common()),
+        "metadata": header.get("__metadata__", {}),
+    }
+
+
+def key_group(name: str) -> str:
+    """张量名的分组：LoRA 按模块（lora_unet / lora_te1 ...），其余按前两级（model.diffusion_model ...）"""
+    if name.startswith("lora_"):
+        return "_".join(name.split(".")[0].split("_")[:2])
+    return ".".join(name.split(".")[:2])
+
+
+def summarize_keys(header: Dict[str, Any]) -> Dict[str, int]:
+    """每个张量分组的张量数，用于区分 LoRA 的作用范围（只有 UNet / 带文本编码器）和模型结构"""
+    groups = Counter(key_group(name) for name in header if name != "__metadata__")
+    return dict(groups.most_common())
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    size = summary["size"] if summary["size"] >= 0 else summary["data_size"]
+    dtypes = "/".join(summary["dtypes"]) or "no tensors"
+    return f"{format_size(size)}, {dtypes}, {summary['tensors']} tensors, {summary['parameters'] / 1e6:.1f}M parameters"
@@ -1,21 +1,16 @@
-import numpy as np
-import torch
-from PIL import Image
-
 import folder_paths
 
-from civitaiNodes.config import config
-from .civitaiModelInfo import ModelInfo, remove_condition_in_url
 import hashlib
 import os
 from pathlib import Path
-from typing import List
+from typing import List, TYPE_CHECKING
 import io
 import base64
-from PIL import Image, ImageOps
-import requests
-import shutil
-from codetiming import Timer
+
+# PIL / requests / config / ModelInfo 在第一次执行时才导入，保证节点注册足够轻量
+if TYPE_CHECKING:
+    from PIL import Image
+    from .civitaiModelInfo import ModelInfo
 
 def get_temp_image_path(url: str, cache_dir: Path = None, format="png") -> Path:
     if cache_dir is None:
@@ -25,8 +20,14 @@ def get_temp_image_path(url: str, cache_dir: Path = None, format="png") -> Path:
     cache_file = cache_dir / f"{url_hash}.{format}"
     return cache_file
 
-@Timer(text="load_image_from_url cost time: {seconds:.1f} seconds")
-def load_image_from_url(url: str) -> tuple[Image.Image, dict, str, str]:
+def get_image_cache_path(url: str) -> Path:
+    """预览图在 http_image_cache 中的缓存路径（与 load_image_from_url 使用的路径一致）"""
+    image_format = url.split(".")[-1].lower()
+    if url.startswith("http"):
+        url = remove_condition_in_url(url)
+    return get_temp_image_path(url, format=image_format)
+
+def load_image_from_url(url: str) -> tuple["Image.Image", dict, str, str]:
     """Load an image from a URL.
     
     Args:
@@ -35,6 +36,13 @@ def load_image_from_url(url: str) -> tuple[Image.Image, dict, str, str]:
     Returns:
         A tuple of the image, ComfyUI data, the file format, and the image path.
     """
+    from .metrics import preview_load_seconds
+    with preview_load_seconds.time():
+        return _load_image_from_url(url)
+
+def _load_image_from_url(url: str) -> tuple["Image.Image", dict, str, str]:
+    from PIL import Image
+    from .http_utils import http_get
 
     images = []
     masks = []
@@ -63,13 +71,16 @@ def load_image_from_url(url: str) -> tuple[Image.Image, dict, str, str]:
         i = Image.open(url)
     elif url.startswith("http://") or url.startswith("https://"):
         # Generate a cache file name based on the URL
+        from .metrics import preview_cache_requests
         if os.path.isfile(save_path):
             # Load from cache
+            preview_cache_requests.inc(result="hit")
             i = Image.open(save_path)
             need_to_save = False
         else:
             # Download the image
-            response = requests.get(url, timeout=5)
+            preview_cache_requests.inc(result="miss")
+            response = http_get(url, timeout=5)
             if response.status_code != 200:
                 raise Exception(response.text)
             with open(save_path, "wb") as file:
@@ -123,21 +134,8 @@ def remove_condition_in_url(url: str) -> str:
             return url
 
 
-def get_metadata_from_file(filepath: str) -> dict:
-    with open(filepath, "rb") as file:
-        # https://github.com/huggingface/safetensors#format
-        # 8 bytes: N, an unsigned little-endian 64-bit integer, containing the size of the header
-        header_size = int.from_bytes(file.read(8), "little", signed=False)
-
-        if header_size <= 0:
-            raise BufferError("Invalid header size")
-
-        header = file.read(header_size)
-        if header_size <= 0:
-            raise BufferError("Invalid header")
-
-        header_json = json.loads(header)
-        return header_json["__metadata__"] if "__metadata__" in header_json else {}
+# safetensors 头部解析已移到 safetensors_utils，这里保留导出以兼容旧的导入
+from .safetensors_utils import get_metadata_from_file
 
 
 def get_metadata_from_url(url: str) -> dict:
@@ -163,13 +161,14 @@ class ExtraCivitaiParams:
             # Because the original append_loraname_if_empty parameter has been deprecated in the new version, so here is a compatibility
             self.override_trigger_words = ""
 
-    def deal_trigger_words(self, modelinfo: ModelInfo) -> List[str]:
+    def deal_trigger_words(self, modelinfo: "ModelInfo") -> List[str]:
         if self.bypass:
             return []
         if len(self.override_trigger_words.strip()) > 0:
             return [x.strip() for x in self.override_trigger_words.split(",")]
         if modelinfo is None:
             return []
+        from .civitaiModelInfo import ModelInfo
         assert isinstance(modelinfo, ModelInfo)
         if len(modelinfo.trainedWords) > 0:
             return modelinfo.trainedWords
@@ -192,19 +191,20 @@ class ExtraCivitaiOutput:
         "summary": summary,
     }
 
-def get_summary(modelinfo: ModelInfo, trigger_words: List[str] = None) -> str:
+def get_summary(modelinfo: "ModelInfo", trigger_words: List[str] = None) -> str:
     if modelinfo is None:
         result = "Could not find model in civitai.com"
         if trigger_words is not None and len(trigger_words) > 0:
             result += f"\nTrigger words: {', '.join(trigger_words)}"
         return result
+    from .civitaiModelInfo import ModelInfo
     assert isinstance(modelinfo, ModelInfo)
     result = modelinfo.summary
     if trigger_words is not None and len(trigger_words) > 0:
         result += f"\nOverwrite trigger words: {', '.join(trigger_words)}"
     return result
 
-def add_extra_output(original_result: tuple, extra_civitai_params: ExtraCivitaiParams, modelinfo: ModelInfo):
+def add_extra_output(original_result: tuple, extra_civitai_params: ExtraCivitaiParams, modelinfo: "ModelInfo"):
     new_result = list(original_result)
     trigger_words = extra_civitai_params.deal_trigger_words(modelinfo)
     new_result.append(trigger_words)
@@ -220,6 +220,12 @@ def add_civitai_input_dict(original_input: dict):
                 "preview_images": ("BOOLEAN", {"default": True}),
             }
         )
+    if "hidden" not in original_input:
+        original_input["hidden"] = {}
+    original_input["hidden"].update({
+                "unique_id": "UNIQUE_ID",
+            }
+        )
     return original_input
 
 def add_civitai_output(RETURN_TYPES : tuple, RETURN_NAMES: tuple):
@@ -247,16 +253,30 @@ def add_civitai_return_names(RETURN_NAMES: tuple):
 
 
 def get_ui_images(image_urls):
+    from civitaiNodes.config import config
     if len(image_urls) == 0:
         return {}
     elif len(image_urls) > config.max_preview_images:
         image_urls = image_urls[:config.max_preview_images]
+    from .http_utils import OfflineModeError
     previews = []
     for image_url in image_urls:
-        _, image_info_dict, _, _ = load_image_from_url(image_url)
+        try:
+            _, image_info_dict, _, _ = load_image_from_url(image_url)
+        except OfflineModeError:
+            # 离线模式下只显示已缓存的预览图
+            continue
         previews.append(image_info_dict)
     return previews
 
+def send_ui_to_node(unique_id, ui: dict):
+    """在节点执行结束后，把 UI 输出（summary / 预览图）推送到前端对应的节点"""
+    try:
+        from server import PromptServer
+    except ImportError:
+        return
+    PromptServer.instance.send_sync("xtnodes.modelinfo", {"node": unique_id, "output": ui})
+
 if __name__ == "__main__":
     url = "https://image.civitai.com/xG1nkqKTMzGDvpLrqFT7WA/3488411f-4ed7-43f8-8b9e-abe91e3ed78e/original=true/00365-965542718.jpeg"
     import requests
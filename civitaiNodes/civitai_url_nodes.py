@@ -1,7 +1,7 @@
-from civitaiNodes.MyUtils.CivitaiBaseLoader import append_lora_stack,  CivitaiBaseLoader
+from civitaiNodes.MyUtils.CivitaiBaseLoader import append_lora_stack, node_execution, CivitaiBaseLoader
 from civitaiNodes.MyUtils.ui_utils import add_civitai_input_dict,  add_civitai_return_types, add_civitai_return_names
 from comfy.sd import load_lora_for_models, load_checkpoint_guess_config
-from comfy.utils import load_torch_file
+from civitaiNodes.MyUtils.lora_loading import load_lora
 import folder_paths
 
 # 检查点加载器类
@@ -25,6 +25,7 @@ class CivitaiCheckpointLoaderSimple(CivitaiBaseLoader):
     FUNCTION = "load_checkpoint"
     CATEGORY = "loaders/Civitai"
 
+    @node_execution
     def load_checkpoint(self, url: str, **kwargs) -> dict:
         self.prepare_modelinfo(url = url, **kwargs)
 
@@ -61,16 +62,16 @@ class CivitaiLoraLoader(CivitaiBaseLoader):
     FUNCTION = "load_lora"
     CATEGORY = "loaders/Civitai"
 
+    @node_execution
     def load_lora(self, model, clip, url, strength_model, strength_clip, **kwargs) -> dict:
         self.prepare_modelinfo(url = url, **kwargs)
 
         lora_path = str(self.modelinfo.full_path)
-        lora = None
-        if self.loaded_lora and self.loaded_lora[0] == lora_path:
-            lora = self.loaded_lora[1]
-        else:
-            lora = load_torch_file(lora_path, safe_load=True)
-            self.loaded_lora = (lora_path, lora)
+        if strength_model == 0 and strength_clip == 0:
+            return self.process_result((model, clip))
+        # 只读取强度不为 0 的一侧会用到的张量
+        self.loaded_lora = load_lora(lora_path, model, clip, strength_model, strength_clip, self.loaded_lora)
+        lora = self.loaded_lora[1]
 
         model_lora, clip_lora = load_lora_for_models(model, clip, lora, strength_model, strength_clip)
         result = (model_lora, clip_lora)
@@ -97,6 +98,7 @@ class CivitaiLoraLoaderStacked(CivitaiBaseLoader):
     FUNCTION = "set_stack"
     CATEGORY = "loaders/Civitai"
 
+    @node_execution
     def set_stack(self, url, lora_weight, lora_stack=None, bypass=False, **kwargs) -> dict:
         self.prepare_modelinfo(url = url, **kwargs, bypass=bypass)
 
@@ -127,6 +129,7 @@ class CivitaiLoraLoaderStackedAdvanced(CivitaiBaseLoader):
     FUNCTION = "set_stack"
     CATEGORY = "loaders/Civitai"
 
+    @node_execution
     def set_stack(self, url, lora_weight, clip_weight, lora_stack=None, bypass=False, **kwargs) -> dict:
         self.prepare_modelinfo(url = url, **kwargs, bypass=bypass)
 
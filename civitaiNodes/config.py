@@ -24,7 +24,25 @@ class CivitaiConfig:
     use_aria2: bool = "aria2" in settings.download.method if hasattr(settings, "download") else True
     disable_ipv6: bool = settings.aria2.disable_ipv6 or True
     models_folder = pathlib.Path(models_dir).resolve()
+    lock_stale_after: float = settings.download.get("lock_stale_after", 120) if hasattr(settings, "download") else 120
+    model_store: bool = settings.download.get("store", False) if hasattr(settings, "download") else False
+    model_store_dir: pathlib.Path = pathlib.Path(settings.get("download", {}).get("store_dir", "") or models_folder / ".xtnodes_store")
+    link_mode: str = settings.download.get("link_mode", "auto") if hasattr(settings, "download") else "auto"
+    min_free_mb: int = settings.download.get("min_free_mb", 2048) if hasattr(settings, "download") else 2048
+    wait_for_disk_space: bool = settings.download.get("on_disk_full", "fail") == "wait" if hasattr(settings, "download") else False
+    disk_wait_timeout: float = settings.download.get("disk_wait_timeout", 600) if hasattr(settings, "download") else 600
     max_preview_images: int = settings.civitai.max_preview_images or 6
+    identify_timeout: float = settings.civitai.get("identify_timeout", 1.0)
+    offline: bool = settings.civitai.get("offline", False)
+    request_timeout: float = settings.civitai.get("request_timeout", 30)
+    max_connections: int = settings.civitai.get("max_connections", 32)
+    keep_raw_json: bool = settings.civitai.get("keep_raw_json", False)
+    modelinfo_cache_size: int = settings.civitai.get("modelinfo_cache_size", 256)
+    cache_max_mb: int = settings.civitai.get("cache_max_mb", 1024)
+    cache_max_entries: int = settings.civitai.get("cache_max_entries", 50000)
+    cache_gc_interval: float = settings.civitai.get("cache_gc_interval", 24)
+    timing_in_summary: bool = settings.civitai.get("timing_in_summary", False)
+    timing_log_threshold: float = settings.civitai.get("timing_log_threshold", 5.0)
     
     def __init__(self, **kwargs):
         # 初始化配置时，将传入的关键字参数赋值给实例属性
@@ -0,0 +1,69 @@
+# 本地模型库相关的节点，重依赖在节点执行时才导入
+
+class TriggerWordLookup:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "query": ("STRING", {"default": ""}),
+                "mode": (["prefix", "exact", "fuzzy"], {"default": "prefix"}),
+                "limit": ("INT", {"default": 10, "min": 1, "max": 200}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("result", "best_url")
+    FUNCTION = "lookup"
+    CATEGORY = "XTNodes/library"
+
+    def lookup(self, query: str, mode: str, limit: int):
+        from civitaiNodes.MyUtils.TriggerWordIndex import trigger_word_index, format_lookup_results
+        results = trigger_word_index.lookup(query, mode=mode, limit=limit)
+        text = format_lookup_results(results)
+        best_url = results[0]["url"] if len(results) > 0 else ""
+        return {
+            "result": (text, best_url),
+            "ui": {
+                "text": [text],
+            },
+        }
+
+
+class SafetensorsMetadataQuery:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "filters": ("STRING", {"default": "ss_base_model_version~sdxl", "multiline": True}),
+                "folder": (["loras", "checkpoints", "all"], {"default": "loras"}),
+                "limit": ("INT", {"default": 20, "min": 1, "max": 500}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("result", "first_name")
+    FUNCTION = "query"
+    CATEGORY = "XTNodes/library"
+
+    def query(self, filters: str, folder: str, limit: int):
+        from civitaiNodes.MyUtils.MetadataIndex import metadata_index, format_query_results
+        results = metadata_index.query(filters, folder=None if folder == "all" else folder, limit=limit)
+        text = format_query_results(results)
+        first_name = results[0]["name"] if len(results) > 0 else ""
+        return {
+            "result": (text, first_name),
+            "ui": {
+                "text": [text],
+            },
+        }
+
+
+NODE_CLASS_MAPPINGS = {
+    "XTNodesTriggerWordLookup": TriggerWordLookup,
+    "XTNodesSafetensorsMetadataQuery": SafetensorsMetadataQuery,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "XTNodesTriggerWordLookup": "Trigger Word Lookup(XTNodes)",
+    "XTNodesSafetensorsMetadataQuery": "Safetensors Metadata Query(XTNodes)",
+}
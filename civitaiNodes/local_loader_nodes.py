@@ -1,7 +1,7 @@
-from civitaiNodes.MyUtils.CivitaiBaseLoader import append_lora_stack, CivitaiBaseLoader
+from civitaiNodes.MyUtils.CivitaiBaseLoader import append_lora_stack, node_execution, CivitaiBaseLoader
 from civitaiNodes.MyUtils.ui_utils import add_civitai_input_dict, add_civitai_return_types, add_civitai_return_names
 from comfy.sd import load_lora_for_models, load_checkpoint_guess_config
-from comfy.utils import load_torch_file
+from civitaiNodes.MyUtils.lora_loading import load_lora
 import folder_paths
 
 class CheckpointLoaderSimpleWithPreviews(CivitaiBaseLoader):
@@ -19,6 +19,7 @@ class CheckpointLoaderSimpleWithPreviews(CivitaiBaseLoader):
     FUNCTION = "load_checkpoint"
     CATEGORY = "loaders/With Previews"
 
+    @node_execution
     def load_checkpoint(self, model_name, **kwargs):
         model_path = folder_paths.get_full_path("checkpoints", model_name)
         self.prepare_modelinfo(model_path=model_path, **kwargs)
@@ -63,16 +64,16 @@ class LoraLoaderWithPreviews(CivitaiBaseLoader):
     FUNCTION = "load_lora"
     CATEGORY = "loaders/With Previews"
 
+    @node_execution
     def load_lora(self, model, clip, model_name, strength_model, strength_clip, **kwargs):
         model_path = folder_paths.get_full_path("loras", model_name)
         self.prepare_modelinfo(model_path=model_path, **kwargs)
         
-        lora = None
-        if self.loaded_lora and self.loaded_lora[0] == model_path:
-            lora = self.loaded_lora[1]
-        else:
-            lora = load_torch_file(model_path, safe_load=True)
-            self.loaded_lora = (model_path, lora)
+        if strength_model == 0 and strength_clip == 0:
+            return self.process_result((model, clip))
+        # 只读取强度不为 0 的一侧会用到的张量
+        self.loaded_lora = load_lora(model_path, model, clip, strength_model, strength_clip, self.loaded_lora)
+        lora = self.loaded_lora[1]
 
         model_lora, clip_lora = load_lora_for_models(model, clip, lora, strength_model, strength_clip)
 
@@ -102,6 +103,7 @@ class LoraLoaderStackedWithPreviews(CivitaiBaseLoader):
     FUNCTION = "set_stack"
     CATEGORY = "loaders/With Previews"
 
+    @node_execution
     def set_stack(self, model_name, lora_weight, lora_stack=None, bypass=False, **kwargs):
         model_path = folder_paths.get_full_path("loras", model_name)
         self.prepare_modelinfo(model_path=model_path, **kwargs, bypass=bypass)
@@ -141,6 +143,7 @@ class LoraLoaderStackedAdvancedWithPreviews(CivitaiBaseLoader):
     FUNCTION = "set_stack"
     CATEGORY = "loaders/With Previews"
 
+    @node_execution
     def set_stack(self, model_name, lora_weight, clip_weight, lora_stack=None, bypass=False, **kwargs):
         model_path = folder_paths.get_full_path("loras", model_name)
         self.prepare_modelinfo(model_path=model_path, **kwargs, bypass=bypass)
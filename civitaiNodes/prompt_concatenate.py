@@ -35,7 +35,29 @@ def flatten_list(input_list: list) -> list:
             output_list.append(item)
     return output_list
 
-from typing import Any
+from typing import Any, Iterator
+from functools import lru_cache
+import re
+
+# 换行等控制字符视为分隔符，制表符视为空格，全角逗号视为半角逗号；一次 translate 完成
+_NORMALIZE_TABLE = str.maketrans({
+    "\n": ",",
+    "\r": ",",
+    "\f": ",",
+    "\v": ",",
+    "\t": " ",
+    "，": ",",
+})
+# 去重时只比较字母、数字、空格和下划线
+_NOT_ALLOWED_CHARS = re.compile(r"[^a-zA-Z0-9 _]")
+# (tag:1.2) / [tag] / {a|b} / <lora:name:0.8> 内的逗号不作为分隔符
+_GROUP_CHARS = re.compile(r"[(\[{<]")
+# 只遍历括号、逗号和转义字符（\\( 这样的转义括号作为一个整体匹配，不计入层级）
+_STRUCTURE_CHARS = re.compile(r"\\.|[()\[\]{}<>,]")
+_OPEN_CHARS = "([{<"
+_CLOSE_CHARS = ")]}>"
+# <lora:...> 等尖括号内是文件名，调整空白风格时保持原样
+_ANGLE_SPAN = re.compile(r"(<[^<>]*>)")
 
 
 def convert_prompt_to_string(prompt: Any) -> str:
@@ -46,39 +68,67 @@ def convert_prompt_to_string(prompt: Any) -> str:
     else:
         prompt = str(prompt)
     assert isinstance(prompt, str)
-    for char in ["\n", "\r", "\f", "\v"]:
-        prompt = prompt.replace(char, ",")
-    prompt = prompt.replace("\t", " ")
-    prompt = prompt.replace("，", ",")
-    return prompt
+    return prompt.translate(_NORMALIZE_TABLE)
+
+
+def split_prompt(prompt_str: str) -> list:
+    """按顶层逗号切分，括号内的逗号保留在同一个片段中；没有配对的括号当作普通字符，其后的逗号照常切分"""
+    if not _GROUP_CHARS.search(prompt_str):
+        return prompt_str.split(",")
+    matches = list(_STRUCTURE_CHARS.finditer(prompt_str))
+    # 先找出有配对的左括号，>_< 这样不配对的括号只影响它自己
+    opened = []
+    paired = set()
+    for match in matches:
+        char = match.group()
+        if char in _OPEN_CHARS:
+            opened.append(match.start())
+        elif char in _CLOSE_CHARS and len(opened) > 0:
+            paired.add(opened.pop())
+    tokens = []
+    depth = 0
+    start = 0
+    for match in matches:
+        char = match.group()
+        if char in _OPEN_CHARS:
+            if match.start() in paired:
+                depth += 1
+        elif char in _CLOSE_CHARS:
+            if depth > 0:
+                depth -= 1
+        elif char == "," and depth == 0:
+            tokens.append(prompt_str[start:match.start()])
+            start = match.end()
+    tokens.append(prompt_str[start:])
+    return tokens
+
+
+def _iter_words(prompt_str: str) -> Iterator[str]:
+    for token in split_prompt(prompt_str):
+        if "," in token:
+            # (a, b:1.2) 这样的分组，内部按 ", " 规范化
+            token = ", ".join(part for part in (part.strip() for part in token.split(",")) if part)
+        else:
+            token = token.strip()
+        if len(token) > 0:
+            yield token
 
 
 def convert_prompt_to_clean_list(prompt: Any) -> list:
-    prompt_str = convert_prompt_to_string(prompt)
-    all_words = prompt_str.split(",")
-    new_words = []
-    for word in all_words:
-        word = word.strip()
-        if len(word) > 0:
-            new_words.append(word)
-    return new_words
+    return list(_iter_words(convert_prompt_to_string(prompt)))
 
 
-def deduplicate_list(words: list) -> list:
-    def get_clean_chars(word: str) -> str:
-        # 定义允许的字符集
-        allowed_chars = (
-            "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 _"
-        )
-        import re
+def _get_dedup_key(word: str) -> str:
+    clean_word = _NOT_ALLOWED_CHARS.sub("", word)
+    # 除空格和下划线外全部由其他字符组成的词（如中文）使用原词比较，避免互相被当作重复
+    return clean_word if len(clean_word.strip(" _")) > 0 else word
 
-        # 使用正则表达式去除不允许的字符
-        return re.sub(f"[^{re.escape(allowed_chars)}]", "", word)
 
+def deduplicate_list(words: list) -> list:
     existing_words = set()
     new_words = []
     for word in words:
-        clean_word = get_clean_chars(word)
+        clean_word = _get_dedup_key(word)
         # 如果清理后的单词不在现有单词集合中，则添加
         if clean_word not in existing_words:
             new_words.append(word)
@@ -86,20 +136,75 @@ def deduplicate_list(words: list) -> list:
     return new_words
 
 
+def _restyle_plain(text: str, old: str, new: str) -> str:
+    if "," in text:
+        # 分组内部的 ", " 分隔符保持不变
+        return ", ".join(part.replace(old, new) for part in text.split(", "))
+    return text.replace(old, new)
+
+
+def _restyle_whitespace(word: str, whitespace_style: str) -> str:
+    if whitespace_style == "underscore":
+        old, new = " ", "_"
+    elif whitespace_style == "space":
+        old, new = "_", " "
+    else:
+        return word
+    if "<" not in word:
+        return _restyle_plain(word, old, new)
+    parts = _ANGLE_SPAN.split(word)
+    parts[::2] = [_restyle_plain(part, old, new) for part in parts[::2]]
+    return "".join(parts)
+
+
+# 每个片段（节点的一个输入）的清理结果缓存在进程内，批量 / XY Plot 中重复的片段只清理一次
+PROMPT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _clean_fragment(prompt_str: str, whitespace_style: str) -> tuple:
+    """返回片段中每个词的 (去重 key, 调整空白风格后的词)"""
+    return tuple(
+        (_get_dedup_key(word), _restyle_whitespace(word, whitespace_style))
+        for word in _iter_words(prompt_str.translate(_NORMALIZE_TABLE))
+    )
+
+
+def clean_prompt_fragments(
+    fragments: list,
+    remove_duplicates: bool = True,
+    whitespace_style: str = "space",
+) -> str:
+    # 规范化、切分、去重和调整空白风格在一次遍历中完成，多个片段之间也会去重
+    existing_words = set()
+    words = []
+    for fragment in fragments:
+        if not isinstance(fragment, str):
+            fragment = convert_prompt_to_string(fragment)
+        for clean_word, word in _clean_fragment(fragment, whitespace_style):
+            if remove_duplicates:
+                if clean_word in existing_words:
+                    continue
+                existing_words.add(clean_word)
+            words.append(word)
+
+    return ", ".join(words)
+
+
 def clean_prompt(
     prompt: Any,
     remove_duplicates: bool = True,
     whitespace_style: str = "space",
 ) -> Any:
-    words = convert_prompt_to_clean_list(prompt)
-    if remove_duplicates:
-        words = deduplicate_list(words)
-    if whitespace_style == "underscore":
-        words = [word.replace(" ", "_") for word in words]
-    elif whitespace_style == "space":
-        words = [word.replace("_", " ") for word in words]
+    return clean_prompt_fragments([prompt], remove_duplicates, whitespace_style)
 
-    return ", ".join(words)
+
+def broadcast_inputs(*input_lists: list) -> Iterator[tuple]:
+    """按 ComfyUI 列表输入的规则对齐各输入，较短的列表重复其最后一个元素"""
+    input_lists = [value if isinstance(value, list) and len(value) > 0 else [None] for value in input_lists]
+    batch_size = max(len(value) for value in input_lists)
+    for index in range(batch_size):
+        yield tuple(value[min(index, len(value) - 1)] for value in input_lists)
 
 
 class CleanPrompt:
@@ -115,15 +220,25 @@ class CleanPrompt:
     RETURN_NAMES = ("result",)
     FUNCTION = "_clean_prompt"
     CATEGORY = "XTNodes/prompt"
+    # 以列表形式接收整个批次，一次调用处理所有提示词
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True,)
 
     def _clean_prompt(
-        self, prompt, **kwargs
+        self, prompt = None, remove_duplicates = None, whitespace_style = None
     ):
-        result = clean_prompt(prompt, **kwargs)
+        results = []
+        for prompt_item, remove_duplicates_item, whitespace_style_item in broadcast_inputs(prompt, remove_duplicates, whitespace_style):
+            fragments = [] if prompt_item is None else [prompt_item]
+            results.append(clean_prompt_fragments(
+                fragments,
+                remove_duplicates=True if remove_duplicates_item is None else remove_duplicates_item,
+                whitespace_style=whitespace_style_item or "keep",
+            ))
         return {
-            "result": (result,),
+            "result": (results,),
             "ui": {
-                "text": [result],
+                "text": ["\n".join(results)],
             },
         }
 
@@ -146,21 +261,26 @@ class PromptConcatenate:
     RETURN_NAMES = ("result",)
     FUNCTION = "_concatenate_prompt"
     CATEGORY = "XTNodes/prompt"
+    # 以列表形式接收整个批次，一次调用处理所有提示词
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True,)
 
     def _concatenate_prompt(
-        self, prompt_A = None, prompt_B = None, prompt_C = None, prompt_D = None, prompt_E = None, **kwargs
+        self, prompt_A = None, prompt_B = None, prompt_C = None, prompt_D = None, prompt_E = None, remove_duplicates = None, whitespace_style = None
     ):
-        prompts = [prompt_A, prompt_B, prompt_C, prompt_D, prompt_E]
-        result = ""
-        for prompt in prompts:
-            if prompt is not None:
-                result += convert_prompt_to_string(prompt) + ", "
-        result = result[:-2]
-        result = clean_prompt(result, **kwargs)
+        results = []
+        for *prompts, remove_duplicates_item, whitespace_style_item in broadcast_inputs(
+            prompt_A, prompt_B, prompt_C, prompt_D, prompt_E, remove_duplicates, whitespace_style
+        ):
+            results.append(clean_prompt_fragments(
+                [prompt for prompt in prompts if prompt is not None],
+                remove_duplicates=True if remove_duplicates_item is None else remove_duplicates_item,
+                whitespace_style=whitespace_style_item or "keep",
+            ))
         return {
-            "result": (result,),
+            "result": (results,),
             "ui": {
-                "text": [result],
+                "text": ["\n".join(results)],
             },
         }
 
@@ -0,0 +1,189 @@
+"""
+HTTP routes registered on ComfyUI's PromptServer. Handlers import the heavy
+modules lazily and run blocking work in the default executor.
+"""
+import asyncio
+
+
+def _run_blocking(func, *args):
+    return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+# /xtnodes/modelinfo 的 folder 参数允许的模型文件夹
+MODEL_FOLDERS = ["loras", "checkpoints"]
+
+
+def _modelinfo_response(modelinfo) -> dict:
+    """模型信息以及与节点执行后相同格式的 UI 输出（summary 和已缓存的预览图）"""
+    from civitaiNodes.config import config
+    from civitaiNodes.MyUtils.ui_utils import get_summary, get_image_cache_path, remove_condition_in_url
+    image_urls = modelinfo.image_urls[:config.max_preview_images]
+    images = []
+    for image_url in image_urls:
+        path = get_image_cache_path(image_url)
+        if path.exists():
+            images.append({"filename": path.name, "subfolder": "http_image_cache", "type": "output"})
+    return {
+        "cached": True,
+        "url": modelinfo.url,
+        "id": modelinfo.id,
+        "versionId": modelinfo.versionId,
+        "title": modelinfo.title,
+        "versionName": modelinfo.versionName,
+        "type": modelinfo.type,
+        "baseModel": modelinfo.baseModel,
+        "category": modelinfo.category,
+        "trainedWords": modelinfo.trainedWords,
+        "downloaded": modelinfo.finish_downloaded,
+        "previews": [remove_condition_in_url(image_url) for image_url in image_urls],
+        "ui": {"text": [get_summary(modelinfo)], "images": images},
+    }
+
+
+async def _fetch_modelinfo(url: str = None, filepath: str = None):
+    # 缓存未命中时通过异步 API 获取，同时把预览图下载到缓存
+    from civitaiNodes.MyUtils import async_client
+    from civitaiNodes.MyUtils.civitaiModelInfo import get_ids_from_file
+    if url is not None:
+        modelinfo = await async_client.aresolve(url)
+    else:
+        # 计算大文件的哈希是阻塞操作，放到线程池中
+        modelId, versionId = await _run_blocking(get_ids_from_file, filepath)
+        modelinfo = await async_client.aload_parsed(modelId, versionId)
+    await modelinfo.afetch_previews()
+    return modelinfo
+
+
+def _fetch_error_status(error: Exception) -> int:
+    """获取失败时的状态码：模型或版本不存在 404，离线模式 503，其他上游错误 502"""
+    from civitaiNodes.MyUtils.civitaiModelInfo import ModelVersionNotFound
+    from civitaiNodes.MyUtils.http_utils import OfflineModeError
+    if isinstance(error, ModelVersionNotFound):
+        return 404
+    if isinstance(error, OfflineModeError):
+        return 503
+    # aiohttp.ClientResponseError.status / requests.HTTPError.response.status_code
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return 404 if status == 404 else 502
+
+
+def register_routes(routes):
+    from aiohttp import web
+
+    @routes.get("/xtnodes/modelinfo")
+    async def modelinfo(request):
+        # 默认只读取本地缓存，毫秒级返回；fetch=1 时缓存未命中再访问 civitai.com（本地文件需要计算哈希）
+        url = request.query.get("url", "").strip() or None
+        name = request.query.get("path", "").strip() or None
+        folder = request.query.get("folder", "loras")
+        fetch = request.query.get("fetch", "0").lower() in ["1", "true", "yes"]
+        if (url is None) == (name is None):
+            return web.json_response({"error": "Pass either url or path"}, status=400)
+        if folder not in MODEL_FOLDERS:
+            return web.json_response({"error": f"Unknown folder: {folder}"}, status=400)
+        filepath = None
+        if name is not None:
+            import folder_paths
+            filepath = folder_paths.get_full_path(folder, name)
+            if filepath is None:
+                return web.json_response({"error": f"{name} not found in {folder}"}, status=404)
+
+        from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+        try:
+            info = await _run_blocking(lambda: ModelInfo.from_cache(url=url, filepath=filepath))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        if info is None and fetch:
+            try:
+                info = await _fetch_modelinfo(url, filepath)
+            except Exception as e:
+                return web.json_response({"cached": False, "error": str(e)}, status=_fetch_error_status(e))
+        if info is None:
+            return web.json_response({"cached": False})
+        return web.json_response(await _run_blocking(_modelinfo_response, info))
+
+    @routes.get("/xtnodes/trigger_words")
+    async def trigger_words(request):
+        query = request.query.get("q", "")
+        mode = request.query.get("mode", "prefix")
+        try:
+            limit = int(request.query.get("limit", 20))
+        except ValueError:
+            return web.json_response({"error": "limit must be an integer"}, status=400)
+        if mode not in ["prefix", "exact", "fuzzy"]:
+            return web.json_response({"error": f"Unknown mode: {mode}"}, status=400)
+
+        def lookup():
+            from civitaiNodes.MyUtils.TriggerWordIndex import trigger_word_index
+            return trigger_word_index.lookup(query, mode=mode, limit=limit)
+
+        results = await _run_blocking(lookup)
+        return web.json_response({"query": query, "mode": mode, "results": results})
+
+    @routes.get("/xtnodes/safetensors_index")
+    async def safetensors_index(request):
+        # 每个 filter 参数一个条件，写法与 Safetensors Metadata Query 节点相同
+        filters = "\n".join(request.query.getall("filter", []))
+        folder = request.query.get("folder")
+        refresh = request.query.get("refresh", "0").lower() in ["1", "true", "yes"]
+        try:
+            limit = int(request.query.get("limit", 50))
+        except ValueError:
+            return web.json_response({"error": "limit must be an integer"}, status=400)
+        if folder is not None and folder not in MODEL_FOLDERS:
+            return web.json_response({"error": f"Unknown folder: {folder}"}, status=400)
+
+        def query():
+            from civitaiNodes.MyUtils.MetadataIndex import metadata_index
+            if refresh:
+                metadata_index.refresh(force=True)
+            return metadata_index.query(filters, folder=folder, limit=limit)
+
+        results = await _run_blocking(query)
+        return web.json_response({"filters": request.query.getall("filter", []), "results": results})
+
+    @routes.post("/xtnodes/json_cache/gc")
+    async def json_cache_gc(request):
+        # 立即执行一次 json_cache 维护（迁移、清理、按预算淘汰），返回统计信息
+        def run():
+            from civitaiNodes.MyUtils.cache_maintenance import run_maintenance
+            return run_maintenance()
+
+        return web.json_response(await _run_blocking(run))
+
+    @routes.get("/xtnodes/metrics")
+    async def metrics(request):
+        # 默认 Prometheus 文本格式，?format=json 返回 JSON
+        from civitaiNodes.MyUtils.metrics import registry
+        if request.query.get("format", "prometheus") == "json":
+            return web.json_response(registry.to_dict())
+        return web.Response(text=registry.to_prometheus(), content_type="text/plain")
+
+
+# 第一次 json_cache 维护在启动后延迟执行，不影响 ComfyUI 启动
+CACHE_MAINTENANCE_DELAY = 60
+
+
+def start_cache_maintenance():
+    import threading
+
+    def start():
+        from civitaiNodes.config import config
+        from civitaiNodes.MyUtils.cache_maintenance import start_scheduled_maintenance
+        start_scheduled_maintenance(config.cache_gc_interval)
+
+    timer = threading.Timer(CACHE_MAINTENANCE_DELAY, start)
+    timer.daemon = True
+    timer.start()
+
+
+try:
+    from server import PromptServer
+except ImportError:
+    PromptServer = None
+
+if PromptServer is not None and getattr(PromptServer, "instance", None) is not None:
+    register_routes(PromptServer.instance.routes)
+    start_cache_maintenance()
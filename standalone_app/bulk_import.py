@@ -0,0 +1,212 @@
+"""
+Provision a worker from a manifest of civitai.com models.
+
+The manifest is a text file with one entry per line, either a model URL
+(https://civitai.com/models/123?modelVersionId=456) or a bare modelVersionId.
+Empty lines and lines starting with # are ignored.
+
+The entries go through a pipeline: ModelInfo resolution runs concurrently, and every
+resolved model is handed to a download stage with bounded parallelism (and, with
+--previews, to a preview stage) as soon as it is ready, while other entries are
+still being resolved.
+Completed entries are recorded in json_cache/bulk_import_state.json, so running
+the same manifest again skips them without any network calls.
+
+Usage:
+    python bulk_import.py manifest.txt [--previews] [--resolve-workers 8] [--download-workers 2]
+"""
+
+
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+# custom_nodes\ComfyUI-XTNodes-EasyCivitai\standalone_app\bulk_import.py
+sys.path.append(str(pathlib.Path(__file__).parent / "/".join([".."]*3)))
+
+import time
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils.LazyLoadDict import LazyLoadDict
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo, get_model_id_from_version_id
+
+bulk_import_state = LazyLoadDict(config.json_cache_dir / "bulk_import_state.json")
+
+SKIPPED = "skipped"
+PRESENT = "present"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+class ImportItem:
+    def __init__(self, entry: str):
+        self.entry = entry
+        self.status = ""
+        self.error = ""
+        self.modelinfo: ModelInfo = None
+        self.path = ""
+        self.bytes_downloaded = 0
+        self.resolve_seconds = 0.0
+        self.download_seconds = 0.0
+        self.preview_seconds = 0.0
+
+    @property
+    def name(self) -> str:
+        if self.modelinfo is not None:
+            return f"{self.modelinfo.title} - {self.modelinfo.versionName}"
+        return self.entry
+
+
+def read_manifest(manifest_path: pathlib.Path) -> list[str]:
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+            if line not in entries:
+                entries.append(line)
+    return entries
+
+
+def is_completed(entry: str, with_previews: bool) -> bool:
+    # 只检查本地状态和文件，不访问网络
+    state = bulk_import_state.get(entry)
+    if state is None:
+        return False
+    if with_previews and not state.get("previews", False):
+        return False
+    path = pathlib.Path(state["path"])
+    return path.exists() and not pathlib.Path(str(path) + ".aria2").exists()
+
+
+def resolve(item: ImportItem) -> ImportItem:
+    start = time.perf_counter()
+    if item.entry.isdigit():
+        modelVersionId = int(item.entry)
+        item.modelinfo = ModelInfo(modelId=get_model_id_from_version_id(modelVersionId), modelVersionId=modelVersionId)
+    else:
+        item.modelinfo = ModelInfo(url=item.entry)
+    item.path = str(item.modelinfo.full_path)
+    item.resolve_seconds = time.perf_counter() - start
+    return item
+
+
+def download(item: ImportItem) -> ImportItem:
+    start = time.perf_counter()
+    if item.modelinfo.finish_downloaded:
+        item.status = PRESENT
+    else:
+        item.modelinfo.download()
+        if not item.modelinfo.finish_downloaded:
+            raise RuntimeError(f"Download of {item.path} did not complete")
+        item.bytes_downloaded = item.modelinfo.full_path.stat().st_size
+        item.status = DOWNLOADED
+    item.download_seconds = time.perf_counter() - start
+    return item
+
+
+def cache_previews(item: ImportItem) -> ImportItem:
+    from civitaiNodes.MyUtils.ui_utils import load_image_from_url
+    start = time.perf_counter()
+    for image_url in item.modelinfo.image_urls[:config.max_preview_images]:
+        load_image_from_url(image_url)
+    item.preview_seconds = time.perf_counter() - start
+    return item
+
+
+def mark_completed(item: ImportItem, with_previews: bool):
+    bulk_import_state[item.entry] = {
+        "modelId": item.modelinfo.id,
+        "versionId": item.modelinfo.versionId,
+        "path": item.path,
+        "previews": with_previews,
+    }
+
+
+def run_pipeline(entries: list[str], resolve_workers: int = 8, download_workers: int = 2, with_previews: bool = False) -> list[ImportItem]:
+    items = [ImportItem(entry) for entry in entries]
+    pending = []
+    for item in items:
+        if is_completed(item.entry, with_previews):
+            item.status = SKIPPED
+            item.path = bulk_import_state[item.entry]["path"]
+        else:
+            pending.append(item)
+
+    def fail(item: ImportItem, stage: str, error: Exception):
+        item.status = FAILED
+        if not item.error:
+            item.error = f"{stage}: {error}"
+        logging.error(f"{item.entry} failed during {stage}: {error}")
+
+    # 所有阶段的任务在同一个循环中处理：解析完成的条目立即开始下载和缓存预览图，不等待其他条目解析完成
+    with ThreadPoolExecutor(max_workers=resolve_workers, thread_name_prefix="resolve") as resolve_pool, \
+            ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="download") as download_pool, \
+            ThreadPoolExecutor(max_workers=resolve_workers, thread_name_prefix="preview") as preview_pool:
+        futures = {resolve_pool.submit(resolve, item): ("resolve", item) for item in pending}
+        remaining_stages = {}
+        while len(futures) > 0:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, item = futures.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    fail(item, stage, e)
+                if stage == "resolve":
+                    if item.status == FAILED:
+                        continue
+                    futures[download_pool.submit(download, item)] = ("download", item)
+                    if with_previews:
+                        futures[preview_pool.submit(cache_previews, item)] = ("previews", item)
+                    remaining_stages[item] = 2 if with_previews else 1
+                    continue
+                remaining_stages[item] -= 1
+                if remaining_stages[item] > 0:
+                    continue
+                if item.error:
+                    # 下载成功但预览图失败时，download 设置的状态需要改回失败
+                    item.status = FAILED
+                else:
+                    mark_completed(item, with_previews)
+    return items
+
+
+def format_summary(items: list[ImportItem], elapsed: float) -> str:
+    lines = [f"{'status':<11} {'MB':>9} {'resolve':>8} {'download':>9} {'previews':>9}  model"]
+    for item in items:
+        lines.append(
+            f"{item.status:<11} {item.bytes_downloaded / 1024 / 1024:>9.1f} {item.resolve_seconds:>7.1f}s "
+            f"{item.download_seconds:>8.1f}s {item.preview_seconds:>8.1f}s  {item.name}"
+            + (f"  ({item.error})" if item.error else "")
+        )
+    counts = {}
+    for item in items:
+        counts[item.status] = counts.get(item.status, 0) + 1
+    total_bytes = sum(item.bytes_downloaded for item in items)
+    lines.append("")
+    lines.append(", ".join(f"{status}: {count}" for status, count in counts.items()))
+    lines.append(
+        f"{len(items)} entries in {elapsed:.1f}s, {total_bytes / 1024 / 1024:.1f} MB downloaded, "
+        f"{total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s, {len(items) / max(elapsed, 1e-9):.2f} entries/s"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download every model listed in a manifest of civitai.com URLs or modelVersionIds")
+    parser.add_argument("manifest", type=pathlib.Path, help="text file with one URL or modelVersionId per line")
+    parser.add_argument("--previews", action="store_true", help="also cache the preview images")
+    parser.add_argument("--resolve-workers", type=int, default=8, help="concurrent ModelInfo lookups")
+    parser.add_argument("--download-workers", type=int, default=2, help="concurrent downloads")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    items = run_pipeline(read_manifest(args.manifest), args.resolve_workers, args.download_workers, args.previews)
+    print(format_summary(items, time.perf_counter() - start))
+    sys.exit(1 if any(item.status == FAILED for item in items) else 0)
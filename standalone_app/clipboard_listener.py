@@ -1,12 +1,16 @@
 """
 This application is designed to automate the downloading of models from civitai.com.
-It continuously monitors the clipboard for any URLs that point to civitai.com,
-specifically looking for valid links. When such a link is detected, the application
-automatically submits a download task to a thread pool, allowing up to 10 concurrent
-downloads. This ensures efficient and timely downloading of models, streamlining
-the process for the user. The application leverages multi-threading to manage multiple
-downloads simultaneously, optimizing the use of system resources and providing
-a seamless experience.
+It continuously monitors the clipboard for any URLs that point to civitai.com and
+submits them to the download daemon (see download_daemon.py). The daemon keeps a
+durable job journal, skips versions that are already queued or downloaded, limits
+concurrent downloads per host and retries failures with backoff.
+
+URLs can also be pushed from scripts through the local HTTP endpoint:
+    curl -X POST http://127.0.0.1:8765/submit -d '{"url": "https://civitai.com/models/..."}'
+    curl http://127.0.0.1:8765/status
+
+Usage:
+    python clipboard_listener.py [--port 8765] [--no-clipboard] [--workers 4] [--per-host 2]
 """
 
 
@@ -17,45 +21,55 @@ sys.path.append(str(pathlib.Path(__file__).parent.parent))
 # custom_nodes\ComfyUI-XTNodes-EasyCivitai\test\test_download_util.py
 sys.path.append(str(pathlib.Path(__file__).parent / "/".join([".."]*3)))
 
-from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
-
 import time
-import pyperclip
+import logging
+import argparse
 import threading
-from concurrent.futures import ThreadPoolExecutor
 
-# 假设这是你的下载函数
-def download_url(url):
-    # 模拟下载任务
-    try:
-        info = ModelInfo(url=url)
-        if not info.finish_downloaded:
-            info.download()
-    except:
-        pass
-    
-
-def monitor_clipboard(executor):
+from download_daemon import DownloadDaemon, daemon_settings
+
+
+def monitor_clipboard(daemon: DownloadDaemon, interval: float = 0.5):
+    import pyperclip
     recent_value = ""
     while True:
         clipboard_content = pyperclip.paste()
 
-        if clipboard_content != recent_value and "civitai.com" in clipboard_content and clipboard_content.startswith("http"):
+        is_link = "civitai.com" in clipboard_content and clipboard_content.startswith("http")
+        # AIR 标识符，例如 urn:air:sdxl:lora:civitai:328553@368189
+        is_air = clipboard_content.strip().lower().startswith("urn:air:")
+        if clipboard_content != recent_value and (is_link or is_air):
             print(f"Detected civitai.com link: {clipboard_content}")
-            # 提交下载任务给线程池
-            executor.submit(download_url, clipboard_content)
+            try:
+                daemon.submit(clipboard_content)
+            except ValueError as e:
+                logging.warning(e)
             recent_value = clipboard_content
 
-        time.sleep(0.5)
+        time.sleep(interval)
 
 if __name__ == "__main__":
-    print("Monitoring clipboard for civitai.com links...")
+    parser = argparse.ArgumentParser(description="Download civitai.com models from the clipboard or a local HTTP endpoint")
+    parser.add_argument("--host", default=daemon_settings.get("host", "127.0.0.1"), help="address of the HTTP endpoint")
+    parser.add_argument("--port", type=int, default=daemon_settings.get("port", 8765), help="port of the HTTP endpoint, 0 to disable")
+    parser.add_argument("--no-clipboard", action="store_true", help="only accept URLs from the HTTP endpoint")
+    parser.add_argument("--workers", type=int, default=daemon_settings.get("max_workers", 4), help="max concurrent jobs")
+    parser.add_argument("--per-host", type=int, default=daemon_settings.get("max_per_host", 2), help="max concurrent downloads per host")
+    parser.add_argument("--journal", type=pathlib.Path, default=None, help="path of the job journal")
+    args = parser.parse_args()
 
-    # 创建线程池，最多允许10个并发任务
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # 启动剪切板监控线程
-        clipboard_thread = threading.Thread(target=monitor_clipboard, args=(executor,))
-        clipboard_thread.start()
+    logging.basicConfig(level=logging.INFO)
+    daemon = DownloadDaemon(journal_path=args.journal, max_workers=args.workers, max_per_host=args.per_host)
+    daemon.start()
+    if args.port > 0:
+        daemon.serve_http(args.host, args.port)
 
-        # 主线程等待剪切板监控线程结束
-        clipboard_thread.join()
+    try:
+        if args.no_clipboard:
+            threading.Event().wait()
+        else:
+            print("Monitoring clipboard for civitai.com links...")
+            monitor_clipboard(daemon)
+    except KeyboardInterrupt:
+        # 未完成的任务已记录在日志中，下次启动时继续
+        daemon.stop()
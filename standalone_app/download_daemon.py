@@ -0,0 +1,318 @@
+"""
+A small download daemon for civitai.com models.
+
+Jobs are submitted by URL (from the clipboard listener, or over HTTP from scripts),
+recorded in an append-only JSON-lines journal so unfinished jobs survive a restart,
+de-duplicated by modelVersionId, and downloaded by a bounded pool of workers with a
+per-host concurrency limit (keyed on the storage host the download link redirects to). Failed jobs are retried with exponential backoff.
+
+HTTP endpoints (bound to localhost by default):
+    GET  /status            -> all jobs and counts per status
+    POST /submit            -> body: {"url": "..."} / {"urls": [...]} / plain text, one URL per line
+"""
+
+
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+# custom_nodes\ComfyUI-XTNodes-EasyCivitai\standalone_app\download_daemon.py
+sys.path.append(str(pathlib.Path(__file__).parent / "/".join([".."]*3)))
+
+import json
+import time
+import queue
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from civitaiNodes.config import config, settings
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+from civitaiNodes.MyUtils.download_utils import add_token_to_url, get_raw_url
+from civitaiNodes.MyUtils.safetensors_utils import format_summary
+
+daemon_settings = settings.get("daemon", {})
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+FINISHED_STATES = [DONE, FAILED, DUPLICATE]
+
+
+class DownloadJob:
+    def __init__(self, url: str, versionId: int = None, modelId: int = None, status: str = QUEUED,
+                 attempts: int = 0, error: str = "", path: str = "", file: str = "", **kwargs):
+        self.url = url
+        self.versionId = versionId
+        self.modelId = modelId
+        self.status = status
+        self.attempts = attempts
+        self.error = error
+        self.path = path
+        self.file = file  # 下载前从 safetensors 头部读取的大小 / dtype 概要
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "versionId": self.versionId,
+            "modelId": self.modelId,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "path": self.path,
+            "file": self.file,
+        }
+
+
+class DownloadJournal:
+    """追加写入的任务日志，每行是某个任务的最新状态；启动时重放并压缩"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+
+    def replay(self) -> dict:
+        jobs = {}
+        if not self.path.exists():
+            return jobs
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被杀死时最后一行可能不完整
+                    continue
+                jobs[record["url"]] = DownloadJob(**record)
+        self.compact(jobs.values())
+        return jobs
+
+    def compact(self, jobs):
+        with self._lock:
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                for job in jobs:
+                    file.write(json.dumps(job.to_dict(), ensure_ascii=False) + "\n")
+            tmp_path.replace(self.path)
+
+    def record(self, job: DownloadJob):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps({**job.to_dict(), "time": time.time()}, ensure_ascii=False) + "\n")
+                file.flush()
+
+
+class DownloadDaemon:
+    def __init__(
+        self,
+        journal_path: pathlib.Path = None,
+        max_workers: int = daemon_settings.get("max_workers", 4),
+        max_per_host: int = daemon_settings.get("max_per_host", 2),
+        max_attempts: int = daemon_settings.get("max_attempts", 5),
+        retry_base_delay: float = daemon_settings.get("retry_base_delay", 30),
+        retry_max_delay: float = daemon_settings.get("retry_max_delay", 1800),
+    ):
+        if journal_path is None:
+            journal_path = config.json_cache_dir / "download_journal.jsonl"
+        self.journal = DownloadJournal(journal_path)
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.jobs: dict[str, DownloadJob] = {}
+        self._queue: "queue.Queue[DownloadJob]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._stopping = threading.Event()
+        self._workers: list[threading.Thread] = []
+
+    # ---- 任务管理 ----
+
+    def start(self):
+        self.jobs = self.journal.replay()
+        for job in self.jobs.values():
+            if job.status not in FINISHED_STATES:
+                job.status = QUEUED
+                self._queue.put(job)
+        logging.info(f"Restored {self._queue.qsize()} unfinished jobs from {self.journal.path}")
+        for index in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _find_by_version(self, versionId: int, exclude: DownloadJob = None) -> DownloadJob:
+        for job in self.jobs.values():
+            if job is not exclude and job.versionId == versionId and job.status not in [FAILED, DUPLICATE]:
+                return job
+        return None
+
+    def submit(self, url: str) -> DownloadJob:
+        """提交下载任务；同一 URL 或同一 modelVersionId 只会下载一次"""
+        url = url.strip()
+        if url.startswith("http") and "civitai.com" not in url:
+            raise ValueError(f"Not a civitai.com URL: {url}")
+        with self._lock:
+            job = self.jobs.get(url)
+            if job is not None and job.status != FAILED:
+                return job
+            modelId, versionId = ModelInfo.get_ids_from_url(url)
+            if versionId is not None:
+                existing = self._find_by_version(versionId)
+                if existing is not None:
+                    return existing
+            job = DownloadJob(url, versionId=versionId, modelId=modelId)
+            self.jobs[url] = job
+        self.journal.record(job)
+        self._queue.put(job)
+        logging.info(f"Queued {url}")
+        return job
+
+    def status(self) -> dict:
+        with self._lock:
+            jobs = [job.to_dict() for job in self.jobs.values()]
+        counts = {}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"counts": counts, "jobs": jobs}
+
+    def _set_status(self, job: DownloadJob, status: str, error: str = ""):
+        job.status = status
+        job.error = error
+        self.journal.record(job)
+
+    # ---- 下载 ----
+
+    def _host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job: DownloadJob):
+        job.attempts += 1
+        self._set_status(job, RUNNING)
+        try:
+            info = ModelInfo(url=job.url)
+            with self._lock:
+                job.modelId, job.versionId = info.id, info.versionId
+                duplicate = self._find_by_version(info.versionId, exclude=job)
+                if duplicate is not None:
+                    self._set_status(job, DUPLICATE, f"Same version as {duplicate.url}")
+                    return
+            job.path = str(info.full_path)
+            if not info.finish_downloaded:
+                host = self._download_host(info)
+                slot = self._host_slot(host)
+                if not slot.acquire(blocking=False):
+                    # 该主机的并发已满，稍后重新排队，不占用 worker
+                    job.attempts -= 1
+                    self._set_status(job, QUEUED)
+                    timer = threading.Timer(1.0, self._queue.put, args=[job])
+                    timer.daemon = True
+                    timer.start()
+                    return
+                try:
+                    self._describe_file(job, info)
+                    info.download()
+                finally:
+                    slot.release()
+                if not info.finish_downloaded:
+                    raise RuntimeError(f"Download of {job.path} did not complete")
+            self._set_status(job, DONE)
+            logging.info(f"Finished {job.url} -> {job.path}")
+        except Exception as e:
+            self._schedule_retry(job, e)
+
+    def _download_host(self, info: ModelInfo) -> str:
+        # civitai.com 的下载链接都会重定向到实际存放文件的主机，按重定向后的主机限制并发
+        raw_url = get_raw_url(add_token_to_url(info.downloadUrl, config.token))
+        return urlparse(raw_url).netloc
+
+    def _describe_file(self, job: DownloadJob, info: ModelInfo):
+        # 只读取文件头部（Range 请求），失败时不影响下载
+        try:
+            summary = info.safetensors_summary()
+        except Exception as e:
+            logging.debug(f"Could not read the safetensors header of {job.url}: {e}")
+            return
+        if summary is not None:
+            job.file = format_summary(summary)
+            logging.info(f"Downloading {job.path}: {job.file}")
+
+    def _schedule_retry(self, job: DownloadJob, error: Exception):
+        if job.attempts >= self.max_attempts:
+            logging.error(f"Giving up on {job.url} after {job.attempts} attempts: {error}")
+            self._set_status(job, FAILED, str(error))
+            return
+        delay = min(self.retry_base_delay * 2 ** (job.attempts - 1), self.retry_max_delay)
+        logging.warning(f"Failed {job.url} ({error}), retrying in {delay:.1f}s")
+        self._set_status(job, RETRYING, str(error))
+        timer = threading.Timer(delay, self._queue.put, args=[job])
+        timer.daemon = True
+        timer.start()
+
+    # ---- HTTP ----
+
+    def serve_http(self, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, data, status: int = 200):
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/status":
+                    self._send_json(daemon.status())
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                if urlparse(self.path).path != "/submit":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                try:
+                    data = json.loads(body)
+                    urls = data.get("urls", []) + ([data["url"]] if "url" in data else [])
+                except (json.JSONDecodeError, AttributeError):
+                    urls = [line for line in body.splitlines() if line.strip()]
+                jobs, errors = [], []
+                for url in urls:
+                    try:
+                        jobs.append(daemon.submit(url).to_dict())
+                    except ValueError as e:
+                        errors.append(str(e))
+                self._send_json({"jobs": jobs, "errors": errors}, 202 if len(jobs) > 0 else 400)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, name="download-daemon-http", daemon=True)
+        thread.start()
+        logging.info(f"Download daemon listening on http://{host}:{port}")
+        return server
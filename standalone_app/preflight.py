@@ -0,0 +1,138 @@
+"""
+Report which XTNodes nodes in a workflow would need network access.
+
+Every Civitai / "with Previews" loader in the workflow is checked against the local
+caches only (json_cache, the file hash map, the downloaded model files and the
+preview image cache) by resolving it with offline mode switched on. Nodes that hit
+a cache miss are listed with the reason, so a workflow can be verified before it is
+shipped to an air-gapped worker.
+
+Both the UI workflow format (exported .json) and the API prompt format are accepted.
+
+Usage:
+    python preflight.py workflow.json
+"""
+
+
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+# custom_nodes\ComfyUI-XTNodes-EasyCivitai\standalone_app\preflight.py
+sys.path.append(str(pathlib.Path(__file__).parent / "/".join([".."]*3)))
+
+import json
+import argparse
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo, ModelVersionNotFound
+from civitaiNodes.MyUtils.http_utils import OfflineModeError
+
+# 通过 URL 加载的节点类型 -> 控件名称
+REMOTE_NODES = {
+    "CivitaiCheckpointLoaderSimple": "url",
+    "CivitaiLoraLoader": "url",
+    "CivitaiLoraLoaderStacked": "url",
+    "CivitaiLoraLoaderStackedAdvanced": "url",
+}
+# 加载本地模型的节点类型 -> 模型所在的文件夹
+LOCAL_NODES = {
+    "CheckpointLoaderSimpleWithPreviews": "checkpoints",
+    "LoraLoaderWithPreviews": "loras",
+    "LoraLoaderStackedWithPreviews": "loras",
+    "LoraLoaderStackedAdvancedWithPreviews": "loras",
+}
+
+
+def iter_workflow_nodes(workflow: dict):
+    """返回 (node_id, class_type, 第一个控件的值, preview_images)"""
+    if "nodes" in workflow:
+        # UI 格式，控件值按顺序保存在 widgets_values 中
+        for node in workflow["nodes"]:
+            values = node.get("widgets_values") or []
+            if len(values) == 0:
+                continue
+            # preview_images 是最后一个布尔控件（bypass 在它之前）
+            preview_images = next((value for value in reversed(values) if isinstance(value, bool)), True)
+            yield str(node["id"]), node["type"], values[0], preview_images
+    else:
+        # API 格式
+        for node_id, node in workflow.items():
+            inputs = node.get("inputs", {})
+            value = inputs.get("url", inputs.get("model_name"))
+            yield str(node_id), node.get("class_type", ""), value, inputs.get("preview_images", True)
+
+
+def check_previews(modelinfo: ModelInfo) -> list[str]:
+    from civitaiNodes.MyUtils.ui_utils import get_image_cache_path
+    image_urls = modelinfo.image_urls[:config.max_preview_images]
+    missing = [url for url in image_urls if not get_image_cache_path(url).exists()]
+    if len(missing) > 0:
+        return [f"{len(missing)} of {len(image_urls)} preview images are not cached"]
+    return []
+
+
+def describe_file(modelinfo: ModelInfo) -> str:
+    # 之前读取过远程文件头部时显示大小和 dtype
+    from civitaiNodes.MyUtils.safetensors_utils import format_summary
+    try:
+        summary = modelinfo.safetensors_summary()
+    except OfflineModeError:
+        return ""
+    return f" ({format_summary(summary)})" if summary is not None else ""
+
+
+def check_node(class_type: str, value: str, preview_images: bool) -> list[str]:
+    """返回该节点需要访问网络的原因，空列表表示可以完全离线运行"""
+    reasons = []
+    try:
+        if class_type in REMOTE_NODES:
+            modelinfo = ModelInfo(url=value or "")
+            if not modelinfo.finish_downloaded and not modelinfo.in_store:
+                reasons.append(f"model file is not downloaded: {modelinfo.relative_path}{describe_file(modelinfo)}")
+        else:
+            import folder_paths
+            model_path = folder_paths.get_full_path(LOCAL_NODES[class_type], value)
+            if model_path is None:
+                return [f"local file not found: {value}"]
+            modelinfo = ModelInfo(filepath=model_path)
+    except OfflineModeError as e:
+        return [str(e)]
+    except (ValueError, ModelVersionNotFound) as e:
+        # 链接为空或无法解析、缓存的模型中没有该版本，只影响这个节点
+        return [f"cannot resolve {value!r}: {e}"]
+    if preview_images:
+        reasons.extend(check_previews(modelinfo))
+    return reasons
+
+
+def preflight(workflow: dict) -> list[tuple[str, str, str, list[str]]]:
+    config.offline = True
+    results = []
+    for node_id, class_type, value, preview_images in iter_workflow_nodes(workflow):
+        if class_type not in REMOTE_NODES and class_type not in LOCAL_NODES:
+            continue
+        results.append((node_id, class_type, value, check_node(class_type, value, preview_images)))
+    return results
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report which XTNodes nodes in a workflow would need network access")
+    parser.add_argument("workflow", type=pathlib.Path, help="workflow .json (UI or API format)")
+    args = parser.parse_args(argv)
+
+    with open(args.workflow, "r", encoding="utf-8") as file:
+        results = preflight(json.load(file))
+    needs_network = 0
+    for node_id, class_type, value, reasons in results:
+        status = "NETWORK" if len(reasons) > 0 else "OK"
+        needs_network += 1 if len(reasons) > 0 else 0
+        print(f"[{status:<7}] #{node_id} {class_type}: {value}")
+        for reason in reasons:
+            print(f"          - {reason}")
+    print(f"{needs_network} of {len(results)} nodes would need network access")
+    return 1 if needs_network > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark against the local civitai stand-in (fake_civitai.py).
+
+The node pack is loaded headless with the ComfyUI stubs, pointed at a FakeCivitai
+server and at a temporary models folder / json_cache, and then every phase a node
+goes through is timed per operation:
+
+    resolve cold / warm       ModelInfo(url=...) without / with json_cache
+    download                  redirect + file transfer (requests, not aria2)
+    hash lookup cold / warm   BLAKE3 of the local file + /by-hash, then the hash map
+    previews cold / warm      preview images downloaded / read from http_image_cache
+    node url / local          the Civitai and "with Previews" stacked LoRA loaders
+
+Latency percentiles (p50 / p90 / p99) are printed per phase; --json prints the
+raw report as the last line, for comparing runs.
+
+Usage:
+    python benchmark_e2e.py --models 10 --file-size 4 --latency 0.05 --bandwidth 50
+"""
+import sys
+import json
+import time
+import shutil
+import pathlib
+import argparse
+import tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent))
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+
+def percentile(values: list[float], q: float) -> float:
+    # 线性插值的分位数
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class PhaseTimer:
+    """按阶段记录每次操作的耗时"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.bytes: dict[str, int] = {}
+
+    def measure(self, phase: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(phase, []).append(time.perf_counter() - start)
+        return result
+
+    def add_bytes(self, phase: str, size: int):
+        self.bytes[phase] = self.bytes.get(phase, 0) + size
+
+    def report(self) -> dict:
+        report = {}
+        for phase, values in self.samples.items():
+            total = sum(values)
+            report[phase] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "mean": total / len(values),
+                "total": total,
+            }
+            if phase in self.bytes:
+                report[phase]["MB/s"] = self.bytes[phase] / 1024 / 1024 / max(total, 1e-9)
+        return report
+
+
+def setup_node_pack(root: pathlib.Path, fake: FakeCivitai):
+    """在临时目录中加载节点包，并把所有网络访问和缓存指向 fake server 和临时目录"""
+    install_comfy_stubs(models_dir=root / "models", output_dir=root / "output")
+    from civitaiNodes.config import config
+    from civitaiNodes.MyUtils import civitaiModelInfo, download_utils
+
+    config.api_endpoint = fake.api_endpoint
+    config.token = ""
+    config.offline = False
+    config.json_cache_dir = root / "json_cache"
+    config.json_cache_dir.mkdir(parents=True, exist_ok=True)
+    # 本地模型识别等待到完成，计入节点耗时
+    config.identify_timeout = 600
+    civitaiModelInfo.filepath_to_hash_map.filepath = config.json_cache_dir / "filepath_to_hash_map.json"
+    civitaiModelInfo.versionid_to_modelid_map.filepath = config.json_cache_dir / "versionid_to_modelid_map.json"
+    download_utils.use_aria2 = False
+
+
+def run_benchmark(models: int = 10, iterations: int = 5, file_size: int = 1024 * 1024, images: int = 2,
+                  latency: float = 0.0, bandwidth: float = None) -> dict:
+    root = pathlib.Path(tempfile.mkdtemp(prefix="xtnodes_bench_"))
+    timer = PhaseTimer()
+    try:
+        with FakeCivitai(latency=latency, bandwidth=bandwidth) as fake:
+            setup_node_pack(root, fake)
+            from civitaiNodes.MyUtils import CivitaiBaseLoader as base_loader
+            from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo, filepath_to_hash_map, get_ids_from_file
+            from civitaiNodes.MyUtils.ui_utils import get_ui_images
+            from civitaiNodes.civitai_url_nodes import CivitaiLoraLoaderStacked
+            from civitaiNodes.local_loader_nodes import LoraLoaderStackedWithPreviews
+
+            urls = []
+            for _ in range(models):
+                doc = fake.add_model(file_size=file_size, images=images)
+                urls.append(fake.model_url(doc["id"], doc["modelVersions"][0]["id"]))
+
+            infos = [timer.measure("resolve cold", ModelInfo, url) for url in urls]
+            for _ in range(iterations):
+                for url in urls:
+                    timer.measure("resolve warm", ModelInfo, url)
+
+            for info in infos:
+                timer.measure("download", info.download)
+                assert info.finish_downloaded, f"{info.full_path} was not downloaded"
+                timer.add_bytes("download", info.full_path.stat().st_size)
+
+            for info in infos:
+                timer.measure("hash lookup cold", get_ids_from_file, info.full_path)
+                timer.add_bytes("hash lookup cold", info.full_path.stat().st_size)
+            for _ in range(iterations):
+                for info in infos:
+                    timer.measure("hash lookup warm", get_ids_from_file, info.full_path)
+
+            for info in infos:
+                timer.measure("previews cold", get_ui_images, info.image_urls)
+            for _ in range(iterations):
+                for info in infos:
+                    timer.measure("previews warm", get_ui_images, info.image_urls)
+
+            url_node = CivitaiLoraLoaderStacked()
+            for _ in range(iterations):
+                for url in urls:
+                    timer.measure("node url", url_node.set_stack, url=url, lora_weight=1.0, preview_images=True)
+
+            # 清空哈希表和后台识别结果，第一轮是冷启动
+            filepath_to_hash_map.clear()
+            base_loader._identify_futures.clear()
+            local_node = LoraLoaderStackedWithPreviews()
+            for iteration in range(iterations):
+                phase = "node local cold" if iteration == 0 else "node local warm"
+                for info in infos:
+                    timer.measure(phase, local_node.set_stack, model_name=info.relative_path, lora_weight=1.0, preview_images=True)
+
+            report = {"phases": timer.report(), "requests": dict(fake.request_counts)}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    report["settings"] = {
+        "models": models, "iterations": iterations, "file_size": file_size, "images": images,
+        "latency": latency, "bandwidth": bandwidth,
+    }
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'phase':<18} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'total s':>8} {'MB/s':>8}"]
+    for phase, stats in report["phases"].items():
+        throughput = f"{stats['MB/s']:>8.1f}" if "MB/s" in stats else f"{'':>8}"
+        lines.append(
+            f"{phase:<18} {stats['count']:>6} {stats['p50'] * 1000:>9.2f} {stats['p90'] * 1000:>9.2f} "
+            f"{stats['p99'] * 1000:>9.2f} {stats['total']:>8.2f} {throughput}"
+        )
+    lines.append("")
+    lines.append("requests: " + ", ".join(f"{name}={count}" for name, count in sorted(report["requests"].items())))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the loaders, downloads and hash lookups against a local civitai stand-in")
+    parser.add_argument("--models", type=int, default=10, help="number of fixture models")
+    parser.add_argument("--iterations", type=int, default=5, help="repetitions of the warm phases")
+    parser.add_argument("--file-size", type=float, default=1.0, help="model file size in MB")
+    parser.add_argument("--images", type=int, default=2, help="preview images per model")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay per request in seconds")
+    parser.add_argument("--bandwidth", type=float, default=None, help="download speed in MB/s")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON on the last line")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        models=args.models,
+        iterations=args.iterations,
+        file_size=int(args.file_size * 1024 * 1024),
+        images=args.images,
+        latency=args.latency,
+        bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+    )
+    print(format_report(report))
+    if args.json:
+        print(json.dumps(report))
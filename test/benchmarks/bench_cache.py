@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from civitaiNodes.MyUtils.LazyLoadDict import LazyLoadDict
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+
+LAZY_LOAD_DICT_SIZES = [100, 10000]
+
+
+@pytest.fixture(scope="module", params=LAZY_LOAD_DICT_SIZES)
+def hash_map(request, bench_dir) -> LazyLoadDict:
+    # 与 filepath_to_hash_map 相同结构的数据
+    data = LazyLoadDict(bench_dir / f"hash_map_{request.param}.json")
+    data.update({
+        f"/models/loras/SDXL/style/model_{index}.safetensors": {"modelId": index, "modelVersionId": index * 10}
+        for index in range(request.param)
+    })
+    return data
+
+
+@pytest.mark.benchmark(group="LazyLoadDict")
+def test_lazy_load_dict_contains(benchmark, hash_map):
+    assert benchmark(hash_map.__contains__, "/models/loras/SDXL/style/model_1.safetensors")
+
+
+@pytest.mark.benchmark(group="LazyLoadDict")
+def test_lazy_load_dict_getitem(benchmark, hash_map):
+    assert benchmark(hash_map.__getitem__, "/models/loras/SDXL/style/model_1.safetensors")["modelId"] == 1
+
+
+@pytest.mark.benchmark(group="LazyLoadDict")
+def test_lazy_load_dict_setitem(benchmark, hash_map):
+    benchmark(hash_map.__setitem__, "/models/loras/SDXL/style/new.safetensors", {"modelId": 1, "modelVersionId": 2})
+
+
+@pytest.mark.benchmark(group="ModelInfo")
+def test_parse_model_id_json(benchmark, model_json):
+    versionId = model_json["modelVersions"][-1]["id"]
+    info = benchmark(ModelInfo.parse_model_id_json, model_json, modelVersionId=versionId)
+    assert info.versionId == versionId
+
+
+@pytest.mark.benchmark(group="ModelInfo")
+def test_get_url_json_from_cache(benchmark, model_json, model_json_cache):
+    data = benchmark(ModelInfo.get_url_json, model_json["id"], versionId=model_json["modelVersions"][-1]["id"], config=model_json_cache)
+    assert data["id"] == model_json["id"]
+
+
+@pytest.mark.benchmark(group="ModelInfo")
+def test_model_info_from_cache(benchmark, model_json, model_json_cache):
+    # 节点每次执行时的完整路径：读取缓存 JSON + 解析
+    versionId = model_json["modelVersions"][-1]["id"]
+    info = benchmark(ModelInfo, modelId=model_json["id"], modelVersionId=versionId, config=model_json_cache)
+    assert info.versionId == versionId
+
+
+@pytest.mark.benchmark(group="ModelInfo")
+def test_parse_full_document(benchmark, model_json, full_model_json_file):
+    # 对比：读取并解析完整的 API 响应
+    versionId = model_json["modelVersions"][-1]["id"]
+
+    def load_and_parse():
+        with open(full_model_json_file, "r", encoding="utf-8") as file:
+            return ModelInfo.parse_model_id_json(json.load(file), modelVersionId=versionId)
+
+    assert benchmark(load_and_parse).versionId == versionId
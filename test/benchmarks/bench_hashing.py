@@ -0,0 +1,21 @@
+import pytest
+
+from civitaiNodes.MyUtils.civitaiModelInfo import get_blake3_hash
+from civitaiNodes.MyUtils.ui_utils import get_metadata_from_file
+
+
+@pytest.mark.benchmark(group="get_blake3_hash")
+def test_get_blake3_hash(benchmark, safetensors_file):
+    size = safetensors_file.stat().st_size
+    benchmark.extra_info["MB"] = size / 1024 / 1024
+    digest = benchmark(get_blake3_hash, safetensors_file)
+    assert len(digest) == 64
+    # --benchmark-disable 时只执行一次，没有统计数据
+    if benchmark.stats:
+        benchmark.extra_info["MB/s"] = size / 1024 / 1024 / benchmark.stats.stats.median
+
+
+@pytest.mark.benchmark(group="get_metadata_from_file")
+def test_get_metadata_from_file(benchmark, safetensors_file):
+    metadata = benchmark(get_metadata_from_file, str(safetensors_file))
+    assert "ss_output_name" in metadata
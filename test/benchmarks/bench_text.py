@@ -0,0 +1,34 @@
+import pytest
+
+from civitaiNodes.MyUtils.civitaiModelInfo import gather_prompt_list, remove_condition_in_url
+from civitaiNodes.prompt_concatenate import clean_prompt, _clean_fragment
+
+IMAGE_URL = "https://image.civitai.com/xG1nkqKTMzGDvpLrqFT7WA/8eb19f79-6163-4ade-91ec-be4bac453910/width=1024/8547284.jpeg"
+
+
+@pytest.mark.benchmark(group="text")
+def test_remove_condition_in_url(benchmark):
+    assert "width=450" in benchmark(remove_condition_in_url, IMAGE_URL)
+
+
+@pytest.mark.benchmark(group="text")
+def test_gather_prompt_list(benchmark, prompt_corpus):
+    trained_words = [prompt for prompt in prompt_corpus if isinstance(prompt, str)][:50]
+    benchmark(gather_prompt_list, trained_words)
+
+
+def clean_corpus(corpus: list):
+    for prompt in corpus:
+        clean_prompt(prompt)
+
+
+@pytest.mark.benchmark(group="clean_prompt")
+def test_clean_prompt_cold(benchmark, prompt_corpus):
+    # 每轮前清空片段缓存，测量实际的清洗耗时
+    benchmark.pedantic(clean_corpus, args=(prompt_corpus,), setup=_clean_fragment.cache_clear, rounds=20)
+
+
+@pytest.mark.benchmark(group="clean_prompt")
+def test_clean_prompt_cached(benchmark, prompt_corpus):
+    clean_corpus(prompt_corpus)
+    benchmark(clean_corpus, prompt_corpus)
@@ -0,0 +1,104 @@
+"""
+Synthetic fixtures for the micro-benchmarks: safetensors files of several sizes,
+a large cached model JSON and a prompt corpus. folder_paths / comfy are stubbed so
+the suite runs headless.
+"""
+import sys
+import json
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent.parent
+sys.path.insert(0, str(test_dir))
+sys.path.insert(0, str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import make_safetensors
+
+# civitaiNodes 在导入时读取 folder_paths，必须先安装 stub
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_bench_models_"))
+
+SAFETENSORS_SIZES = {"1MB": 1024 * 1024, "16MB": 16 * 1024 * 1024, "128MB": 128 * 1024 * 1024}
+
+
+@pytest.fixture(scope="session")
+def bench_dir(tmp_path_factory) -> pathlib.Path:
+    return tmp_path_factory.mktemp("xtnodes_bench")
+
+
+@pytest.fixture(scope="session", params=list(SAFETENSORS_SIZES))
+def safetensors_file(request, bench_dir) -> pathlib.Path:
+    path = bench_dir / f"model_{request.param}.safetensors"
+    if not path.exists():
+        path.write_bytes(make_safetensors(SAFETENSORS_SIZES[request.param], seed=len(request.param)))
+    return path
+
+
+def make_model_json(modelId: int = 1000, versions: int = 50, images: int = 20, files: int = 3) -> dict:
+    """与 /models/{id} 相同结构的大型模型 JSON"""
+    doc = {
+        "id": modelId,
+        "name": "Benchmark Model",
+        "description": "<p>" + "lorem ipsum " * 500 + "</p>",
+        "type": "LORA",
+        "nsfw": False,
+        "tags": ["character", "anime", "style", "girl", "woman"],
+        "modelVersions": [],
+    }
+    for index in range(versions):
+        versionId = modelId + 1 + index
+        download_url = f"https://civitai.com/api/download/models/{versionId}"
+        doc["modelVersions"].append({
+            "id": versionId,
+            "modelId": modelId,
+            "name": f"v{index}",
+            "baseModel": "SDXL 1.0",
+            "trainedWords": [f"trigger{versionId}, Trigger{versionId}, style word", "another word, more words"],
+            "downloadUrl": download_url,
+            "files": [
+                {"id": versionId * 10 + n, "name": f"file_{versionId}_{n}.safetensors", "sizeKB": 147000.5,
+                 "downloadUrl": download_url if n == 0 else f"{download_url}?type=Training%20Data",
+                 "hashes": {"SHA256": "A" * 64, "BLAKE3": "B" * 64}, "metadata": {"format": "SafeTensor"}}
+                for n in range(files)
+            ],
+            "images": [
+                {"url": f"https://image.civitai.com/xG1nkqKTMzGDvpLrqFT7WA/{versionId}-{n}/width=1024/{n}.jpeg",
+                 "nsfw": "None", "width": 1024, "height": 1536,
+                 "meta": {"prompt": "masterpiece, best quality, 1girl, " * 10, "seed": n, "steps": 30}}
+                for n in range(images)
+            ],
+        })
+    return doc
+
+
+@pytest.fixture(scope="session")
+def model_json() -> dict:
+    return make_model_json()
+
+
+@pytest.fixture(scope="session")
+def model_json_cache(bench_dir, model_json):
+    """写入缓存目录的模型 JSON，返回指向该目录的 CivitaiConfig"""
+    from civitaiNodes.config import CivitaiConfig
+    from civitaiNodes.MyUtils.model_cache import store_model_doc
+    cache_config = CivitaiConfig(json_cache_dir=bench_dir / "json_cache")
+    store_model_doc(cache_config.json_cache_dir, model_json)
+    return cache_config
+
+
+@pytest.fixture(scope="session")
+def full_model_json_file(bench_dir, model_json) -> pathlib.Path:
+    """旧格式：完整的 API 响应（indent=4），用于和精简缓存对比"""
+    path = bench_dir / "full_model.json"
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(model_json, file, indent=4)
+    return path
+
+
+@pytest.fixture(scope="session")
+def prompt_corpus() -> list:
+    from test_prompt_clean import make_corpus
+    return make_corpus(size=400, seed=4321)
@@ -0,0 +1,52 @@
+"""
+Minimal stand-ins for the ComfyUI modules (folder_paths, comfy.sd, comfy.utils) so that
+the node pack can be imported and exercised headless, outside of a ComfyUI checkout.
+"""
+import sys
+import types
+import pathlib
+import tempfile
+
+
+def install_comfy_stubs(models_dir=None, output_dir=None) -> types.ModuleType:
+    """Register stub ComfyUI modules in sys.modules, return the folder_paths stub"""
+    if models_dir is None:
+        models_dir = tempfile.mkdtemp(prefix="xtnodes_models_")
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="xtnodes_output_")
+    models_dir = pathlib.Path(models_dir)
+    output_dir = pathlib.Path(output_dir)
+
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.models_dir = str(models_dir)
+    folder_paths.get_output_directory = lambda: str(output_dir)
+    folder_paths.get_folder_paths = lambda folder_name: [str(models_dir / folder_name)]
+
+    def get_filename_list(folder_name):
+        folder = models_dir / folder_name
+        if not folder.exists():
+            return []
+        return sorted(str(p.relative_to(folder)) for p in folder.rglob("*") if p.is_file())
+
+    def get_full_path(folder_name, filename):
+        path = models_dir / folder_name / filename
+        return str(path) if path.exists() else None
+
+    folder_paths.get_filename_list = get_filename_list
+    folder_paths.get_full_path = get_full_path
+    folder_paths.get_annotated_filepath = lambda name: str(output_dir / name)
+
+    comfy = types.ModuleType("comfy")
+    comfy_sd = types.ModuleType("comfy.sd")
+    comfy_sd.load_checkpoint_guess_config = lambda ckpt_path, **kwargs: (object(), object(), object(), None)
+    comfy_sd.load_lora_for_models = lambda model, clip, lora, strength_model, strength_clip: (model, clip)
+    comfy_utils = types.ModuleType("comfy.utils")
+    comfy_utils.load_torch_file = lambda path, safe_load=False: {}
+    comfy.sd = comfy_sd
+    comfy.utils = comfy_utils
+
+    sys.modules["folder_paths"] = folder_paths
+    sys.modules["comfy"] = comfy
+    sys.modules["comfy.sd"] = comfy_sd
+    sys.modules["comfy.utils"] = comfy_utils
+    return folder_paths
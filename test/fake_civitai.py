@@ -0,0 +1,337 @@
+"""
+A local stand-in for the civitai.com API, so that the loaders, downloads and hash
+lookups can be exercised (and timed) without the network.
+
+Served endpoints, all generated from fixture data registered with add_model():
+    GET       /api/v1/models/{modelId}
+    GET       /api/v1/model-versions/{versionId}
+    GET       /api/v1/model-versions/by-hash/{blake3}
+    GET/HEAD  /api/download/models/{versionId}     -> 307 redirect to /files/...
+    GET/HEAD  /files/{versionId}/{filename}        (supports Range requests)
+    GET       /images/{versionId}/{index}/width=450/{index}.png
+
+Every response is delayed by `latency` seconds and file bodies are throttled to
+`bandwidth` bytes per second, so results are reproducible on any machine.
+
+Usage (serve until interrupted, point settings.toml civitai.api_endpoint at it):
+    python fake_civitai.py --models 20 --latency 0.05 --bandwidth 20
+"""
+import re
+import json
+import time
+import zlib
+import struct
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_safetensors(size: int, seed: int = 0, metadata: dict = None) -> bytes:
+    """生成大约 size 字节的 safetensors 文件内容，内容由 seed 决定"""
+    header = {"__metadata__": metadata or {"ss_output_name": f"fake_{seed}"}}
+    tensors = max(1, size // (1024 * 1024))
+    per_tensor = max(2, size // tensors) // 2 * 2
+    offset = 0
+    for index in range(tensors):
+        header[f"lora_unet_block_{index}.weight"] = {
+            "dtype": "F16",
+            "shape": [per_tensor // 2],
+            "data_offsets": [offset, offset + per_tensor],
+        }
+        offset += per_tensor
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+    return struct.pack("<Q", len(header_bytes)) + header_bytes + random.Random(seed).randbytes(offset)
+
+
+def make_png(width: int = 64, height: int = 64, color: tuple = (128, 128, 128)) -> bytes:
+    """不依赖 PIL，生成单色 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(color) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeCivitai:
+    def __init__(self, latency: float = 0.0, bandwidth: float = None, host: str = "127.0.0.1", port: int = 0):
+        # latency: 每个请求的延迟（秒）；bandwidth: 文件下载速度（字节/秒），None 表示不限速
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.host = host
+        self.port = port
+        self.models: dict[int, dict] = {}
+        self.versions: dict[int, dict] = {}
+        self.hashes: dict[str, int] = {}
+        self.files: dict[int, bytes] = {}
+        self.images: dict[str, bytes] = {}
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer = None
+        self._next_id = 1000
+
+    # ---- fixtures ----
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_endpoint(self) -> str:
+        return self.base_url + "/api/v1"
+
+    def model_url(self, modelId: int, versionId: int = None) -> str:
+        # 与 civitai.com 相同形式的页面链接，ModelInfo 只从中解析 ID
+        url = f"https://civitai.com/models/{modelId}"
+        return url if versionId is None else url + f"?modelVersionId={versionId}"
+
+    def add_model(
+        self,
+        name: str = None,
+        type: str = "LORA",
+        versions: int = 1,
+        file_size: int = 1024 * 1024,
+        images: int = 2,
+        tags: list[str] = None,
+        trained_words: list[str] = None,
+        base_model: str = "SD 1.5",
+    ) -> dict:
+        """注册一个模型及其版本、文件和预览图，返回 /models/{id} 的 JSON（需要先 start()，链接中包含端口）"""
+        import blake3
+        assert self._server is not None, "start() the server before adding models"
+        with self._lock:
+            modelId = self._next_id
+            self._next_id += 1 + versions
+        name = name or f"Fake Model {modelId}"
+        doc = {
+            "id": modelId,
+            "name": name,
+            "description": f"<p>{name} served by the local civitai stand-in</p>",
+            "type": type,
+            "nsfw": False,
+            "tags": tags if tags is not None else ["style", f"tag{modelId}"],
+            "modelVersions": [],
+        }
+        for index in range(versions):
+            versionId = modelId + 1 + index
+            content = make_safetensors(file_size, seed=versionId)
+            filename = f"fake_{modelId}_v{index + 1}.safetensors"
+            download_url = f"{self.base_url}/api/download/models/{versionId}"
+            version = {
+                "id": versionId,
+                "modelId": modelId,
+                "name": f"v{index + 1}.0",
+                "baseModel": base_model,
+                "trainedWords": trained_words if trained_words is not None else [f"trigger{versionId}, fake style"],
+                "downloadUrl": download_url,
+                "files": [{
+                    "id": versionId,
+                    "name": filename,
+                    "sizeKB": len(content) / 1024,
+                    "type": "Model",
+                    "primary": True,
+                    "metadata": {"format": "SafeTensor", "fp": "fp16", "size": "pruned"},
+                    "hashes": {
+                        "BLAKE3": blake3.blake3(content).hexdigest().upper(),
+                        "SHA256": hashlib.sha256(content).hexdigest().upper(),
+                    },
+                    "downloadUrl": download_url,
+                }],
+                "images": [],
+            }
+            for image_index in range(images):
+                path = f"/images/{versionId}/{image_index}/width=450/{image_index}.png"
+                self.images[path] = make_png(color=((versionId * 37) % 256, (image_index * 91) % 256, 128))
+                version["images"].append({
+                    "url": self.base_url + path, "nsfw": "None", "width": 64, "height": 64, "meta": None,
+                })
+            with self._lock:
+                self.files[versionId] = content
+                self.hashes[version["files"][0]["hashes"]["BLAKE3"].lower()] = versionId
+                self.versions[versionId] = version
+            doc["modelVersions"].append(version)
+        with self._lock:
+            self.models[modelId] = doc
+        return doc
+
+    def version_doc(self, versionId: int) -> dict:
+        # /model-versions/{id} 和 by-hash 返回的版本 JSON 中附带模型的简要信息
+        version = self.versions[versionId]
+        model = self.models[version["modelId"]]
+        return {**version, "model": {"name": model["name"], "type": model["type"], "nsfw": model["nsfw"]}}
+
+    # ---- server ----
+
+    def start(self) -> "FakeCivitai":
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-civitai", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeCivitai":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+_ROUTES = [
+    ("model", re.compile(r"^/api/v1/models/(\d+)$")),
+    ("by-hash", re.compile(r"^/api/v1/model-versions/by-hash/([0-9a-fA-F]+)$")),
+    ("version", re.compile(r"^/api/v1/model-versions/(\d+)$")),
+    ("download", re.compile(r"^/api/download/models/(\d+)$")),
+    ("file", re.compile(r"^/files/(\d+)/([^/]+)$")),
+    ("image", re.compile(r"^/images/")),
+]
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _make_handler(fake: FakeCivitai):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _route(self):
+            path = urlparse(self.path).path
+            for name, pattern in _ROUTES:
+                match = pattern.match(path)
+                if match is not None:
+                    return name, match, path
+            return None, None, path
+
+        def _send_json(self, data, status: int = 200):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _send_not_found(self, message: str):
+            self._send_json({"error": message}, 404)
+
+        def _send_bytes(self, content: bytes, content_type: str):
+            start, end = 0, len(content) - 1
+            status = 200
+            match = _RANGE.match(self.headers.get("Range", ""))
+            if match is not None and match.group(0) != "bytes=-":
+                if match.group(1) == "":
+                    start = max(0, len(content) - int(match.group(2)))
+                else:
+                    start = int(match.group(1))
+                    if match.group(2) != "":
+                        end = min(end, int(match.group(2)))
+                if start > end:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(content)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+            self.end_headers()
+            if self.command == "HEAD":
+                return
+            view = memoryview(content)[start:end + 1]
+            for offset in range(0, len(view), CHUNK_SIZE):
+                chunk = view[offset:offset + CHUNK_SIZE]
+                self.wfile.write(chunk)
+                if fake.bandwidth:
+                    time.sleep(len(chunk) / fake.bandwidth)
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            name, match, path = self._route()
+            with fake._lock:
+                fake.request_counts[name or "unknown"] += 1
+            if fake.latency > 0:
+                time.sleep(fake.latency)
+            if name == "model":
+                doc = fake.models.get(int(match.group(1)))
+                return self._send_json(doc) if doc is not None else self._send_not_found("No model with id")
+            if name == "version":
+                versionId = int(match.group(1))
+                if versionId not in fake.versions:
+                    return self._send_not_found("No model version with id")
+                return self._send_json(fake.version_doc(versionId))
+            if name == "by-hash":
+                versionId = fake.hashes.get(match.group(1).lower())
+                if versionId is None:
+                    return self._send_not_found("Model not found")
+                return self._send_json(fake.version_doc(versionId))
+            if name == "download":
+                versionId = int(match.group(1))
+                if versionId not in fake.files:
+                    return self._send_not_found("No file for version")
+                filename = fake.versions[versionId]["files"][0]["name"]
+                self.send_response(307)
+                self.send_header("Location", f"{fake.base_url}/files/{versionId}/{quote(filename)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if name == "file":
+                content = fake.files.get(int(match.group(1)))
+                if content is None or fake.versions[int(match.group(1))]["files"][0]["name"] != unquote(match.group(2)):
+                    return self._send_not_found("No such file")
+                return self._send_bytes(content, "application/octet-stream")
+            if name == "image":
+                content = fake.images.get(path)
+                return self._send_bytes(content, "image/png") if content is not None else self._send_not_found("No such image")
+            self._send_not_found(f"Unknown endpoint {path}")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the civitai.com API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--models", type=int, default=10, help="number of fixture models")
+    parser.add_argument("--file-size", type=float, default=1.0, help="model file size in MB")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay per request in seconds")
+    parser.add_argument("--bandwidth", type=float, default=None, help="download speed in MB/s")
+    args = parser.parse_args()
+
+    fake = FakeCivitai(
+        latency=args.latency,
+        bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+        host=args.host,
+        port=args.port,
+    )
+    fake.start()
+    for _ in range(args.models):
+        doc = fake.add_model(file_size=int(args.file_size * 1024 * 1024))
+        print(fake.model_url(doc["id"], doc["modelVersions"][0]["id"]))
+    print(f"Fake civitai API on {fake.api_endpoint}, press Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,131 @@
+import sys
+import asyncio
+import pathlib
+import threading
+import tempfile
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_async_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import async_client, civitaiModelInfo, model_cache
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai(latency=0.02) as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "filepath", tmp_path / "versionid_to_modelid_map.json")
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "_data", {})
+        yield fake
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await async_client.close_session()
+    return asyncio.run(main())
+
+
+def test_concurrent_resolution_shares_fetches(fake):
+    docs = [fake.add_model(versions=2) for _ in range(10)]
+    urls = [fake.model_url(doc["id"], version["id"]) for doc in docs for version in doc["modelVersions"]] * 10
+    download_urls = [f"{fake.base_url}/api/download/models/{doc['modelVersions'][0]['id']}" for doc in docs]
+
+    async def resolve_all():
+        return await asyncio.gather(*(ModelInfo.aresolve(url) for url in urls + download_urls))
+
+    infos = run(resolve_all())
+    assert [info.versionId for info in infos[:len(urls)]] == [ModelInfo.get_ids_from_url(url)[1] for url in urls]
+    assert [info.id for info in infos[len(urls):]] == [doc["id"] for doc in docs]
+    # 每个模型只获取一次，每个下载链接的版本只查询一次
+    assert fake.request_counts["model"] <= 20
+    assert fake.request_counts["version"] == 10
+
+    # 与同步 API 共用缓存
+    requests_before = sum(fake.request_counts.values())
+    assert ModelInfo(urls[0]).versionId == infos[0].versionId
+    assert sum(fake.request_counts.values()) == requests_before
+
+
+def test_version_lookup_runs_file_access_in_threads(fake, monkeypatch):
+    doc = fake.add_model()
+    versionId = doc["modelVersions"][0]["id"]
+    versions = civitaiModelInfo.versionid_to_modelid_map
+    threads = {"map": set(), "store": []}
+    load, store_version_doc = versions._load, model_cache.store_version_doc
+    monkeypatch.setattr(versions, "_load", lambda: threads["map"].add(threading.get_ident()) or load())
+    monkeypatch.setattr(model_cache, "store_version_doc",
+                        lambda *args: threads["store"].append(threading.get_ident()) or store_version_doc(*args))
+
+    async def lookup():
+        loop_thread = threading.get_ident()
+        modelIds = await asyncio.gather(*(async_client.aget_model_id_from_version_id(versionId) for _ in range(5)))
+        return loop_thread, modelIds
+
+    loop_thread, modelIds = run(lookup())
+    assert modelIds == [doc["id"]] * 5
+    # 版本ID表和缓存文件的读写不在事件循环线程中，并发查询只保存一次
+    assert len(threads["map"]) > 0 and loop_thread not in threads["map"]
+    assert len(threads["store"]) == 1 and threads["store"][0] != loop_thread
+    assert fake.request_counts["version"] == 1
+
+
+def test_download_and_previews(fake, tmp_path):
+    doc = fake.add_model(file_size=300_000, images=3)
+
+    async def main():
+        info = await ModelInfo.aresolve(fake.model_url(doc["id"], None))
+        target = tmp_path / "models" / info.filename
+        await asyncio.gather(info.adownload(target), info.adownload(target))
+        paths = await info.afetch_previews()
+        return info, target, paths
+
+    info, target, paths = run(main())
+    assert target.read_bytes() == fake.files[info.versionId]
+    assert fake.request_counts["file"] == 1
+    assert len(paths) == 3 and all(path.exists() for path in paths)
+    assert fake.request_counts["image"] == 3
+
+
+def test_cache_reads_and_merges_run_in_threads(fake, monkeypatch):
+    doc = fake.add_model(versions=3)
+    newest = doc["modelVersions"][-1]
+    # 缓存时还没有最新的版本，解析时只获取该版本并合并
+    model_cache.store_model_doc(config.json_cache_dir, {**doc, "modelVersions": doc["modelVersions"][:-1]})
+    calls = []
+    for module, name in [(model_cache, "load_model_doc"), (model_cache, "store_version_doc"),
+                         (civitaiModelInfo.cache_maintenance, "record_access")]:
+        original = getattr(module, name)
+        monkeypatch.setattr(module, name, lambda *args, name=name, original=original, **kwargs:
+                            calls.append((name, threading.get_ident())) or original(*args, **kwargs))
+
+    async def resolve():
+        loop_thread = threading.get_ident()
+        merged = await ModelInfo.aresolve(fake.model_url(doc["id"], newest["id"]))
+        cached = await ModelInfo.aresolve(fake.model_url(doc["id"], doc["modelVersions"][0]["id"]))
+        return loop_thread, merged, cached
+
+    loop_thread, merged, cached = run(resolve())
+    assert merged.versionId == newest["id"] and cached.versionId == doc["modelVersions"][0]["id"]
+    assert fake.request_counts["version"] == 1 and fake.request_counts["model"] == 0
+    assert {name for name, _ in calls} == {"load_model_doc", "store_version_doc", "record_access"}
+    assert all(thread != loop_thread for _, thread in calls)
@@ -0,0 +1,128 @@
+import sys
+import pathlib
+import tempfile
+import threading
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_bulk_models_"))
+
+import folder_paths
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, download_utils
+from civitaiNodes.MyUtils.ui_utils import get_image_cache_path
+from standalone_app import bulk_import
+from standalone_app.bulk_import import ImportItem, DOWNLOADED, FAILED, PRESENT, SKIPPED
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "model_store", False)
+        monkeypatch.setattr(config, "min_free_mb", 0)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo, "models_folder", tmp_path / "models")
+        monkeypatch.setattr(download_utils, "use_aria2", False)
+        monkeypatch.setattr(folder_paths, "get_output_directory", lambda: str(tmp_path / "output"))
+        for lazy_dict, name in [(civitaiModelInfo.versionid_to_modelid_map, "versionid_to_modelid_map"),
+                                (civitaiModelInfo.filepath_to_hash_map, "filepath_to_hash_map"),
+                                (bulk_import.bulk_import_state, "bulk_import_state")]:
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+def test_manifest_and_idempotent_rerun(fake, tmp_path):
+    by_url, by_version = fake.add_model(), fake.add_model(versions=2)
+    versionId = by_version["modelVersions"][1]["id"]
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(
+        f"# models for the worker\n{fake.model_url(by_url['id'])}\n\n{versionId}\n{versionId}\nhttps://civitai.com/models/99999\n",
+        encoding="utf-8")
+    entries = bulk_import.read_manifest(manifest)
+    assert entries == [fake.model_url(by_url["id"]), str(versionId), "https://civitai.com/models/99999"]
+
+    items = bulk_import.run_pipeline(entries, with_previews=True)
+    assert [item.status for item in items] == [DOWNLOADED, DOWNLOADED, FAILED]
+    assert items[2].error.startswith("resolve: ")
+    # 只有版本ID的条目通过 /model-versions/{id} 找到模型
+    assert (items[1].modelinfo.id, items[1].modelinfo.versionId) == (by_version["id"], versionId)
+    assert fake.request_counts["version"] == 1
+    assert pathlib.Path(items[1].path).read_bytes() == fake.files[versionId]
+    assert all(get_image_cache_path(url).exists() for url in items[0].modelinfo.image_urls[:config.max_preview_images])
+
+    paths = [item.path for item in items[:2]]
+
+    # 再次运行时已完成的条目不访问网络
+    requests = dict(fake.request_counts)
+    items = bulk_import.run_pipeline(entries, with_previews=True)
+    assert [item.status for item in items] == [SKIPPED, SKIPPED, FAILED]
+    assert [item.path for item in items[:2]] == paths
+    assert {key: count - requests.get(key, 0) for key, count in fake.request_counts.items() if count != requests.get(key, 0)} == {"model": 1}
+
+    # 文件被删除后重新下载，已有的文件视为 present
+    pathlib.Path(items[0].path).unlink()
+    bulk_import.bulk_import_state.pop(entries[1])
+    items = bulk_import.run_pipeline(entries[:2])
+    assert [item.status for item in items] == [DOWNLOADED, PRESENT]
+
+
+def test_previews_start_while_other_entries_are_resolving(monkeypatch):
+    preview_started = threading.Event()
+
+    def resolve(item):
+        if item.entry == "slow":
+            # 在其他条目的预览图开始之前不结束
+            assert preview_started.wait(5)
+        item.modelinfo = object()
+        return item
+
+    monkeypatch.setattr(bulk_import, "resolve", resolve)
+    monkeypatch.setattr(bulk_import, "download", lambda item: setattr(item, "status", DOWNLOADED) or item)
+    monkeypatch.setattr(bulk_import, "cache_previews", lambda item: preview_started.set() or item)
+    monkeypatch.setattr(bulk_import, "is_completed", lambda entry, with_previews: False)
+    completed = []
+    monkeypatch.setattr(bulk_import, "mark_completed", lambda item, with_previews: completed.append(item.entry))
+
+    items = bulk_import.run_pipeline(["slow", "fast"], with_previews=True)
+    assert [item.status for item in items] == [DOWNLOADED, DOWNLOADED]
+    assert completed == ["fast", "slow"]
+
+
+def test_failed_previews_fail_the_entry(monkeypatch):
+    monkeypatch.setattr(bulk_import, "resolve", lambda item: item)
+    monkeypatch.setattr(bulk_import, "download", lambda item: setattr(item, "status", DOWNLOADED) or item)
+
+    def cache_previews(item):
+        raise OSError("image host unreachable")
+
+    monkeypatch.setattr(bulk_import, "cache_previews", cache_previews)
+    monkeypatch.setattr(bulk_import, "is_completed", lambda entry, with_previews: False)
+    monkeypatch.setattr(bulk_import, "mark_completed", lambda item, with_previews: pytest.fail("marked as completed"))
+    items = bulk_import.run_pipeline(["1"], with_previews=True)
+    assert (items[0].status, items[0].error) == (FAILED, "previews: image host unreachable")
+
+
+def test_format_summary():
+    downloaded, failed = ImportItem("https://civitai.com/models/1"), ImportItem("2")
+    downloaded.status, downloaded.bytes_downloaded, downloaded.download_seconds = DOWNLOADED, 3 * 1024 * 1024, 1.5
+    failed.status, failed.error = FAILED, "resolve: 404"
+    lines = bulk_import.format_summary([downloaded, failed], elapsed=2.0).splitlines()
+    assert lines[0].split() == ["status", "MB", "resolve", "download", "previews", "model"]
+    assert lines[1].split() == ["downloaded", "3.0", "0.0s", "1.5s", "0.0s", "https://civitai.com/models/1"]
+    assert lines[2].split()[:2] == ["failed", "0.0"] and lines[2].endswith("2  (resolve: 404)")
+    assert lines[-2] == "downloaded: 1, failed: 1"
+    assert lines[-1] == "2 entries in 2.0s, 3.0 MB downloaded, 1.5 MB/s, 1.00 entries/s"
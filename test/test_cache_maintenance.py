@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import pathlib
+import tempfile
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from test_model_cache import make_doc
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_gc_models_"))
+
+from civitaiNodes.MyUtils import cache_maintenance, civitaiModelInfo, model_cache
+
+HOUR = 3600
+
+
+def store_models(cache_dir: pathlib.Path, modelIds: list) -> float:
+    """缓存这些模型，访问时间按顺序递增，返回第一个模型的访问时间"""
+    start = time.time() - 2 * HOUR
+    for modelId in modelIds:
+        doc = make_doc(modelId=modelId, versions=1)
+        version = doc["modelVersions"][0]
+        version["files"][0].update(name=f"style_{modelId}.safetensors", downloadUrl=version["downloadUrl"])
+        directory = model_cache.store_model_doc(cache_dir, doc)
+        os.utime(directory / "model.json", (start - 1, start - 1))
+    accessed = {str(modelId): start + index for index, modelId in enumerate(modelIds)}
+    (cache_dir / "access_index.json").write_text(json.dumps(accessed))
+    return start
+
+
+def cached_ids(cache_dir: pathlib.Path) -> list:
+    return sorted(modelId for modelId, _ in model_cache.iter_cached_models(cache_dir))
+
+
+def test_lru_eviction_keeps_referenced_models(tmp_path, monkeypatch):
+    monkeypatch.setattr(civitaiModelInfo, "models_folder", tmp_path / "models_folder")
+    start = store_models(tmp_path, [1000, 2000, 3000, 4000, 5000, 6000])
+    # 通过 URL 下载的 3000 保存在 ModelInfo.full_path
+    downloaded = civitaiModelInfo.ModelInfo.parse_model_id_json(model_cache.load_model_doc(tmp_path, 3000)).full_path
+    assert downloaded.name == "Model - v0 - style_3000.safetensors"
+    downloaded.parent.mkdir(parents=True)
+    downloaded.write_bytes(b"lora")
+    report = cache_maintenance.collect(tmp_path, max_entries=4, referenced={1000},
+                                       filenames={"Model - v0 - style_2000.safetensors"}, now=start + 10 * HOUR)
+    # 1000 在文件哈希表中，2000 以下载时的文件名在模型文件夹中，3000 在下载位置，淘汰接下来最久未访问的两个
+    assert cached_ids(tmp_path) == [1000, 2000, 3000, 6000]
+    assert report["evicted"] == 2 and report["protected"] == 3 and report["entries"] == 4
+    assert sorted(json.loads((tmp_path / "access_index.json").read_text())) == ["1000", "2000", "3000", "6000"]
+
+
+def test_files_kept_under_their_civitai_name_are_protected(tmp_path):
+    start = store_models(tmp_path, [1000, 2000])
+    report = cache_maintenance.collect(tmp_path, max_entries=1, filenames={"style_1000.safetensors"}, now=start + 10 * HOUR)
+    assert cached_ids(tmp_path) == [1000]
+    assert report["evicted"] == 1 and report["protected"] == 1
+
+
+def test_recent_access_and_byte_budget(tmp_path):
+    store_models(tmp_path, [1000, 2000, 3000])
+    cache_maintenance.record_access(tmp_path, 1000)
+    # 刚访问过的 1000 在保护期内，其余按访问顺序淘汰
+    report = cache_maintenance.collect(tmp_path, max_bytes=1)
+    assert cached_ids(tmp_path) == [1000]
+    assert report["evicted"] == 2 and report["protected"] == 1 and report["freed_bytes"] > 0
+
+
+def test_orphans_and_unsharded_dirs(tmp_path):
+    store_models(tmp_path, [1000])
+    orphan = model_cache.model_dir(tmp_path, 7000)
+    orphan.mkdir(parents=True)
+    (orphan / "7001.json").write_text("{}")
+    os.utime(orphan, (0, 0))
+    model_cache.model_dir(tmp_path, 1000).rename(tmp_path / "models" / "1000")
+    report = cache_maintenance.collect(tmp_path)
+    assert report["orphans"] == 1 and not orphan.exists()
+    assert (model_cache.model_dir(tmp_path, 1000) / "model.json").exists()
+    assert report["entries"] == 1 and report["evicted"] == 0
@@ -0,0 +1,83 @@
+import sys
+import shutil
+import pathlib
+import threading
+from collections import namedtuple
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils import disk_space
+from civitaiNodes.MyUtils.disk_space import DiskSpaceGuard, InsufficientDiskSpace, MB
+
+Usage = namedtuple("Usage", "total used free")
+
+
+@pytest.fixture
+def free_space(monkeypatch):
+    free = {"bytes": 1000 * MB}
+    monkeypatch.setattr(shutil, "disk_usage", lambda path: Usage(0, 0, free["bytes"]))
+    monkeypatch.setattr(disk_space, "RECHECK_INTERVAL", 0.05)
+    return free
+
+
+def test_reservations_count_in_flight_downloads(tmp_path, free_space):
+    guard = DiskSpaceGuard()
+    target = tmp_path / "models" / "a.safetensors"
+    with guard.reserve(target, 600 * MB, min_free=100 * MB):
+        assert guard.reserved(tmp_path) == 600 * MB
+        with pytest.raises(InsufficientDiskSpace):
+            with guard.reserve(tmp_path / "b.safetensors", 400 * MB, min_free=100 * MB):
+                pass
+        with guard.reserve(tmp_path / "c.safetensors", 300 * MB, min_free=100 * MB):
+            assert guard.available(tmp_path, min_free=100 * MB) == 0
+    assert guard.reserved(tmp_path) == 0
+
+
+def test_partial_file_is_not_reserved_again(tmp_path, free_space):
+    guard = DiskSpaceGuard()
+    target = tmp_path / "a.safetensors"
+    target.write_bytes(b"\x00" * 1000)
+    free_space["bytes"] = 500 * MB
+    with guard.reserve(target, 500 * MB + 1000):
+        assert guard.reserved(tmp_path) == 500 * MB
+
+
+def test_waiting_download_starts_when_space_is_released(tmp_path, free_space):
+    guard = DiskSpaceGuard()
+    started = threading.Event()
+    with guard.reserve(tmp_path / "a.safetensors", 800 * MB):
+        def waiter():
+            with guard.reserve(tmp_path / "b.safetensors", 800 * MB, wait=True, timeout=5):
+                started.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        assert not started.wait(0.2)
+    thread.join(5)
+    assert started.is_set()
+
+    with guard.reserve(tmp_path / "a.safetensors", 800 * MB):
+        with pytest.raises(InsufficientDiskSpace):
+            with guard.reserve(tmp_path / "b.safetensors", 800 * MB, wait=True, timeout=0.1):
+                pass
+
+
+def test_written_bytes_are_not_counted_twice(tmp_path, free_space):
+    guard = DiskSpaceGuard()
+    target = tmp_path / "a.safetensors"
+    with guard.reserve(target, 600 * MB, min_free=100 * MB):
+        # 下载写入 200 MB（稀疏文件）后剩余空间相应减少
+        with open(tmp_path / "a.safetensors.host.1.2.tmp", "wb") as file:
+            file.truncate(200 * MB)
+        free_space["bytes"] = 800 * MB
+        assert guard.reserved(tmp_path) == 400 * MB
+        with guard.reserve(tmp_path / "b.safetensors", 300 * MB, min_free=100 * MB):
+            assert guard.available(tmp_path, min_free=100 * MB) == 0
+        # aria2 直接写入目标文件
+        (tmp_path / "a.safetensors.host.1.2.tmp").rename(target)
+        with open(target, "r+b") as file:
+            file.truncate(700 * MB)
+        assert guard.reserved(tmp_path) == 0
+    assert guard.reserved(tmp_path) == 0
@@ -0,0 +1,172 @@
+import sys
+import json
+import time
+import types
+import pathlib
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_daemon_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, download_utils
+from standalone_app.download_daemon import DownloadDaemon, DownloadJob, DONE, DUPLICATE, FAILED, QUEUED
+
+Timer = threading.Timer
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "model_store", False)
+        monkeypatch.setattr(config, "min_free_mb", 0)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo, "models_folder", tmp_path / "models")
+        monkeypatch.setattr(download_utils, "use_aria2", False)
+        for name in ["versionid_to_modelid_map", "filepath_to_hash_map"]:
+            lazy_dict = getattr(civitaiModelInfo, name)
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+@pytest.fixture
+def timers(monkeypatch):
+    """记录重试 / 重新排队的延迟，并立即执行"""
+    delays = []
+
+    class ImmediateTimer(Timer):
+        def __init__(self, interval, function, args=None, kwargs=None):
+            delays.append(interval)
+            super().__init__(0, function, args, kwargs)
+
+    monkeypatch.setattr(threading, "Timer", ImmediateTimer)
+    return delays
+
+
+def wait_for(predicate, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def run(daemon: DownloadDaemon, *jobs: DownloadJob):
+    try:
+        wait_for(lambda: all(job.status in [DONE, FAILED, DUPLICATE] for job in jobs or daemon.jobs.values()))
+    finally:
+        daemon.stop()
+
+
+def test_unfinished_jobs_are_replayed_after_restart(fake, tmp_path):
+    done, pending = fake.add_model(), fake.add_model()
+    journal = tmp_path / "journal.jsonl"
+    done_url = fake.model_url(done["id"], done["modelVersions"][0]["id"])
+    pending_url = fake.model_url(pending["id"], pending["modelVersions"][0]["id"])
+    lines = [
+        DownloadJob(done_url, status=DONE).to_dict(),
+        DownloadJob(pending_url, status=QUEUED).to_dict(),
+        {**DownloadJob(pending_url, status="running", attempts=1).to_dict(), "time": 1},
+    ]
+    # 进程被杀死时最后一行可能不完整
+    journal.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"url": "trunc', encoding="utf-8")
+
+    daemon = DownloadDaemon(journal, max_workers=2)
+    daemon.start()
+    run(daemon)
+    job = daemon.jobs[pending_url]
+    assert (daemon.jobs[done_url].status, job.status, job.attempts) == (DONE, DONE, 2)
+    assert pathlib.Path(job.path).read_bytes() == fake.files[pending["modelVersions"][0]["id"]]
+    # 已完成的任务不再下载
+    assert [path.name for path in (tmp_path / "models").rglob("*.safetensors")] == [pathlib.Path(job.path).name]
+    # 重放时压缩为每个任务一行，之后追加状态变化
+    records = [json.loads(line) for line in journal.read_text(encoding="utf-8").splitlines()]
+    assert [record["url"] for record in records[:2]] == [done_url, pending_url]
+    assert records[-1]["status"] == DONE
+
+    restarted = DownloadDaemon(journal)
+    assert {url: job.status for url, job in restarted.journal.replay().items()} == {done_url: DONE, pending_url: DONE}
+
+
+def test_same_version_is_downloaded_once(fake, tmp_path):
+    doc = fake.add_model(versions=2)
+    versionId = doc["modelVersions"][0]["id"]
+    daemon = DownloadDaemon(tmp_path / "journal.jsonl", max_workers=1)
+    daemon.start()
+    job = daemon.submit(fake.model_url(doc["id"], versionId))
+    assert daemon.submit(f"https://civitai.com/api/download/models/{versionId}") is job
+    assert daemon.submit(fake.model_url(doc["id"], versionId) + "\n") is job
+    # 没有版本ID的链接在下载前解析为默认版本，与已有任务重复
+    latest = daemon.submit(fake.model_url(doc["id"]))
+    assert latest is not job
+    other = daemon.submit(fake.model_url(doc["id"], doc["modelVersions"][1]["id"]))
+    run(daemon, job, latest, other)
+    assert (job.status, latest.status, other.status) == (DONE, DUPLICATE, DONE)
+    assert len(list((tmp_path / "models").rglob("*.safetensors"))) == 2
+    with pytest.raises(ValueError):
+        daemon.submit("https://example.com/model.safetensors")
+
+
+def test_failed_jobs_are_retried_with_backoff(fake, tmp_path, timers):
+    daemon = DownloadDaemon(tmp_path / "journal.jsonl", max_workers=1, max_attempts=4, retry_base_delay=1, retry_max_delay=3)
+    daemon.start()
+    job = daemon.submit(fake.model_url(999999))
+    run(daemon, job)
+    assert (job.status, job.attempts) == (FAILED, 4)
+    assert "999999" in job.error or "404" in job.error
+    assert timers == [1, 2, 3]
+    assert fake.request_counts["model"] == 4
+
+
+def test_host_limit_uses_the_redirect_target(fake, tmp_path):
+    doc = fake.add_model()
+    # 下载链接和文件在不同主机上时按文件所在的主机计数
+    info = types.SimpleNamespace(downloadUrl=doc["modelVersions"][0]["downloadUrl"].replace("127.0.0.1", "localhost"))
+    daemon = DownloadDaemon(tmp_path / "journal.jsonl")
+    assert daemon._download_host(info) == f"127.0.0.1:{fake.port}"
+
+
+def test_http_endpoints(fake, tmp_path):
+    doc = fake.add_model(versions=2)
+    daemon = DownloadDaemon(tmp_path / "journal.jsonl")
+    server = daemon.serve_http(port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(path, body: bytes = None):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(base_url + path, data=body)) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        first = fake.model_url(doc["id"], doc["modelVersions"][0]["id"])
+        second = fake.model_url(doc["id"], doc["modelVersions"][1]["id"])
+        status, result = request("/submit", json.dumps({"urls": [first, "https://example.com/x"]}).encode())
+        assert status == 202 and [job["url"] for job in result["jobs"]] == [first] and len(result["errors"]) == 1
+        status, result = request("/submit", f"{second}\n\n{first}\n".encode())
+        assert status == 202 and [job["versionId"] for job in result["jobs"]] == [doc["modelVersions"][1]["id"], doc["modelVersions"][0]["id"]]
+        assert request("/submit", b'{"url": "https://example.com/x"}')[0] == 400
+        status, result = request("/status")
+        assert status == 200 and result["counts"] == {QUEUED: 2} and len(result["jobs"]) == 2
+        assert request("/unknown")[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
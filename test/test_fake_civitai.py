@@ -0,0 +1,57 @@
+import sys
+import json
+import pathlib
+import subprocess
+import urllib.request
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent))
+
+from fake_civitai import FakeCivitai
+
+test_dir = pathlib.Path(__file__).parent
+
+
+def fetch(url: str, headers: dict = None):
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request) as response:
+        return response.status, dict(response.headers), response.read()
+
+
+def test_fake_serves_models_hashes_and_ranges():
+    with FakeCivitai() as fake:
+        doc = fake.add_model(file_size=200_000)
+        version = doc["modelVersions"][0]
+
+        _, _, body = fetch(f"{fake.api_endpoint}/models/{doc['id']}")
+        assert json.loads(body)["modelVersions"][0]["id"] == version["id"]
+
+        blake3_hash = version["files"][0]["hashes"]["BLAKE3"]
+        _, _, body = fetch(f"{fake.api_endpoint}/model-versions/by-hash/{blake3_hash}")
+        assert json.loads(body)["modelId"] == doc["id"]
+
+        # urllib 自动跟随下载链接的重定向
+        _, _, content = fetch(version["downloadUrl"])
+        assert content == fake.files[version["id"]]
+        header_size = int.from_bytes(content[:8], "little")
+        assert "__metadata__" in json.loads(content[8:8 + header_size])
+
+        status, headers, partial = fetch(version["downloadUrl"], {"Range": "bytes=100-199"})
+        assert status == 206
+        assert partial == content[100:200]
+        assert headers["Content-Range"] == f"bytes 100-199/{len(content)}"
+
+
+def test_benchmark_runs_against_fake():
+    # 新进程中运行，避免修改当前进程中的 config
+    completed = subprocess.run(
+        [sys.executable, str(test_dir / "benchmark_e2e.py"), "--models", "3", "--iterations", "2", "--file-size", "0.2", "--json"],
+        capture_output=True, text=True, check=True, cwd=test_dir,
+    )
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    phases = report["phases"]
+    assert phases["resolve cold"]["count"] == 3
+    assert phases["node local warm"]["count"] == 3
+    # 缓存命中的阶段不会访问 API：每个模型只请求一次 /models，哈希查询只在两次冷启动时发生
+    assert report["requests"]["model"] == 3
+    assert report["requests"]["by-hash"] == 6
+    assert report["requests"]["file"] == 3
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import pathlib
+import threading
+import multiprocessing
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils.file_lock import FileLock, LockTimeout, HOSTNAME
+from civitaiNodes.MyUtils.LazyLoadDict import LazyLoadDict
+
+
+def test_lock_is_exclusive(tmp_path):
+    path = tmp_path / "model.lock"
+    first = FileLock(path, poll_interval=0.01)
+    second = FileLock(path, poll_interval=0.01)
+    assert first.acquire(timeout=0)
+    assert not second.acquire(timeout=0.05)
+    with pytest.raises(LockTimeout):
+        with FileLock(path, poll_interval=0.01, timeout=0.05):
+            pass
+    first.release()
+    assert not path.exists()
+    assert second.acquire(timeout=0)
+    second.release()
+
+
+def test_waiter_gets_lock_after_release(tmp_path):
+    path = tmp_path / "model.lock"
+    holder = FileLock(path)
+    holder.acquire()
+    threading.Timer(0.1, holder.release).start()
+    waiter = FileLock(path, poll_interval=0.01)
+    assert waiter.acquire(timeout=5)
+    waiter.release()
+
+
+def test_stale_lock_is_broken(tmp_path):
+    path = tmp_path / "model.lock"
+    path.write_text(json.dumps({"host": "other-host", "pid": 1, "token": "x"}))
+    lock = FileLock(path, stale_after=60, poll_interval=0.01)
+    assert not lock.acquire(timeout=0.05)
+    # 心跳停止超过 stale_after 后可以接管
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert lock.acquire(timeout=0)
+    lock.release()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="pid check is skipped on Windows")
+def test_lock_of_dead_process_is_broken(tmp_path):
+    process = multiprocessing.Process(target=time.sleep, args=(0,))
+    process.start()
+    process.join()
+    path = tmp_path / "model.lock"
+    path.write_text(json.dumps({"host": HOSTNAME, "pid": process.pid, "token": "x"}))
+    lock = FileLock(path, stale_after=3600)
+    assert lock.acquire(timeout=0)
+    lock.release()
+
+
+def test_heartbeat_keeps_lock_fresh(tmp_path):
+    path = tmp_path / "model.lock"
+    holder = FileLock(path, stale_after=0.4)
+    holder.acquire()
+    try:
+        time.sleep(0.8)
+        assert not FileLock(path, stale_after=0.4).acquire(timeout=0)
+    finally:
+        holder.release()
+
+
+def test_release_keeps_lock_taken_over_by_another_worker(tmp_path):
+    path = tmp_path / "model.lock"
+    lock = FileLock(path, heartbeat=False)
+    lock.acquire()
+    # 锁过期后被其他进程接管
+    path.write_text(json.dumps({"host": "other-host", "pid": 1, "token": "other"}))
+    lock.release()
+    assert path.exists()
+
+
+def _increment(path, count):
+    data = LazyLoadDict(path)
+    for index in range(count):
+        data[f"{os.getpid()}-{index}"] = index
+
+
+def test_lazy_load_dict_concurrent_writers(tmp_path):
+    path = tmp_path / "map.json"
+    processes = [multiprocessing.Process(target=_increment, args=(path, 20)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 80
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import pathlib
+import subprocess
+
+project_root = pathlib.Path(__file__).parent.parent
+
+# 节点注册（ComfyUI 启动时导入本插件）允许的最长耗时；正常只需要几十毫秒，留出余量避免机器负载高时误报
+IMPORT_TIME_BUDGET = float(os.environ.get("XTNODES_IMPORT_TIME_BUDGET", "2.0"))
+
+# 这些依赖只能在节点第一次执行时导入
+HEAVY_MODULES = ["numpy", "torch", "PIL", "requests", "aiohttp", "safetensors", "codetiming", "dynaconf", "pydantic", "blake3"]
+
+# 在新的解释器中按 ComfyUI 的方式加载插件，避免受到当前进程已导入模块的影响
+LOAD_SCRIPT = """
+import sys, json, time, importlib.util
+sys.path.insert(0, {test_dir!r})
+from comfy_stubs import install_comfy_stubs
+install_comfy_stubs()
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("xtnodes", {init_path!r}, submodule_search_locations=[{root!r}])
+module = importlib.util.module_from_spec(spec)
+sys.modules["xtnodes"] = module
+spec.loader.exec_module(module)
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "timings": module.startup_timings,
+    "nodes": sorted(module.NODE_CLASS_MAPPINGS),
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+
+def load_node_pack() -> dict:
+    script = LOAD_SCRIPT.format(
+        test_dir=str(project_root / "test"),
+        init_path=str(project_root / "__init__.py"),
+        root=str(project_root),
+        heavy=HEAVY_MODULES,
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True, text=True, check=True,
+        env={**os.environ, "XTNODES_STARTUP_TIMING": "1"},
+    )
+    print(completed.stdout)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_node_registration_is_lightweight():
+    result = load_node_pack()
+    assert result["heavy"] == []
+    assert len(result["timings"]) == 5
+    assert "CivitaiLoraLoader" in result["nodes"]
+    assert "XTNodesCleanPrompt" in result["nodes"]
+    assert "XTNodesTriggerWordLookup" in result["nodes"]
+    assert "XTNodesSafetensorsMetadataQuery" in result["nodes"]
+    print(f"node registration took {result['seconds']:.3f}s: {result['timings']}")
+    assert result["seconds"] < IMPORT_TIME_BUDGET
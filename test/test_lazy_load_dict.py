@@ -0,0 +1,31 @@
+import os
+import sys
+import json
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils.LazyLoadDict import LazyLoadDict
+
+
+def test_reads_file_only_when_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "map.json"
+    data = LazyLoadDict(path)
+    data["a"] = 1
+
+    reads = []
+    original_load = json.load
+    monkeypatch.setattr(json, "load", lambda file: reads.append(file.name) or original_load(file))
+    for _ in range(10):
+        assert data["a"] == 1
+        assert "b" not in data
+    assert reads == []
+
+    # 其他进程写入后重新读取
+    other = LazyLoadDict(path)
+    other["b"] = 2
+    os.utime(path, ns=(0, 1))
+    reads.clear()
+    assert data["b"] == 2
+    assert data["a"] == 1
+    assert len(reads) == 1
@@ -0,0 +1,162 @@
+import os
+import sys
+import types
+import pathlib
+import tempfile
+import threading
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_loader_models_"))
+
+import folder_paths
+from civitaiNodes import civitai_url_nodes, local_loader_nodes
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import CivitaiBaseLoader, civitaiModelInfo, download_utils
+from civitaiNodes.MyUtils.phase_timing import current_recorder
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "model_store", False)
+        monkeypatch.setattr(config, "min_free_mb", 0)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo, "models_folder", tmp_path / "models")
+        monkeypatch.setattr(download_utils, "use_aria2", False)
+        monkeypatch.setattr(folder_paths, "get_output_directory", lambda: str(tmp_path / "output"))
+        for name in ["versionid_to_modelid_map", "filepath_to_hash_map"]:
+            lazy_dict = getattr(civitaiModelInfo, name)
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+def test_timing_is_appended_to_the_summary(fake, monkeypatch):
+    model = fake.add_model()
+    node = civitai_url_nodes.CivitaiLoraLoaderStacked()
+    url = fake.model_url(model["id"])
+
+    monkeypatch.setattr(config, "timing_in_summary", False)
+    result = node.set_stack(url, 1.0, preview_images=False)
+    assert "Timing:" not in result["ui"]["text"][0]
+
+    monkeypatch.setattr(config, "timing_in_summary", True)
+    result = node.set_stack(url, 0.5, preview_images=False)
+    summary = result["ui"]["text"][0]
+    assert "Timing:" in summary and "resolve" in summary
+    assert summary.index("Timing:") > 0
+    assert node.phase_recorder is None and current_recorder() is None
+
+
+def test_recorder_is_released_when_the_node_fails(fake, monkeypatch):
+    model = fake.add_model()
+    node = civitai_url_nodes.CivitaiCheckpointLoaderSimple()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("broken checkpoint")
+
+    monkeypatch.setattr(civitai_url_nodes, "load_checkpoint_guess_config", fail)
+    with pytest.raises(RuntimeError):
+        node.load_checkpoint(fake.model_url(model["id"]), preview_images=False)
+    # 出错前激活的记录器不能留在执行线程上，否则会记录到下一个节点的阶段
+    assert node.phase_recorder is None and current_recorder() is None
+
+    with pytest.raises(ValueError):
+        node.load_checkpoint("https://civitai.com/not-a-model", preview_images=False)
+    assert node.phase_recorder is None and current_recorder() is None
+
+
+@pytest.fixture
+def prompt_server(monkeypatch):
+    """记录推送到前端节点的事件"""
+    sent = []
+    received = threading.Event()
+
+    def send_sync(event, data):
+        sent.append((event, data))
+        received.set()
+
+    server = types.ModuleType("server")
+    server.PromptServer = types.SimpleNamespace(instance=types.SimpleNamespace(send_sync=send_sync))
+    monkeypatch.setitem(sys.modules, "server", server)
+    return sent, received
+
+
+def test_summary_is_pushed_when_identification_times_out(fake, monkeypatch, prompt_server):
+    sent, received = prompt_server
+    model = fake.add_model()
+    versionId = model["modelVersions"][0]["id"]
+    lora_dir = pathlib.Path(folder_paths.get_folder_paths("loras")[0])
+    lora_dir.mkdir(parents=True, exist_ok=True)
+    lora_path = lora_dir / f"identify_{versionId}.safetensors"
+    lora_path.write_bytes(fake.files[versionId])
+
+    # 识别在后台线程中等待 release，节点等待 identify_timeout 后先返回占位文本
+    release = threading.Event()
+
+    class SlowModelInfo(civitaiModelInfo.ModelInfo):
+        def __init__(self, *args, **kwargs):
+            release.wait(10)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(civitaiModelInfo, "ModelInfo", SlowModelInfo)
+    monkeypatch.setattr(config, "identify_timeout", 0.05)
+    try:
+        node = local_loader_nodes.LoraLoaderStackedWithPreviews()
+        result = node.set_stack(lora_path.name, 1.0, preview_images=False, unique_id="7")
+        assert result["ui"]["text"][0].startswith("Identifying model on civitai.com in background")
+        assert sent == []
+
+        release.set()
+        assert received.wait(10)
+        event, data = sent[0]
+        assert event == "xtnodes.modelinfo" and data["node"] == "7"
+        assert model["name"] in data["output"]["text"][0]
+
+        # 完成的识别不保留在表中，之后由哈希表直接得到结果
+        node.identify_future.result()
+        assert len(CivitaiBaseLoader._identify_futures) == 0
+        result = node.set_stack(lora_path.name, 1.0, preview_images=False, unique_id="7")
+        assert model["name"] in result["ui"]["text"][0]
+        assert len(sent) == 1
+    finally:
+        lora_path.unlink()
+
+
+def test_identification_is_keyed_on_file_size_and_mtime(monkeypatch, tmp_path):
+    release = threading.Event()
+    monkeypatch.setattr(civitaiModelInfo, "ModelInfo", lambda filepath: release.wait(10) and filepath)
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(b"first")
+    try:
+        first = CivitaiBaseLoader.identify_model_async(str(path))
+        assert CivitaiBaseLoader.identify_model_async(str(path)) is first
+        # 识别中的文件被替换后重新提交
+        path.write_bytes(b"replaced")
+        os.utime(path, ns=(0, 0))
+        second = CivitaiBaseLoader.identify_model_async(str(path))
+        assert second is not first
+        assert len(CivitaiBaseLoader._identify_futures) == 2
+    finally:
+        release.set()
+    # 回调按添加顺序执行，这里的回调执行时表中的记录已经移除
+    forgotten = [threading.Event(), threading.Event()]
+    first.add_done_callback(lambda future: forgotten[0].set())
+    second.add_done_callback(lambda future: forgotten[1].set())
+    assert all(event.wait(10) for event in forgotten)
+    assert first.result() == second.result() == str(path)
+    assert len(CivitaiBaseLoader._identify_futures) == 0
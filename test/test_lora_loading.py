@@ -0,0 +1,86 @@
+import sys
+import json
+import types
+import struct
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_lora_models_"))
+
+from civitaiNodes.MyUtils import lora_loading
+from civitaiNodes.MyUtils.lora_loading import load_lora, select_lora_keys
+
+UNET_KEYS = {"lora_unet_a": "a.weight", "diffusion_model.b.c": "b.c.weight"}
+CLIP_KEYS = {"lora_te1_d": "d.weight"}
+NAMES = [
+    "lora_unet_a.lora_up.weight",
+    "lora_unet_a.alpha",
+    "diffusion_model.b.c.hada_w1_a",
+    "lora_te1_d.lora_down.weight",
+]
+
+
+def test_select_only_active_modules():
+    assert select_lora_keys(NAMES, UNET_KEYS, CLIP_KEYS, 1.0, 0.0) == NAMES[:3]
+    assert select_lora_keys(NAMES, UNET_KEYS, CLIP_KEYS, 0.0, 0.5) == NAMES[3:4]
+    assert select_lora_keys(NAMES, UNET_KEYS, CLIP_KEYS, 1.0, 1.0) == NAMES[:4]
+    # 需要 lora_convert 转换的格式无法匹配，完整读取
+    assert select_lora_keys(["img_in.lora_A.weight"], UNET_KEYS, CLIP_KEYS, 1.0, 1.0) is None
+    assert select_lora_keys(["__metadata__"] + NAMES, UNET_KEYS, CLIP_KEYS, 1.0, 0.0) == NAMES[:3]
+
+
+def test_mixed_formats_are_loaded_completely():
+    # 部分张量直接匹配，其余（diffusers / PEFT 名称）要 lora_convert 转换后才能匹配，只读取一部分会丢掉它们
+    mixed = NAMES + ["transformer.blocks.0.attn.to_q.lora_A.weight", "transformer.blocks.0.attn.to_q.lora_B.weight"]
+    assert select_lora_keys(mixed, UNET_KEYS, CLIP_KEYS, 1.0, 1.0) is None
+    assert select_lora_keys(mixed, UNET_KEYS, CLIP_KEYS, 1.0, 0.0) is None
+
+
+@pytest.fixture
+def comfy_lora(monkeypatch):
+    module = types.ModuleType("comfy.lora")
+    module.model_lora_keys_unet = lambda model, key_map: {**key_map, **UNET_KEYS}
+    module.model_lora_keys_clip = lambda model, key_map: {**key_map, **CLIP_KEYS}
+    monkeypatch.setitem(sys.modules, "comfy.lora", module)
+    monkeypatch.setattr(sys.modules["comfy"], "lora", module, raising=False)
+    reads = []
+    monkeypatch.setattr(lora_loading, "read_tensors", lambda path, names: reads.append(list(names)) or {name: name for name in names})
+    return reads
+
+
+def test_load_reuses_tensors_already_read(tmp_path, comfy_lora):
+    header = json.dumps({name: {"dtype": "F16", "shape": [1], "data_offsets": [0, 2]} for name in NAMES}).encode()
+    path = tmp_path / "lora.safetensors"
+    path.write_bytes(struct.pack("<Q", len(header)) + header + b"\x00\x00")
+    model = types.SimpleNamespace(model=None)
+    clip = types.SimpleNamespace(cond_stage_model=None)
+
+    loaded = load_lora(str(path), model, clip, 1.0, 0.0)
+    assert sorted(loaded[1]) == sorted(NAMES[:3]) and loaded[2] is False
+    # 强度变小不需要新的张量，CLIP 强度不为 0 时才读取文本编码器部分
+    assert load_lora(str(path), model, clip, 0.5, 0.0, loaded) is loaded
+    loaded = load_lora(str(path), model, clip, 0.5, 1.0, loaded)
+    assert comfy_lora == [NAMES[:3], NAMES[:4]]
+    assert sorted(loaded[1]) == sorted(NAMES[:4])
+
+
+def test_load_mixed_file_completely(tmp_path, comfy_lora, monkeypatch):
+    names = NAMES + ["transformer.blocks.0.attn.to_q.lora_A.weight"]
+    header = json.dumps({name: {"dtype": "F16", "shape": [1], "data_offsets": [0, 2]} for name in names}).encode()
+    path = tmp_path / "mixed.safetensors"
+    path.write_bytes(struct.pack("<Q", len(header)) + header + b"\x00\x00")
+    monkeypatch.setattr(sys.modules["comfy.utils"], "load_torch_file", lambda path, safe_load=False: dict.fromkeys(names))
+
+    loaded = load_lora(str(path), types.SimpleNamespace(model=None), types.SimpleNamespace(cond_stage_model=None), 1.0, 0.0)
+    assert loaded[2] is True and sorted(loaded[1]) == sorted(names)
+    assert comfy_lora == []
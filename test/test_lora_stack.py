@@ -0,0 +1,80 @@
+import sys
+import pathlib
+import copy
+import pickle
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils.LoraStack import LoraStack
+
+
+def test_add_shares_prefix_and_keeps_parent():
+    base = LoraStack() + [("a.safetensors", 1.0, 1.0)]
+    left = base + [("b.safetensors", 0.5, 0.5)]
+    right = base + [("c.safetensors", 0.8, 0.7)]
+    assert list(base) == [("a.safetensors", 1.0, 1.0)]
+    assert list(left) == [("a.safetensors", 1.0, 1.0), ("b.safetensors", 0.5, 0.5)]
+    assert list(right) == [("a.safetensors", 1.0, 1.0), ("c.safetensors", 0.8, 0.7)]
+    assert [("z", 1.0, 1.0)] + base == [("z", 1.0, 1.0), ("a.safetensors", 1.0, 1.0)]
+
+
+def test_stack_is_immutable():
+    base = LoraStack([("a", 1.0, 1.0)])
+    child = base + [("b", 1.0, 1.0)]
+    with pytest.raises(TypeError):
+        base.append(("c", 1.0, 1.0))
+    with pytest.raises(TypeError):
+        base.extend([("c", 1.0, 1.0)])
+    # += 返回新的栈，原来的栈和共享前缀的栈不变
+    alias = base
+    base += [("c", 1.0, 1.0)]
+    assert [name for name, _, _ in base] == ["a", "c"]
+    assert alias == [("a", 1.0, 1.0)] and child == [("a", 1.0, 1.0), ("b", 1.0, 1.0)]
+
+
+def test_behaves_like_list_of_tuples():
+    stack = LoraStack([("a", 1.0, 1.0), ["b", 0.5, 0.2]])
+    assert len(stack) == 2
+    assert stack[1] == ("b", 0.5, 0.2)
+    assert stack[-1][0] == "b"
+    assert stack == [("a", 1.0, 1.0), ("b", 0.5, 0.2)]
+    assert [name for name, _, _ in stack] == ["a", "b"]
+    merged = []
+    merged.extend(stack)
+    assert merged == stack.to_list()
+    assert bool(LoraStack()) is False
+
+
+def test_hashable_and_equal_by_value():
+    a = LoraStack() + [("a", 1.0, 1.0)] + [("b", 0.5, 0.5)]
+    b = LoraStack([("a", 1.0, 1.0), ("b", 0.5, 0.5)])
+    assert a == b
+    assert hash(a) == hash(b) == hash(a.to_tuple())
+    assert {a: 1}[b] == 1
+    # 与相同元素的 tuple 相等，哈希也相同
+    assert {(("a", 1.0, 1.0), ("b", 0.5, 0.5)): 1}[a] == 1
+    assert a != b + [("c", 1.0, 1.0)]
+    # 用作 key 的栈不会被修改，哈希保持不变
+    cache = {a: 1}
+    a += [("c", 1.0, 1.0)]
+    assert cache[b] == 1 and a not in cache
+
+
+def test_copy_and_pickle():
+    stack = LoraStack([("a", 1.0, 1.0)])
+    # 不可变，copy / deepcopy 返回自身；copy() 返回可以修改的 list
+    assert copy.copy(stack) is stack and copy.deepcopy(stack) is stack
+    copied = stack.copy()
+    copied.append(("b", 1.0, 1.0))
+    assert isinstance(copied, list) and len(stack) == 1
+    assert pickle.loads(pickle.dumps(stack)) == stack
+
+
+def test_from_value_accepts_foreign_stacks():
+    assert LoraStack.from_value(None) == []
+    foreign = [("a", 1.0, 1.0)]
+    stack = LoraStack.from_value(foreign) + [("b", 1.0, 1.0)]
+    assert foreign == [("a", 1.0, 1.0)]
+    assert len(stack) == 2
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import struct
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import make_safetensors
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_index_models_"))
+
+import folder_paths
+from civitaiNodes.MyUtils import safetensors_utils
+from civitaiNodes.MyUtils import MetadataIndex as metadata_index_module
+from civitaiNodes.MyUtils.MetadataIndex import MetadataIndex, parse_filters
+
+
+@pytest.fixture
+def library(monkeypatch, tmp_path):
+    models_dir = tmp_path / "models"
+    (models_dir / "loras").mkdir(parents=True)
+    (models_dir / "checkpoints").mkdir(parents=True)
+
+    def get_filename_list(folder_name):
+        folder = models_dir / folder_name
+        return sorted(str(p.relative_to(folder)) for p in folder.rglob("*") if p.is_file())
+
+    monkeypatch.setattr(folder_paths, "get_filename_list", get_filename_list)
+    monkeypatch.setattr(folder_paths, "get_full_path", lambda folder_name, name: str(models_dir / folder_name / name))
+    return models_dir
+
+
+def write_lora(path: pathlib.Path, base_model: str, dim: int, tags: dict, seed: int = 0):
+    metadata = {
+        "ss_base_model_version": base_model,
+        "ss_network_dim": str(dim),
+        "ss_tag_frequency": json.dumps({"1_dataset": tags}),
+    }
+    path.write_bytes(make_safetensors(1024 * 1024, seed=seed, metadata=metadata))
+
+
+def test_query_and_incremental_refresh(library, tmp_path, monkeypatch):
+    write_lora(library / "loras" / "a.safetensors", "sdxl_base_v1-0", 32, {"1girl": 10, "red hair": 4})
+    write_lora(library / "loras" / "b.safetensors", "sd_v1", 8, {"landscape": 3}, seed=1)
+    (library / "loras" / "broken.safetensors").write_bytes(b"\x00" * 16)
+    (library / "loras" / "notes.txt").write_text("not a model")
+    index = MetadataIndex(tmp_path / "index.json", refresh_interval=0)
+
+    assert [r["name"] for r in index.query("ss_base_model_version~sdxl")] == ["a.safetensors"]
+    assert [r["name"] for r in index.query("ss_network_dim>=16")] == ["a.safetensors"]
+    assert [r["name"] for r in index.query("tag=red hair")] == ["a.safetensors"]
+    assert [r["name"] for r in index.query("ss_network_dim; tag!=1girl")] == ["b.safetensors"]
+    result = index.query("name=a.safetensors")[0]
+    assert result["tags"] == ["1girl", "red hair"]
+    assert result["key_groups"] == {"lora_unet": 1}
+    assert result["dtypes"] == {"F16": 1}
+    assert len(index) == 3
+
+    # 只重新读取变化的文件
+    reads = []
+    read_entry = metadata_index_module.read_entry
+    monkeypatch.setattr(metadata_index_module, "read_entry", lambda path: reads.append(path) or read_entry(path))
+    assert index.refresh() is False
+    write_lora(library / "loras" / "b.safetensors", "sdxl_base_v1-0", 8, {"landscape": 3}, seed=1)
+    os.utime(library / "loras" / "b.safetensors", ns=(1, 1))
+    (library / "loras" / "a.safetensors").unlink()
+    assert index.refresh() is True
+    assert [pathlib.Path(path).name for path in reads] == ["b.safetensors"]
+    assert [r["name"] for r in index.query("ss_base_model_version~sdxl")] == ["b.safetensors"]
+
+    # 重启后从索引文件加载，不再读取文件
+    reads.clear()
+    restarted = MetadataIndex(tmp_path / "index.json", refresh_interval=0)
+    assert [r["name"] for r in restarted.query("ss_base_model_version~sdxl")] == ["b.safetensors"]
+    assert reads == []
+
+
+def test_parse_filters():
+    assert parse_filters("ss_network_dim >= 16\nss_resolution~(1024, 1024); tag") == [
+        ("ss_network_dim", ">=", "16"),
+        ("ss_resolution", "~", "(1024, 1024)"),
+        ("tag", None, ""),
+    ]
+
+
+def test_key_groups():
+    header = {"lora_te1_text_model_encoder.alpha": {}, "lora_unet_down.weight": {}, "model.diffusion_model.x.weight": {}}
+    assert safetensors_utils.summarize_keys(header) == {"lora_te1": 1, "lora_unet": 1, "model.diffusion_model": 1}
+
+
+def write_header(path: pathlib.Path, header):
+    header_bytes = json.dumps(header).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(header_bytes)) + header_bytes + b"\x00" * 8)
+
+
+def test_malformed_headers_are_recorded_as_errors(library, tmp_path):
+    write_lora(library / "loras" / "good.safetensors", "sdxl_base_v1-0", 32, {"1girl": 1})
+    write_header(library / "loras" / "no_dtype.safetensors", {"a.weight": {"shape": [2], "data_offsets": [0, 4]}})
+    write_header(library / "loras" / "bad_shape.safetensors", {"a.weight": {"dtype": "F16", "shape": 2, "data_offsets": [0, 4]}})
+    write_header(library / "loras" / "no_offsets.safetensors", {"a.weight": {"dtype": "F16", "shape": [2]}})
+    write_header(library / "loras" / "list.safetensors", [1, 2])
+    index = MetadataIndex(tmp_path / "index.json", refresh_interval=0)
+
+    # 一个文件格式不对不影响其他文件的索引
+    assert [r["name"] for r in index.query()] == ["good.safetensors"]
+    assert len(index) == 5
+    for name in ["no_dtype", "bad_shape", "no_offsets", "list"]:
+        assert "error" in index.get(str(library / "loras" / f"{name}.safetensors")), name
@@ -0,0 +1,136 @@
+import sys
+import asyncio
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_metrics_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, metrics
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+from civitaiNodes.MyUtils.disk_space import DiskSpaceGuard, InsufficientDiskSpace
+from civitaiNodes.MyUtils.metrics import MetricsRegistry
+
+
+def test_counter_and_histogram_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ["result"])
+    latency = registry.histogram("test_latency_seconds", "Latency", ["endpoint"], buckets=(0.1, 1.0))
+    requests.inc(result="hit")
+    requests.inc(2, result="miss")
+    latency.observe(0.05, endpoint="/models/{id}")
+    latency.observe(0.5, endpoint="/models/{id}")
+    latency.observe(5.0, endpoint="/models/{id}")
+
+    text = registry.to_prometheus()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{result="miss"} 2' in text
+    assert 'test_latency_seconds_bucket{endpoint="/models/{id}",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{endpoint="/models/{id}",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{endpoint="/models/{id}",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{endpoint="/models/{id}"} 3' in text
+    assert requests.value(result="hit") == 1
+    assert latency.count(endpoint="/models/{id}") == 3
+
+
+def test_time_records_failures_and_json_output():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Latency")
+    try:
+        with latency.time():
+            raise RuntimeError("failed")
+    except RuntimeError:
+        pass
+    assert latency.count() == 1
+    data = registry.to_dict()
+    assert data["test_seconds"]["type"] == "histogram"
+    assert data["test_seconds"]["values"][0]["count"] == 1
+    # 重复注册返回同一个指标
+    assert registry.histogram("test_seconds", "Latency") is latency
+
+
+def test_labels_must_match():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Total", ["method"])
+    with pytest.raises(ValueError):
+        counter.inc(result="hit")
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        for name in ["versionid_to_modelid_map", "filepath_to_hash_map"]:
+            lazy_dict = getattr(civitaiModelInfo, name)
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+def test_instrumented_calls_update_metrics(fake, tmp_path):
+    # 指标是进程级的，只比较调用前后的差值
+    doc = fake.add_model()
+    misses = metrics.json_cache_requests.value(result="miss")
+    hits = metrics.json_cache_requests.value(result="hit")
+    fetches = metrics.api_request_seconds.count(endpoint="/models/{id}", status="200")
+
+    ModelInfo.get_url_json(doc["id"])
+    assert metrics.json_cache_requests.value(result="miss") == misses + 1
+    assert metrics.api_request_seconds.count(endpoint="/models/{id}", status="200") == fetches + 1
+    ModelInfo.get_url_json(doc["id"])
+    assert metrics.json_cache_requests.value(result="hit") == hits + 1
+    assert metrics.api_request_seconds.count(endpoint="/models/{id}", status="200") == fetches + 1
+
+    admitted = metrics.download_admissions.value(result="admitted")
+    rejected = metrics.download_admissions.value(result="rejected")
+    guard = DiskSpaceGuard()
+    with guard.reserve(tmp_path / "model.safetensors", 1024):
+        pass
+    with pytest.raises(InsufficientDiskSpace):
+        with guard.reserve(tmp_path / "model.safetensors", 1024, min_free=1 << 60):
+            pass
+    assert metrics.download_admissions.value(result="admitted") == admitted + 1
+    assert metrics.download_admissions.value(result="rejected") == rejected + 1
+
+
+def test_metrics_route_formats():
+    pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from civitaiNodes import server_routes
+
+    metrics.download_retries.inc(method="requests")
+
+    async def main():
+        routes = web.RouteTableDef()
+        server_routes.register_routes(routes)
+        app = web.Application()
+        app.add_routes(routes)
+        async with TestClient(TestServer(app)) as client:
+            text_response = await client.get("/xtnodes/metrics")
+            json_response = await client.get("/xtnodes/metrics", params={"format": "json"})
+            return (text_response.status, text_response.content_type, await text_response.text(),
+                    json_response.status, await json_response.json())
+
+    status, content_type, text, json_status, data = asyncio.run(main())
+    assert (status, content_type) == (200, "text/plain")
+    assert "# TYPE xtnodes_download_retries_total counter" in text
+    assert 'xtnodes_download_retries_total{method="requests"}' in text
+    assert json_status == 200
+    assert data["xtnodes_download_retries_total"]["type"] == "counter"
+    assert data["xtnodes_http_request_duration_seconds"]["type"] == "histogram"
@@ -0,0 +1,94 @@
+import sys
+import json
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils import model_cache
+
+
+def make_doc(modelId: int = 10, versions: int = 3) -> dict:
+    return {
+        "id": modelId,
+        "name": "Model",
+        "description": "<p>long description</p>",
+        "type": "LORA",
+        "nsfw": False,
+        "tags": ["style"],
+        "stats": {"downloadCount": 1},
+        "modelVersions": [
+            {
+                "id": modelId + 1 + index,
+                "modelId": modelId,
+                "name": f"v{index}",
+                "baseModel": "SDXL 1.0",
+                "trainedWords": ["word"],
+                "downloadUrl": f"https://civitai.com/api/download/models/{modelId + 1 + index}",
+                "description": "changelog",
+                "files": [{"id": 1, "name": f"file{index}.safetensors", "sizeKB": 100.0, "downloadUrl": "x",
+                           "hashes": {"SHA256": "AB"}, "pickleScanMessage": "No Pickle imports"}],
+                "images": [{"url": "https://image.civitai.com/a/width=450/1.jpeg", "width": 1, "height": 1,
+                            "meta": {"prompt": "a very long prompt"}}],
+            }
+            for index in range(versions)
+        ],
+    }
+
+
+def test_store_and_load_single_version(tmp_path):
+    model_cache.store_model_doc(tmp_path, make_doc())
+    default = model_cache.load_model_doc(tmp_path, 10)
+    assert [version["id"] for version in default["modelVersions"]] == [11]
+    doc = model_cache.load_model_doc(tmp_path, 10, 13)
+    version = doc["modelVersions"][0]
+    assert doc["name"] == "Model" and doc["tags"] == ["style"]
+    assert version["files"][0] == {"id": 1, "name": "file2.safetensors", "sizeKB": 100.0, "downloadUrl": "x", "hashes": {"SHA256": "AB"}}
+    assert "meta" not in version["images"][0]
+    assert "description" not in doc and "description" not in version
+    # 缓存中没有的版本视为未命中
+    assert model_cache.load_model_doc(tmp_path, 10, 99) is None
+    assert model_cache.load_model_doc(tmp_path, 20) is None
+
+
+def test_all_versions_and_raw(tmp_path):
+    model_cache.store_model_doc(tmp_path, make_doc(), keep_raw=True)
+    assert len(model_cache.load_all_versions(tmp_path, 10)["modelVersions"]) == 3
+    assert model_cache.load_raw_doc(tmp_path, 10) == make_doc()
+    assert [modelId for modelId, _ in model_cache.iter_cached_models(tmp_path)] == [10]
+
+
+def test_legacy_file_is_migrated_on_access(tmp_path):
+    legacy = tmp_path / "10.json"
+    legacy.write_text(json.dumps(make_doc(), indent=4), encoding="utf-8")
+    doc = model_cache.load_model_doc(tmp_path, 10, 12)
+    assert doc["modelVersions"][0]["id"] == 12
+    assert not legacy.exists()
+    (tmp_path / "30.json").write_text(json.dumps(make_doc(30)), encoding="utf-8")
+    (tmp_path / "filepath_to_hash_map.json").write_text("{}", encoding="utf-8")
+    assert model_cache.migrate_legacy_cache(tmp_path) == 1
+    assert (tmp_path / "filepath_to_hash_map.json").exists()
+
+
+def test_version_doc_is_added_to_cached_model(tmp_path):
+    doc = make_doc(versions=3)
+    newest = doc["modelVersions"].pop()
+    version_doc = {**newest, "model": {"name": "Model", "type": "LORA", "nsfw": False}}
+    # 模型未缓存时无法补充（版本文档不含 tags）
+    assert not model_cache.store_version_doc(tmp_path, version_doc)
+
+    model_cache.store_model_doc(tmp_path, doc)
+    assert model_cache.load_model_doc(tmp_path, 10, 13) is None
+    assert model_cache.store_version_doc(tmp_path, version_doc)
+    assert model_cache.load_model_doc(tmp_path, 10, 13)["modelVersions"][0]["name"] == "v2"
+    # 新版本成为默认版本
+    assert model_cache.load_model_doc(tmp_path, 10)["modelVersions"][0]["id"] == 13
+    assert [version["id"] for version in model_cache.load_model(tmp_path, 10)["modelVersions"]] == [13, 11, 12]
+
+
+def test_unsharded_dir_is_migrated_on_access(tmp_path):
+    directory = model_cache.store_model_doc(tmp_path, make_doc(modelId=43965))
+    assert directory == tmp_path / "models" / "43k" / "43965"
+    directory.rename(tmp_path / "models" / "43965")
+    assert [modelId for modelId, _ in model_cache.iter_cached_models(tmp_path)] == [43965]
+    assert model_cache.load_model_doc(tmp_path, 43965)["id"] == 43965
+    assert directory.exists() and not (tmp_path / "models" / "43965").exists()
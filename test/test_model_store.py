@@ -0,0 +1,80 @@
+import os
+import sys
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_store_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import download_utils, model_store
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(download_utils, "use_aria2", False)
+        yield fake
+
+
+def test_link_blob_hardlink_and_symlink(tmp_path):
+    blob = tmp_path / "store" / "blob"
+    blob.parent.mkdir()
+    blob.write_bytes(b"weights")
+
+    hardlink = tmp_path / "models" / "loras" / "a.safetensors"
+    model_store.link_blob(blob, hardlink, "hardlink")
+    assert os.stat(hardlink).st_ino == os.stat(blob).st_ino
+
+    symlink = tmp_path / "models" / "loras" / "b.safetensors"
+    model_store.link_blob(blob, symlink, "symlink")
+    assert symlink.is_symlink() and symlink.read_bytes() == b"weights"
+
+    # 已有的普通文件被替换为链接
+    existing = tmp_path / "models" / "loras" / "c.safetensors"
+    existing.write_bytes(b"old copy")
+    model_store.link_blob(blob, existing)
+    assert model_store.is_linked(blob, existing)
+    assert sorted(path.name for path in existing.parent.iterdir()) == ["a.safetensors", "b.safetensors", "c.safetensors"]
+
+
+def test_same_file_is_downloaded_once(fake, tmp_path):
+    version = fake.add_model(file_size=300_000)["modelVersions"][0]
+    sha256 = version["files"][0]["hashes"]["SHA256"]
+    store_dir = tmp_path / "store"
+    first = tmp_path / "models" / "loras" / "Model - v1 - fake.safetensors"
+    second = tmp_path / "models" / "loras" / "Renamed - v1 - fake.safetensors"
+
+    model_store.download_to_store(version["downloadUrl"], sha256, first, store_dir)
+    assert first.read_bytes() == fake.files[version["id"]]
+    assert fake.request_counts["file"] == 1
+
+    # 另一个名称（重命名的模型、其他链接）直接链接到仓库中的文件，不访问网络
+    model_store.download_to_store("http://127.0.0.1:1/unreachable", sha256, second, store_dir)
+    assert fake.request_counts["file"] == 1
+    assert os.path.samefile(first, second)
+    assert model_store.blob_path(store_dir, sha256).exists()
+    assert list((store_dir / "incoming").iterdir()) == []
+
+
+def test_hash_mismatch_is_not_stored(fake, tmp_path):
+    version = fake.add_model(file_size=100_000)["modelVersions"][0]
+    store_dir = tmp_path / "store"
+    with pytest.raises(model_store.StoreHashMismatch):
+        model_store.download_to_store(version["downloadUrl"], "0" * 64, tmp_path / "model.safetensors", store_dir)
+    assert not model_store.blob_path(store_dir, "0" * 64).exists()
+    assert not (tmp_path / "model.safetensors").exists()
+    assert list((store_dir / "incoming").iterdir()) == []
@@ -0,0 +1,110 @@
+import sys
+import asyncio
+import pathlib
+import tempfile
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_route_models_"))
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from civitaiNodes import server_routes
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import async_client, civitaiModelInfo
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "filepath", tmp_path / "versionid_to_modelid_map.json")
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "_data", {})
+        monkeypatch.setattr(civitaiModelInfo.filepath_to_hash_map, "filepath", tmp_path / "filepath_to_hash_map.json")
+        monkeypatch.setattr(civitaiModelInfo.filepath_to_hash_map, "_data", {})
+        yield fake
+
+
+def get(*queries):
+    """依次请求 /xtnodes/modelinfo，返回 (status, json) 列表"""
+    async def main():
+        routes = web.RouteTableDef()
+        server_routes.register_routes(routes)
+        app = web.Application()
+        app.add_routes(routes)
+        results = []
+        async with TestClient(TestServer(app)) as client:
+            for query in queries:
+                response = await client.get("/xtnodes/modelinfo", params=query)
+                results.append((response.status, await response.json()))
+        await async_client.close_session()
+        return results
+    return asyncio.run(main())
+
+
+def test_from_cache_does_not_fetch(fake):
+    doc = fake.add_model(versions=2)
+    url = fake.model_url(doc["id"], doc["modelVersions"][0]["id"])
+    assert ModelInfo.from_cache(url) is None
+    assert sum(fake.request_counts.values()) == 0
+
+    ModelInfo(url)
+    requests_before = sum(fake.request_counts.values())
+    info = ModelInfo.from_cache(url)
+    assert (info.id, info.versionId) == (doc["id"], doc["modelVersions"][0]["id"])
+    assert sum(fake.request_counts.values()) == requests_before
+
+
+def test_route_serves_cache_and_fetches_on_request(fake):
+    doc = fake.add_model(images=2)
+    url = fake.model_url(doc["id"], None)
+    (status, miss), (_, fetched), (_, cached) = get({"url": url}, {"url": url, "fetch": "1"}, {"url": url})
+    assert status == 200 and miss == {"cached": False}
+    assert fetched["id"] == doc["id"] and fetched["title"] == doc["name"]
+    # fetch=1 同时缓存了预览图，节点可以直接显示
+    assert len(fetched["ui"]["images"]) == 2
+    assert cached == fetched
+    assert fake.request_counts["model"] == 1 and fake.request_counts["image"] == 2
+
+
+def test_route_rejects_bad_queries(fake):
+    results = get({}, {"url": "https://example.com/file.safetensors"}, {"path": "missing.safetensors"},
+                  {"path": "a.safetensors", "folder": "vae"})
+    assert [status for status, _ in results] == [400, 400, 404, 400]
+    assert sum(fake.request_counts.values()) == 0
+
+
+def test_route_maps_fetch_errors(fake, monkeypatch):
+    doc = fake.add_model()
+    missing_version = fake.model_url(doc["id"], 99999)
+    results = get({"url": fake.model_url(99999), "fetch": "1"}, {"url": missing_version, "fetch": "1"})
+    # 模型或版本不存在时返回 404
+    assert [status for status, _ in results] == [404, 404]
+    assert all(result["cached"] is False and result["error"] for _, result in results)
+
+    uncached = fake.add_model()
+    monkeypatch.setattr(config, "offline", True)
+    status, result = get({"url": fake.model_url(uncached["id"]), "fetch": "1"})[0]
+    assert status == 503 and "Offline mode" in result["error"]
+
+    # 上游服务器不可用时返回 502
+    monkeypatch.setattr(config, "offline", False)
+    fake.stop()
+    status, result = get({"url": fake.model_url(uncached["id"]), "fetch": "1"})[0]
+    assert status == 502
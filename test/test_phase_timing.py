@@ -0,0 +1,54 @@
+import sys
+import json
+import pathlib
+import logging
+import threading
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.MyUtils.phase_timing import PhaseRecorder, phase, current_recorder
+
+
+def test_nested_phases_are_recorded_on_the_active_recorder():
+    recorder = PhaseRecorder("TestNode", "7")
+    recorder.activate()
+    try:
+        with phase("resolve"):
+            with phase("api fetch"):
+                pass
+        recorder.mark()
+        recorder.add_since_mark("load")
+    finally:
+        recorder.deactivate()
+    assert [(name, depth) for name, _, depth in recorder.spans] == [("resolve", 0), ("api fetch", 1), ("load", 0)]
+    assert current_recorder() is None
+    text = recorder.format()
+    assert text.startswith("Timing:")
+    assert "    api fetch:" in text
+
+
+def test_phase_is_a_no_op_without_recorder_and_in_other_threads():
+    recorder = PhaseRecorder("TestNode")
+    recorder.activate()
+    try:
+        # 后台线程不继承当前节点的记录器
+        thread = threading.Thread(target=lambda: phase("background").__enter__())
+        thread.start()
+        thread.join()
+    finally:
+        recorder.deactivate()
+    with phase("outside"):
+        pass
+    assert recorder.spans == []
+
+
+def test_structured_log_line(caplog):
+    recorder = PhaseRecorder("TestNode", "3")
+    recorder.add("download", 1.5)
+    with caplog.at_level(logging.DEBUG, logger="xtnodes.timing"):
+        recorder.log(slow_threshold=100, model="https://civitai.com/models/1")
+    record = caplog.records[-1]
+    assert record.levelno == logging.DEBUG
+    data = json.loads(record.getMessage())
+    assert data["node"] == "TestNode"
+    assert data["phases"] == [{"phase": "download", "seconds": 1.5, "depth": 0}]
@@ -0,0 +1,117 @@
+import sys
+import json
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_preflight_models_"))
+
+import folder_paths
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, download_utils
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo, ModelVersionNotFound
+from civitaiNodes.MyUtils.http_utils import OfflineModeError, raise_if_offline
+from civitaiNodes.MyUtils.ui_utils import get_image_cache_path
+from standalone_app import preflight
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "model_store", False)
+        monkeypatch.setattr(config, "min_free_mb", 0)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        monkeypatch.setattr(civitaiModelInfo, "models_folder", tmp_path / "models")
+        monkeypatch.setattr(download_utils, "use_aria2", False)
+        monkeypatch.setattr(folder_paths, "get_output_directory", lambda: str(tmp_path / "output"))
+        for name in ["versionid_to_modelid_map", "filepath_to_hash_map"]:
+            lazy_dict = getattr(civitaiModelInfo, name)
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+def test_raise_if_offline(monkeypatch):
+    monkeypatch.setattr(config, "offline", False)
+    raise_if_offline("model.json")
+    monkeypatch.setattr(config, "offline", True)
+    with pytest.raises(OfflineModeError, match="model.json"):
+        raise_if_offline("model.json")
+
+
+def test_offline_lookups_do_not_touch_the_network(fake, monkeypatch):
+    cached, uncached = fake.add_model(), fake.add_model()
+    ModelInfo(url=fake.model_url(cached["id"]))
+    requests = sum(fake.request_counts.values())
+    monkeypatch.setattr(config, "offline", True)
+    assert ModelInfo(url=fake.model_url(cached["id"])).id == cached["id"]
+    with pytest.raises(OfflineModeError):
+        ModelInfo(url=fake.model_url(uncached["id"]))
+    assert sum(fake.request_counts.values()) == requests
+
+
+def test_check_node_reasons(fake, monkeypatch):
+    ready, missing = fake.add_model(), fake.add_model()
+    info = ModelInfo(url=fake.model_url(ready["id"]))
+    info.download()
+    for url in info.image_urls[:config.max_preview_images]:
+        get_image_cache_path(url).write_bytes(b"png")
+    ModelInfo(url=fake.model_url(missing["id"]))
+    monkeypatch.setattr(config, "offline", True)
+
+    assert preflight.check_node("CivitaiLoraLoader", fake.model_url(ready["id"]), True) == []
+    reasons = preflight.check_node("CivitaiLoraLoader", fake.model_url(missing["id"]), True)
+    assert reasons[0].startswith("model file is not downloaded") and "preview images are not cached" in reasons[1]
+    assert preflight.check_node("CivitaiLoraLoader", fake.model_url(missing["id"]), False) == reasons[:1]
+    assert "Offline mode" in preflight.check_node("CivitaiLoraLoader", fake.model_url(99999), True)[0]
+    # 无法解析的链接只作为该节点的原因报告
+    assert "cannot resolve" in preflight.check_node("CivitaiLoraLoader", "", True)[0]
+    assert "cannot resolve" in preflight.check_node("CivitaiLoraLoader", None, True)[0]
+    assert "cannot resolve" in preflight.check_node("CivitaiLoraLoader", "https://example.com/x", True)[0]
+
+    def load_parsed(cls, modelId, versionId=None, config=config):
+        raise ModelVersionNotFound(f"Model version {versionId} not found in {modelId}")
+
+    monkeypatch.setattr(ModelInfo, "load_parsed", classmethod(load_parsed))
+    assert "Model version 5 not found" in preflight.check_node("CivitaiLoraLoader", fake.model_url(ready["id"], 5), True)[0]
+
+
+def test_cli(fake, monkeypatch, tmp_path, capsys):
+    ready = fake.add_model()
+    info = ModelInfo(url=fake.model_url(ready["id"]))
+    info.download()
+    monkeypatch.setattr(config, "offline", False)
+    workflow = {
+        "nodes": [
+            {"id": 1, "type": "CivitaiLoraLoader", "widgets_values": [fake.model_url(ready["id"]), 1.0, 1.0, False]},
+            {"id": 2, "type": "CivitaiLoraLoader", "widgets_values": [""]},
+            {"id": 3, "type": "KSampler", "widgets_values": [1, "fixed"]},
+        ]
+    }
+    path = tmp_path / "workflow.json"
+    path.write_text(json.dumps(workflow), encoding="utf-8")
+
+    assert preflight.main([str(path)]) == 1
+    assert config.offline is True
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("[OK     ] #1 CivitaiLoraLoader")
+    assert lines[1].startswith("[NETWORK] #2 CivitaiLoraLoader") and "cannot resolve" in lines[2]
+    assert lines[-1] == "1 of 2 nodes would need network access"
+
+    workflow["nodes"].pop(1)
+    path.write_text(json.dumps(workflow), encoding="utf-8")
+    assert preflight.main([str(path)]) == 0
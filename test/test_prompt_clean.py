@@ -0,0 +1,158 @@
+import sys
+import pathlib
+import random
+import itertools
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+
+from civitaiNodes.prompt_concatenate import (
+    clean_prompt, convert_prompt_to_clean_list, split_prompt, CleanPrompt, PromptConcatenate, _clean_fragment,
+)
+
+
+def legacy_clean_prompt(prompt, remove_duplicates=True, whitespace_style="space"):
+    """clean_prompt before the single-pass rewrite, kept as the regression reference"""
+    def flatten_list(input_list):
+        output_list = []
+        for item in input_list:
+            if isinstance(item, list):
+                output_list.extend(flatten_list(item))
+            else:
+                output_list.append(item)
+        return output_list
+
+    if isinstance(prompt, list):
+        prompt = ",".join(flatten_list(prompt))
+    elif not isinstance(prompt, str):
+        prompt = str(prompt)
+    for char in ["\n", "\r", "\f", "\v"]:
+        prompt = prompt.replace(char, ",")
+    prompt = prompt.replace("\t", " ")
+    prompt = prompt.replace("，", ",")
+    words = [word.strip() for word in prompt.split(",") if len(word.strip()) > 0]
+    if remove_duplicates:
+        import re
+        existing_words = set()
+        new_words = []
+        for word in words:
+            clean_word = re.sub(f"[^{re.escape('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 _')}]", "", word)
+            if clean_word not in existing_words:
+                new_words.append(word)
+                existing_words.add(clean_word)
+        words = new_words
+    if whitespace_style == "underscore":
+        words = [word.replace(" ", "_") for word in words]
+    elif whitespace_style == "space":
+        words = [word.replace("_", " ") for word in words]
+    return ", ".join(words)
+
+
+VOCABULARY = [
+    "masterpiece", "best quality", "best_quality", "1girl", "1 girl", "Solo", "solo", "long_hair",
+    "long hair", "blue eyes", "(smile:1.2)", "(smile:0.8)", "[blurry]", "((detailed))", "score_9",
+    "score_8_up", "looking at viewer", "Looking_At_Viewer", "<lora:detailTweaker:0.8>", "<lora:addDetail:1>",
+    "(red dress:1.1)", "white background", "simple background", "masterpiece!", "best quality.",
+]
+SEPARATORS = [",", ", ", " ,", ",,", "，", "\n", "\r\n", "\t,", ", \f", "\v", ",  ,"]
+
+
+def make_corpus(size: int = 400, seed: int = 1234) -> list:
+    rng = random.Random(seed)
+    corpus = [
+        "",
+        "masterpiece",
+        "masterpiece, best quality, masterpiece",
+        "  leading,trailing  ,\t tabs\there ,\n\nnew lines\r\n",
+        "full，width，commas，masterpiece，Masterpiece",
+        "(masterpiece:1.2), best_quality, <lora:detailTweaker:0.8>, (masterpiece:1.2)",
+        ["a list", ["nested", "list"], "a list"],
+    ]
+    for _ in range(size):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(1, 30))]
+        prompt = ""
+        for word in words:
+            prompt += word + rng.choice(SEPARATORS)
+        corpus.append(prompt)
+    return corpus
+
+
+def test_same_output_as_legacy_on_corpus():
+    options = itertools.product([True, False], ["keep", "space", "underscore"])
+    for remove_duplicates, whitespace_style in options:
+        for prompt in make_corpus():
+            expected = legacy_clean_prompt(prompt, remove_duplicates, whitespace_style)
+            assert clean_prompt(prompt, remove_duplicates, whitespace_style) == expected, prompt
+
+
+def test_weight_groups_are_not_split():
+    assert split_prompt("a, (b, c:1.2), d") == ["a", " (b, c:1.2)", " d"]
+    assert clean_prompt("(b, c:1.2), b, c", whitespace_style="keep") == "(b, c:1.2), b, c"
+    assert clean_prompt("(red_dress,  blue_hat:1.1)", whitespace_style="space") == "(red dress, blue hat:1.1)"
+    assert clean_prompt("(red dress, blue hat:1.1)", whitespace_style="underscore") == "(red_dress, blue_hat:1.1)"
+    assert clean_prompt("artist \\(style\\), other", whitespace_style="keep") == "artist \\(style\\), other"
+
+
+def test_unbalanced_brackets_fall_back_to_plain_split():
+    assert convert_prompt_to_clean_list("(a, b, c") == ["(a", "b", "c"]
+    assert clean_prompt(">_<, a", whitespace_style="keep") == ">_<, a"
+
+
+def test_only_the_unbalanced_span_falls_back():
+    assert split_prompt("a, (b, c), d >_<") == ["a", " (b, c)", " d >_<"]
+    assert clean_prompt("a, (b, c), d >_<", whitespace_style="keep") == "a, (b, c), d >_<"
+    assert convert_prompt_to_clean_list("(a, (b, c), d") == ["(a", "(b, c)", "d"]
+    assert convert_prompt_to_clean_list("(a, [b), c") == ["(a", "[b)", "c"]
+
+
+def test_commas_inside_brackets():
+    prompt = "[a, b], {c|d, e}, (f,g:1.2), h"
+    assert convert_prompt_to_clean_list(prompt) == ["[a, b]", "{c|d, e}", "(f, g:1.2)", "h"]
+    assert clean_prompt("(long_hair, red_eyes:1.1), long_hair", whitespace_style="space") == "(long hair, red eyes:1.1), long hair"
+
+
+def test_lora_syntax_is_not_restyled():
+    prompt = "<lora:my_style_v2:0.8>, long_hair, <lora:add detail:1>"
+    assert clean_prompt(prompt, whitespace_style="space") == "<lora:my_style_v2:0.8>, long hair, <lora:add detail:1>"
+    assert clean_prompt(prompt, whitespace_style="underscore") == "<lora:my_style_v2:0.8>, long_hair, <lora:add detail:1>"
+    prompt = "(<lora:my_style_v2:1>, red_hair:1.2), <lora:x_y, z:1>, d >_<"
+    assert clean_prompt(prompt, whitespace_style="space") == "(<lora:my_style_v2:1>, red hair:1.2), <lora:x_y, z:1>, d > <"
+    assert clean_prompt(prompt, whitespace_style="underscore") == "(<lora:my_style_v2:1>, red_hair:1.2), <lora:x_y, z:1>, d_>_<"
+
+
+def test_non_ascii_words_are_not_collapsed():
+    assert clean_prompt("猫, 狗, 猫") == "猫, 狗"
+    assert clean_prompt("猫，(狗，鸟:1.2)，猫耳 >_<, 猫", whitespace_style="keep") == "猫, (狗, 鸟:1.2), 猫耳 >_<"
+    # 只剩空格的 key 不能让不同的词互相去重
+    assert clean_prompt("猫 耳, 狗 鸟, 猫 耳", whitespace_style="underscore") == "猫_耳, 狗_鸟"
+
+
+def test_clean_prompt_node_processes_batches():
+    output = CleanPrompt()._clean_prompt(
+        prompt=["a, b, a", ["c", ["d", "c"]]], remove_duplicates=[True], whitespace_style=["keep"]
+    )
+    assert output["result"] == (["a, b", "c, d"],)
+
+
+def test_prompt_concatenate_broadcasts_inputs():
+    output = PromptConcatenate()._concatenate_prompt(
+        prompt_A=["masterpiece, best_quality"],
+        prompt_B=["red dress", "blue dress", "masterpiece"],
+        remove_duplicates=[True],
+        whitespace_style=["space"],
+    )
+    assert output["result"] == ([
+        "masterpiece, best quality, red dress",
+        "masterpiece, best quality, blue dress",
+        "masterpiece, best quality",
+    ],)
+    legacy = legacy_clean_prompt("masterpiece, best_quality, red dress", True, "space")
+    assert output["result"][0][0] == legacy
+
+
+def test_repeated_fragments_are_cleaned_once():
+    _clean_fragment.cache_clear()
+    prompts = ["shared, style words, (tag:1.2)"] * 100
+    PromptConcatenate()._concatenate_prompt(prompt_A=prompts, prompt_B=["x"], whitespace_style=["keep"])
+    info = _clean_fragment.cache_info()
+    assert info.misses == 2
+    assert info.hits == 99 * 2
@@ -0,0 +1,79 @@
+import sys
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai, make_safetensors
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_header_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, safetensors_utils
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path / "json_cache")
+        # ModelInfo(url) 会写入版本ID表，不能写到仓库中的 json_cache
+        for name in ["versionid_to_modelid_map", "filepath_to_hash_map"]:
+            lazy_dict = getattr(civitaiModelInfo, name)
+            monkeypatch.setattr(lazy_dict, "filepath", tmp_path / f"{name}.json")
+            monkeypatch.setattr(lazy_dict, "_data", {})
+            monkeypatch.setattr(lazy_dict, "_signature", None)
+        yield fake
+
+
+def test_local_file(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(make_safetensors(3 * 1024 * 1024, metadata={"ss_network_dim": "32"}))
+    assert safetensors_utils.get_metadata_from_file(str(path)) == {"ss_network_dim": "32"}
+    summary = safetensors_utils.summarize_header(safetensors_utils.read_header_from_file(path), path.stat().st_size)
+    assert summary["tensors"] == 3
+    assert summary["dtypes"] == {"F16": 3}
+    assert summary["parameters"] * 2 == summary["data_size"]
+
+    path.write_bytes(b"\x00" * 16)
+    with pytest.raises(BufferError):
+        safetensors_utils.read_header_from_file(path)
+
+
+def test_remote_header_reads_only_the_header(fake):
+    version = fake.add_model(file_size=2 * 1024 * 1024)["modelVersions"][0]
+    content = fake.files[version["id"]]
+    url = f"{fake.base_url}/files/{version['id']}/{version['files'][0]['name']}"
+
+    header, size = safetensors_utils.read_header_from_url(url)
+    assert size == len(content)
+    assert header == safetensors_utils.parse_header(content[8:8 + int.from_bytes(content[:8], "little")])
+    assert fake.request_counts["file"] == 1
+
+    # 头部比预取的字节多时再请求剩余部分
+    header, _ = safetensors_utils.read_header_from_url(url, prefetch=16)
+    assert header["__metadata__"] == {"ss_output_name": f"fake_{version['id']}"}
+    assert fake.request_counts["file"] == 3
+
+
+def test_modelinfo_summary_is_cached(fake):
+    from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+    doc = fake.add_model(file_size=1024 * 1024)
+    info = ModelInfo(fake.model_url(doc["id"], doc["modelVersions"][0]["id"]))
+    summary = info.safetensors_summary()
+    assert summary["size"] == len(fake.files[info.versionId])
+    assert summary["tensors"] == 1
+    assert "F16" in safetensors_utils.format_summary(summary)
+
+    requests_before = fake.request_counts["file"]
+    assert info.safetensors_summary() == summary
+    assert fake.request_counts["file"] == requests_before
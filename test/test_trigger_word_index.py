@@ -0,0 +1,110 @@
+import os
+import sys
+import asyncio
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from test_model_cache import make_doc
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_trigger_models_"))
+
+from civitaiNodes.MyUtils import model_cache
+from civitaiNodes.MyUtils import TriggerWordIndex as trigger_word_module
+from civitaiNodes.MyUtils.TriggerWordIndex import TriggerWordIndex
+
+
+def store(cache_dir, modelId, trained_words, tags, mtime=None):
+    doc = make_doc(modelId, versions=1)
+    doc["tags"] = tags
+    doc["modelVersions"][0]["trainedWords"] = trained_words
+    model_cache.store_model_doc(cache_dir, doc)
+    if mtime is not None:
+        os.utime(model_cache.model_dir(cache_dir, modelId) / "model.json", (mtime, mtime))
+
+
+def matches(results):
+    return [(result["term"], result["match"], result["modelId"]) for result in results]
+
+
+def test_lookup_modes_and_ranking(tmp_path):
+    store(tmp_path, 10, ["red_hair, blue eyes"], ["style"])
+    store(tmp_path, 2500, ["watercolor"], ["red hair", "painting"])
+    index = TriggerWordIndex(tmp_path, refresh_interval=0)
+
+    # 模型目录按 {id // 1000}k 分片存放
+    assert model_cache.model_dir(tmp_path, 2500).parent.name == "2k"
+    # 触发词匹配排在标签匹配之前，下划线与空格视为相同
+    assert matches(index.lookup("Red Hair", mode="exact")) == [("red hair", "trigger", 10), ("red hair", "tag", 2500)]
+    assert matches(index.lookup("red", mode="exact")) == []
+    assert matches(index.lookup("water", mode="prefix")) == [("watercolor", "trigger", 2500)]
+    assert [result["term"] for result in index.lookup("pa", mode="prefix")] == ["painting"]
+    assert matches(index.lookup("watercolour", mode="fuzzy"))[0] == ("watercolor", "trigger", 2500)
+    result = index.lookup("blue eyes", mode="exact")[0]
+    assert result["versionId"] == 11
+    assert result["url"] == "https://civitai.com/models/10?modelVersionId=11"
+    with pytest.raises(ValueError):
+        index.lookup("red", mode="regex")
+
+
+def test_incremental_refresh(tmp_path, monkeypatch):
+    store(tmp_path, 10, ["alpha"], ["style"], mtime=1000)
+    store(tmp_path, 20, ["beta"], ["style"], mtime=1000)
+    index = TriggerWordIndex(tmp_path, refresh_interval=0)
+    assert index.refresh() is True
+
+    reads = []
+    read_entries = index._read_entries
+    monkeypatch.setattr(index, "_read_entries", lambda modelId: reads.append(modelId) or read_entries(modelId))
+    assert index.refresh() is False
+    # 只重新读取 model.json 修改过的模型
+    store(tmp_path, 10, ["gamma"], ["style"], mtime=2000)
+    model_cache.remove_model(tmp_path, 20)
+    assert index.refresh() is True
+    assert reads == [10]
+    assert matches(index.lookup("alpha", mode="exact")) == []
+    assert matches(index.lookup("beta", mode="exact")) == []
+    assert matches(index.lookup("gamma", mode="exact")) == [("gamma", "trigger", 10)]
+
+    # 重启后从索引文件加载，不再读取模型
+    reads.clear()
+    restarted = TriggerWordIndex(tmp_path, refresh_interval=0)
+    monkeypatch.setattr(restarted, "_read_entries", lambda modelId: reads.append(modelId) or read_entries(modelId))
+    assert matches(restarted.lookup("gamma", mode="exact")) == [("gamma", "trigger", 10)]
+    assert reads == []
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_route_rejects_bad_parameters(tmp_path, monkeypatch):
+    pytest.importorskip("aiohttp")
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+    from civitaiNodes import server_routes
+
+    store(tmp_path, 10, ["alpha"], ["style"])
+    monkeypatch.setattr(trigger_word_module, "trigger_word_index", TriggerWordIndex(tmp_path, refresh_interval=0))
+
+    async def main():
+        routes = web.RouteTableDef()
+        server_routes.register_routes(routes)
+        app = web.Application()
+        app.add_routes(routes)
+        results = []
+        async with TestClient(TestServer(app)) as client:
+            for query in [{"q": "al"}, {"q": "al", "mode": "regex"}, {"q": "al", "limit": "many"}]:
+                response = await client.get("/xtnodes/trigger_words", params=query)
+                results.append((response.status, await response.json()))
+        return results
+
+    ok, bad_mode, bad_limit = asyncio.run(main())
+    assert ok[0] == 200 and matches(ok[1]["results"]) == [("alpha", "trigger", 10)]
+    assert bad_mode[0] == 400 and "regex" in bad_mode[1]["error"]
+    assert bad_limit[0] == 400
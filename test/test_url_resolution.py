@@ -0,0 +1,122 @@
+import os
+import sys
+import pathlib
+import tempfile
+
+import pytest
+
+test_dir = pathlib.Path(__file__).parent
+sys.path.insert(0, str(test_dir))
+sys.path.append(str(test_dir.parent))
+
+from comfy_stubs import install_comfy_stubs
+from fake_civitai import FakeCivitai
+
+# civitaiNodes 在导入时读取 folder_paths
+if "folder_paths" not in sys.modules:
+    install_comfy_stubs(models_dir=tempfile.mkdtemp(prefix="xtnodes_url_models_"))
+
+from civitaiNodes.config import config
+from civitaiNodes.MyUtils import civitaiModelInfo, model_cache
+from civitaiNodes.MyUtils.civitaiModelInfo import ModelInfo
+
+
+@pytest.mark.parametrize("url, ids", [
+    ("https://civitai.com/models/43965?modelVersionId=58585", (43965, 58585)),
+    ("https://civitai.com/models/43965/some-name", (43965, None)),
+    ("https://civitai.com/api/download/models/58585", (None, 58585)),
+    ("https://civitai.com/api/download/models/58585?type=Model&format=SafeTensor", (None, 58585)),
+    ("https://civitai.com/api/v1/model-versions/58585", (None, 58585)),
+    ("urn:air:sdxl:lora:civitai:43965@58585", (43965, 58585)),
+    ("urn:air:sd1:checkpoint:civitai:43965@58585.safetensors", (43965, 58585)),
+    ("civitai:43965@58585", (43965, 58585)),
+    ("urn:air:sdxl:lora:civitai:43965", (43965, None)),
+])
+def test_url_shapes(url, ids):
+    assert ModelInfo.get_ids_from_url(url) == ids
+
+
+def test_unknown_url():
+    with pytest.raises(ValueError):
+        ModelInfo.get_ids_from_url("https://example.com/file.safetensors")
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    with FakeCivitai() as fake:
+        monkeypatch.setattr(config, "api_endpoint", fake.api_endpoint)
+        monkeypatch.setattr(config, "token", "")
+        monkeypatch.setattr(config, "offline", False)
+        monkeypatch.setattr(config, "json_cache_dir", tmp_path)
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "filepath", tmp_path / "versionid_to_modelid_map.json")
+        monkeypatch.setattr(civitaiModelInfo.versionid_to_modelid_map, "_data", {})
+        yield fake
+
+
+def test_download_url_and_air(fake):
+    doc = fake.add_model(versions=2)
+    versionId = doc["modelVersions"][1]["id"]
+    info = ModelInfo(f"{fake.base_url}/api/download/models/{versionId}")
+    assert (info.id, info.versionId) == (doc["id"], versionId)
+    assert fake.request_counts["version"] == 1 and fake.request_counts["model"] == 1
+
+    # 版本 ID -> 模型 ID 已缓存，模型也已缓存，不再访问 API
+    assert ModelInfo(f"{fake.base_url}/api/download/models/{doc['modelVersions'][0]['id']}").versionId == doc["modelVersions"][0]["id"]
+    assert ModelInfo(f"urn:air:sd1:lora:civitai:{doc['id']}@{versionId}").versionId == versionId
+    assert fake.request_counts["version"] == 1 and fake.request_counts["model"] == 1
+
+
+def test_new_version_fetches_only_the_version(fake):
+    doc = fake.add_model(versions=3)
+    newest = doc["modelVersions"][-1]
+    # 缓存时还没有最新的版本
+    model_cache.store_model_doc(config.json_cache_dir, {**doc, "modelVersions": doc["modelVersions"][:-1]})
+    info = ModelInfo(fake.model_url(doc["id"], newest["id"]))
+    assert (info.versionId, info.category, info.rawFilename) == (newest["id"], "style", newest["files"][0]["name"])
+    assert fake.request_counts["version"] == 1 and fake.request_counts["model"] == 0
+    assert ModelInfo(fake.model_url(doc["id"], None)).versionId == newest["id"]
+    assert fake.request_counts["model"] == 0
+
+
+def test_file_replaced_in_place_is_hashed_again(fake, monkeypatch, tmp_path):
+    hash_map = civitaiModelInfo.filepath_to_hash_map
+    monkeypatch.setattr(hash_map, "filepath", tmp_path / "filepath_to_hash_map.json")
+    monkeypatch.setattr(hash_map, "_data", {})
+    monkeypatch.setattr(hash_map, "_signature", None)
+    first, second = fake.add_model(), fake.add_model()
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(fake.files[first["modelVersions"][0]["id"]])
+
+    assert civitaiModelInfo.get_ids_from_file(path) == (first["id"], first["modelVersions"][0]["id"])
+    assert civitaiModelInfo.get_ids_from_file(path) == (first["id"], first["modelVersions"][0]["id"])
+    assert fake.request_counts["by-hash"] == 1
+
+    # 同一路径换成另一个模型的文件
+    path.write_bytes(fake.files[second["modelVersions"][0]["id"]])
+    os.utime(path, ns=(0, 10**9))
+    assert civitaiModelInfo.get_ids_from_file(path) == (second["id"], second["modelVersions"][0]["id"])
+    assert fake.request_counts["by-hash"] == 2
+    assert ModelInfo(filepath=str(path)).id == second["id"]
+
+    # 旧版本写入的记录没有文件信息，补上后继续使用
+    hash_map[path.resolve()] = {"modelId": first["id"], "modelVersionId": first["modelVersions"][0]["id"]}
+    assert civitaiModelInfo.get_ids_from_file(path) == (first["id"], first["modelVersions"][0]["id"])
+    assert hash_map[path.resolve()]["mtime_ns"] == 10**9
+    assert fake.request_counts["by-hash"] == 2
+
+
+def test_parsed_model_is_refreshed_when_the_version_file_changes(fake):
+    doc = fake.add_model(versions=2)
+    version = doc["modelVersions"][0]
+    for url in [fake.model_url(doc["id"], version["id"]), fake.model_url(doc["id"], None)]:
+        assert ModelInfo(url).versionName == version["name"]
+    directory = model_cache.model_dir(config.json_cache_dir, doc["id"])
+    model_mtime = (directory / "model.json").stat().st_mtime_ns
+
+    # /model-versions/{id} 的新响应只重写版本文件，model.json 不变
+    assert model_cache.store_version_doc(config.json_cache_dir, {**version, "modelId": doc["id"], "name": "v1 renamed"})
+    stat = (directory / f"{version['id']}.json").stat()
+    os.utime(directory / f"{version['id']}.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert (directory / "model.json").stat().st_mtime_ns == model_mtime
+    for url in [fake.model_url(doc["id"], version["id"]), fake.model_url(doc["id"], None)]:
+        assert ModelInfo(url).versionName == "v1 renamed"
@@ -1,9 +1,65 @@
 import { app } from "../../../scripts/app.js";
+import { api } from "../../../scripts/api.js";
 import { ComfyWidgets } from "../../../scripts/widgets.js";
 
+// Shows model info and cached previews as soon as the model widget changes, without running the graph
+const MODEL_WIDGETS = {
+	CheckpointLoaderSimpleWithPreviews: { widget: "model_name", folder: "checkpoints" },
+	LoraLoaderWithPreviews: { widget: "model_name", folder: "loras" },
+	LoraLoaderStackedWithPreviews: { widget: "model_name", folder: "loras" },
+	LoraLoaderStackedAdvancedWithPreviews: { widget: "model_name", folder: "loras" },
+	CivitaiCheckpointLoaderSimple: { widget: "url" },
+	CivitaiLoraLoader: { widget: "url" },
+	CivitaiLoraLoaderStacked: { widget: "url" },
+	CivitaiLoraLoaderStackedAdvanced: { widget: "url" },
+};
+const LOOKUP_DELAY = 400;
+
+function showModelInfo(node, output) {
+	if (output.images && app.nodeOutputs) {
+		app.nodeOutputs[node.id] = { ...app.nodeOutputs[node.id], images: output.images };
+	}
+	node.onExecuted?.(output);
+	app.graph.setDirtyCanvas(true, true);
+}
+
+async function lookupModelInfo(node, lookup, value) {
+	if (!value) {
+		return;
+	}
+	// Local files are only looked up in the cache (hashing a new file can take a while), URLs may be fetched
+	const params = lookup.folder
+		? new URLSearchParams({ path: value, folder: lookup.folder })
+		: new URLSearchParams({ url: value, fetch: lookup.cacheOnly ? "0" : "1" });
+	try {
+		const response = await api.fetchApi(`/xtnodes/modelinfo?${params}`);
+		if (!response.ok) {
+			return;
+		}
+		const info = await response.json();
+		// Ignore answers for a value that has changed in the meantime
+		const widget = node.widgets?.find((w) => w.name === lookup.widget);
+		if (info.cached && widget?.value === value) {
+			showModelInfo(node, info.ui);
+		}
+	} catch (error) {
+		console.warn("XTNodes: model info lookup failed", error);
+	}
+}
+
 // Displays input text on a node
 app.registerExtension({
 	name: "XTNodes.ShowText",
+	setup() {
+		// Model info that is resolved in the background after the node has finished
+		api.addEventListener("xtnodes.modelinfo", ({ detail }) => {
+			const node = app.graph.getNodeById(Number(detail.node));
+			if (!node) {
+				return;
+			}
+			showModelInfo(node, detail.output);
+		});
+	},
 	async beforeRegisterNodeDef(nodeType, nodeData, app) {
 		const validNodeNames = [
 			"CheckpointLoaderSimpleWithPreviews",
@@ -48,5 +104,37 @@ app.registerExtension({
 				this.onResize?.(this.size);
 			};
 		}
+
+		const lookup = MODEL_WIDGETS[nodeData.name];
+		if (lookup) {
+			const onNodeCreated = nodeType.prototype.onNodeCreated;
+			nodeType.prototype.onNodeCreated = function () {
+				const r = onNodeCreated?.apply(this, arguments);
+				const widget = this.widgets?.find((w) => w.name === lookup.widget);
+				if (widget) {
+					let timer = null;
+					const callback = widget.callback;
+					widget.callback = (value, ...args) => {
+						const r = callback?.call(widget, value, ...args);
+						clearTimeout(timer);
+						timer = setTimeout(() => lookupModelInfo(this, lookup, widget.value), LOOKUP_DELAY);
+						return r;
+					};
+				}
+				return r;
+			};
+
+			// Workflows that are loaded show the info of their saved models from the cache
+			const onConfigure = nodeType.prototype.onConfigure;
+			nodeType.prototype.onConfigure = function () {
+				const r = onConfigure?.apply(this, arguments);
+				const widget = this.widgets?.find((w) => w.name === lookup.widget);
+				if (widget) {
+					const params = lookup.folder ? lookup : { ...lookup, cacheOnly: true };
+					lookupModelInfo(this, params, widget.value);
+				}
+				return r;
+			};
+		}
 	},
 });